@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 22:52:18 2026
+
+@author: David Billingsley
+"""
+
+'''
+As-of lookups into financial statements. Statements stay at their own
+frequency, indexed by (Ticker, Report Date), and the value of any column at
+any (ticker, date) is the one from the latest report on or before that
+date, which is what sf.reindex(..., method='ffill') gives. Instead of
+building a forward-filled copy of every column on every trading day, the
+rows for a set of query points are found with one sorted search, and only
+the columns actually needed are taken.
+
+    balance = AsOf(df_balance)
+    rows = balance.positions_for(df_prices.index)       #one int per day
+    assets = balance.take(rows, ['Total Assets'])
+    balance.at(df_prices.index)                         #like sf.reindex
+
+at_many does the same for several statements over one index, and can spread
+the work over a process pool, split by statement and by groups of tickers.
+The arrays are handed to the workers in shared memory rather than pickled,
+and each worker writes its rows straight into a shared result.
+'''
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+try:
+    from valuation.lazy import lazy_import
+except ImportError:
+    #valuation/ itself is on the path, so valuation is valuation.py
+    from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+#added to days since 1970 so dates before 1970 still sort as unsigned
+DAY_OFFSET = 2**31
+
+
+def day_numbers(dates):
+    '''
+    Dates as int64 days since 1970.
+    '''
+
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+def search_keys(codes, days):
+    '''
+    One sortable int64 per (ticker code, day): ticker in the high 32 bits,
+    day in the low.
+    '''
+
+    return (np.asarray(codes, dtype=np.int64) << 32) | (days + DAY_OFFSET)
+
+
+class AsOf():
+    '''
+    As-of lookup engine over a frame indexed by (ticker, date).
+    '''
+
+    def __init__(self, df, group=0, date=1):
+        '''
+        Parameters
+        ----------
+        df : DataFrame
+            statements with a (Ticker, Report Date) MultiIndex.
+        group : int or string, optional
+            Index level holding the ticker. The default is 0.
+        date : int or string, optional
+            Index level holding the date. The default is 1.
+
+        '''
+
+        tickers = df.index.get_level_values(group)
+        days = day_numbers(df.index.get_level_values(date))
+
+        self.tickers = pd.Index(tickers.unique()).sort_values()
+        codes = self.tickers.get_indexer(tickers)
+        keys = search_keys(codes, days)
+
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.codes = codes[order]
+        self.frame = df.iloc[order]
+        self.columns = df.columns
+
+    def positions(self, tickers, dates):
+        '''
+        Row of the latest report on or before each (ticker, date).
+
+        Parameters
+        ----------
+        tickers : array-like
+
+        dates : array-like
+            same length as tickers.
+
+        Returns
+        -------
+        numpy array
+            int64 rows into self.frame, -1 where the ticker has no report
+            on or before the date.
+
+        '''
+
+        codes = self.tickers.get_indexer(tickers)
+        keys = search_keys(codes, day_numbers(dates))
+
+        rows = np.searchsorted(self.keys, keys, side='right') - 1
+        found = (codes >= 0) & (rows >= 0)
+        found[found] = self.codes[rows[found]] == codes[found]
+
+        return np.where(found, rows, -1)
+
+    def report_days(self, positions):
+        '''
+        Day numbers (see day_numbers) of the rows at positions, the smallest
+        int64 where the position is -1.
+        '''
+
+        days = (self.keys[positions] & 0xFFFFFFFF) - DAY_OFFSET
+
+        return np.where(positions >= 0, days, np.iinfo(np.int64).min)
+
+    def positions_for(self, index, group=0, date=1):
+        '''
+        positions for every entry of a (ticker, date) MultiIndex, e.g.
+        df_prices.index.
+        '''
+
+        return self.positions(index.get_level_values(group), index.get_level_values(date))
+
+    def take(self, positions, columns=None):
+        '''
+        Values of columns at rows from positions, np.nan (or the column's
+        missing value) where the row is -1.
+
+        Returns
+        -------
+        dict
+            column -> numpy array, in the order of positions.
+
+        '''
+
+        columns = self.columns if columns is None else columns
+        take = pd.api.extensions.take
+
+        return {column : take(self.frame[column].to_numpy(), positions, allow_fill=True)
+                for column in columns}
+
+    def lookup(self, tickers, dates, columns=None):
+        '''
+        Values as of each (ticker, date).
+
+        Returns
+        -------
+        DataFrame
+            indexed by (Ticker, Date) in the order given.
+
+        '''
+
+        index = pd.MultiIndex.from_arrays([tickers, dates],
+                                          names=[self.frame.index.names[0], 'Date'])
+
+        return pd.DataFrame(self.take(self.positions(tickers, dates), columns), index=index)
+
+    def at(self, index, columns=None, group=0, date=1):
+        '''
+        Values as of every entry of a (ticker, date) MultiIndex, for the
+        tickers that have statements. Gives the same frame as
+        sf.reindex(df_src=statements, df_target=<frame with that index>,
+        group_index=TICKER, method='ffill').
+
+        Parameters
+        ----------
+        index : MultiIndex
+            e.g. df_prices.index.
+        columns : list, optional
+            The default is None, which takes every column.
+
+        Returns
+        -------
+        DataFrame
+
+        '''
+
+        tickers = index.get_level_values(group)
+        keep = self.tickers.get_indexer(tickers) >= 0
+        #keep the caller's index object when nothing is dropped, so frames
+        #built over the same days share it
+        if not keep.all():
+            index = index[keep]
+
+        return pd.DataFrame(self.take(self.positions_for(index, group, date), columns),
+                            index=index)
+
+    def float_groups(self, columns=None):
+        '''
+        The float columns, grouped by dtype. These are the ones at_many
+        hands to workers; everything else is taken in the calling process.
+
+        Returns
+        -------
+        dict
+            dtype -> list of columns
+
+        '''
+
+        columns = self.columns if columns is None else columns
+        groups = {}
+        for column in columns:
+            dtype = self.frame[column].dtype
+            if dtype.kind == 'f':
+                groups.setdefault(np.dtype(dtype), []).append(column)
+
+        return groups
+
+    def nbytes(self):
+
+        return int(self.frame.memory_usage(deep=True).sum() + self.keys.nbytes + self.codes.nbytes)
+
+
+def share(array):
+    '''
+    A copy of array in a new shared memory block.
+
+    Returns
+    -------
+    tuple
+        (SharedMemory, spec) where spec is what attach needs to find it.
+
+    '''
+
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+
+    return block, (block.name, array.shape, array.dtype.str)
+
+def shared_empty(shape, dtype):
+    '''
+    An uninitialised array in a new shared memory block, see share.
+    '''
+
+    dtype = np.dtype(dtype)
+    block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+
+    return block, (block.name, shape, dtype.str)
+
+def attach(spec):
+    '''
+    The array in the shared memory block described by spec, from a worker.
+
+    Returns
+    -------
+    tuple
+        (SharedMemory, numpy array). Close the block when done with it.
+
+    '''
+
+    name, shape, dtype = spec
+    #workers share the resource tracker of the process that made the block,
+    #which unlinks it, so the worker only closes it
+    block = shared_memory.SharedMemory(name=name)
+
+    return block, np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+def _at_part(args):
+
+    keys_spec, codes_spec, query_spec, rows_spec, groups, lo, hi = args
+    blocks = []
+    try:
+        arrays = []
+        for spec in (keys_spec, codes_spec, query_spec, rows_spec):
+            block, array = attach(spec)
+            blocks.append(block)
+            arrays.append(array)
+        keys, codes, query, rows = arrays
+
+        #as in AsOf.positions; every query here has a ticker in the statements
+        found = np.searchsorted(keys, query[lo:hi], side='right') - 1
+        ok = found >= 0
+        ok[ok] = codes[found[ok]] == (query[lo:hi][ok] >> 32)
+        found = np.where(ok, found, -1)
+        rows[lo:hi] = found
+
+        for source_spec, out_spec in groups:
+            source_block, source = attach(source_spec)
+            out_block, out = attach(out_spec)
+            blocks += [source_block, out_block]
+            out[:, lo:hi] = source[:, np.maximum(found, 0)]
+            out[:, lo:hi][:, ~ok] = np.nan
+    finally:
+        for block in blocks:
+            block.close()
+
+    return hi - lo
+
+def ticker_groups(codes, groups):
+    '''
+    Splits rows into about groups contiguous ranges, ending each range where
+    the ticker changes when it can.
+
+    Returns
+    -------
+    list
+        (start, stop) pairs.
+
+    '''
+
+    n = len(codes)
+    changes = np.flatnonzero(np.diff(codes)) + 1
+    bounds = [0]
+    for bound in np.linspace(0, n, groups + 1)[1:-1].astype(np.int64):
+        i = np.searchsorted(changes, bound)
+        bound = changes[i] if i < len(changes) else n
+        if bound > bounds[-1]:
+            bounds.append(int(bound))
+    if bounds[-1] < n:
+        bounds.append(n)
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def at_many(engines, index, processes=None, groups=None, group=0, date=1):
+    '''
+    AsOf.at for several engines over the same (ticker, date) index, e.g.
+    the income, balance and cash flow statements over df_prices.index.
+
+    Parameters
+    ----------
+    engines : list
+        AsOf engines.
+    index : MultiIndex
+        e.g. df_prices.index.
+    processes : int, optional
+        Number of processes to spread the work over. The default is None,
+        which runs in this process.
+    groups : int, optional
+        Groups of tickers to split each statement into. The default is
+        None, which is processes.
+
+    Returns
+    -------
+    list
+        a DataFrame per engine, the same as engine.at(index).
+
+    '''
+
+    if processes is None or processes <= 1:
+        return [engine.at(index, group=group, date=date) for engine in engines]
+
+    groups = processes if groups is None else groups
+    tickers = index.get_level_values(group)
+    days = day_numbers(index.get_level_values(date))
+
+    blocks, jobs, plans = [], [], []
+    try:
+        for engine in engines:
+            codes = engine.tickers.get_indexer(tickers)
+            keep = codes >= 0
+            query = search_keys(codes[keep], days[keep])
+
+            specs = []
+            for array in (engine.keys, engine.codes, query):
+                block, spec = share(array)
+                blocks.append(block)
+                specs.append(spec)
+            rows_block, rows_spec = shared_empty(len(query), np.int64)
+            blocks.append(rows_block)
+
+            shared = []
+            for dtype, columns in engine.float_groups().items():
+                source = np.stack([engine.frame[column].to_numpy(dtype) for column in columns])
+                source_block, source_spec = share(source)
+                out_block, out_spec = shared_empty((len(columns), len(query)), dtype)
+                blocks += [source_block, out_block]
+                shared.append((columns, source_spec, out_block, out_spec))
+
+            for lo, hi in ticker_groups(codes[keep], groups):
+                jobs.append((*specs, rows_spec, [(s, o) for _, s, _, o in shared], lo, hi))
+            plans.append((engine, keep, rows_block, rows_spec, shared))
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            list(executor.map(_at_part, jobs))
+
+        frames = []
+        for engine, keep, rows_block, rows_spec, shared in plans:
+            rows = np.ndarray(rows_spec[1], np.dtype(rows_spec[2]), buffer=rows_block.buf)
+            out = {}
+            for columns, _, out_block, out_spec in shared:
+                values = np.ndarray(out_spec[1], np.dtype(out_spec[2]), buffer=out_block.buf)
+                out.update({column : values[i].copy() for i, column in enumerate(columns)})
+            #everything that isn't a float column is taken here
+            rest = [column for column in engine.columns if column not in out]
+            out.update(engine.take(rows.copy(), rest))
+            frame_index = index if keep.all() else index[keep]
+            frames.append(pd.DataFrame({column : out[column] for column in engine.columns},
+                                       index=frame_index))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return frames
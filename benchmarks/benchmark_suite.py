@@ -0,0 +1,713 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 18:20:44 2026
+
+@author: David Billingsley
+"""
+
+'''
+Benchmarks for the valuation pipeline and the simfin_data analysis.
+
+    python benchmarks/benchmark_suite.py                     run everything
+    python benchmarks/benchmark_suite.py micro e2e           run some groups
+    python benchmarks/benchmark_suite.py --update-baseline   save a baseline
+    python benchmarks/benchmark_suite.py --no-compare        just time
+
+Results are written to benchmarks/results/latest.json and compared against
+benchmarks/baseline.json. The run exits with status 1 if anything got
+slower than the baseline by more than TOLERANCE, and with status 2 if there
+is no baseline to compare against. Baselines are machine specific, so they
+aren't committed: make one with --update-baseline on the machine you
+compare on, before the change being measured.
+
+Groups:
+    check    equivalence checks on synthetic data, which raise on any
+             difference and record no timings: AsOf and at_many against
+             a per-ticker reindex / ffill, batch_valuation against
+             Equity.value per method, factor_engine's Piotroski
+             F and Beneish M against a groupby / shift(4), and Altman Z
+             and PCA in compact mode against float64 on whole-dollar data
+    micro    Equity.value per method, out_all + pd.concat against
+             ResultStore, float_convert,
+             check_float, and parsing fixture pages
+    e2e      evaluate_tickers over baskets of 10 / 100 / 1000 tickers served
+             by the local stand-in server
+    simfin   daily_fin_data (serial and on 2 / 4 / 8 processes), 
+             altman_z_test, daily_factor_scores and pca_analysis (in
+             memory and out of core) on synthetic data, then 
+             altman_z_test again in compact mode
+    startup  time, peak Python allocations and RSS growth to import
+             valuation and simfin_data in a fresh interpreter, for the
+             working tree and, as the before numbers, for the tree before
+             imports were made lazy (STARTUP_BASELINE_REV)
+'''
+import os
+import io
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+import importlib.util
+import platform
+import contextlib
+import warnings
+from time import perf_counter
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path[:0] = [os.path.join(ROOT, 'valuation'), ROOT]
+
+RESULTS = os.path.join(HERE, 'results', 'latest.json')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+#fraction slower than baseline that counts as a regression
+TOLERANCE = 0.25
+
+
+def bench(name, func, repeat=5, number=1, setup=None):
+    '''
+    Times func.
+
+    Parameters
+    ----------
+    name : string
+
+    func : callable
+        Called number times per repeat.
+    repeat : int, optional
+        The default is 5.
+    number : int, optional
+        The default is 1.
+    setup : callable, optional
+        Called before each repeat, untimed. The default is None.
+
+    Returns
+    -------
+    dict
+        name, best and mean seconds per call.
+
+    '''
+
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        times.append((perf_counter() - start) / number)
+
+    print('{:<45} {:>12.6f}s'.format(name, min(times)), file=sys.__stdout__, flush=True)
+
+    return {'name' : name, 'best' : min(times), 'mean' : float(np.mean(times)),
+            'repeat' : repeat, 'number' : number}
+
+@contextlib.contextmanager
+def quiet():
+    '''
+    Swallows the progress printing and warnings of the code under test.
+    '''
+
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+def synthetic_equities(n, seed=0):
+    '''
+    n Equity objects with random fundamentals and a price.
+    '''
+
+    from valuation import Equity
+
+    rng = np.random.default_rng(seed)
+    equities = []
+    for i in range(n):
+        stock = Equity('T' + str(i))
+        stock.data = {'EPS' : rng.normal(3, 2), 'Growth Rate' : rng.uniform(-0.1, 0.4),
+                      'Median Historical P/E' : rng.uniform(5, 40),
+                      'Cash and Cash Equivalents' : rng.uniform(0, 1e9),
+                      'Total Liabilities' : rng.uniform(0, 1e9),
+                      'Free Cash Flow' : rng.normal(1e8, 1e8),
+                      'Shares Outstanding' : rng.uniform(1e6, 1e9),
+                      'Shareholders Equity' : rng.uniform(1e8, 1e10),
+                      'Return on Equity 5-yr' : rng.uniform(0, 0.3),
+                      'Dividend Per Share' : rng.uniform(0, 3)}
+        stock.quote = {'Price' : rng.uniform(5, 200), 'Date' : datetime.today().date()}
+        equities.append(stock)
+
+    return equities
+
+def micro_benchmarks():
+
+    from valuation_utils import float_convert, check_float, parse_page
+    from valuation import Equity
+    from standin_server import synthetic_fixtures
+    from result_store import ResultStore
+
+    results = []
+    stock = synthetic_equities(1)[0]
+
+    with quiet():
+        for method in ['pe', 'dcf', 'roe']:
+            results.append(bench('Equity.value ' + method, lambda: stock.value(method),
+                                 number=2000))
+
+        equities = synthetic_equities(1000)
+        for e in equities:
+            e.all_value()
+            e.get_value_returns()
+        results.append(bench('out_all x1000', lambda: [e.out_all() for e in equities]))
+        frames = [e.out_all() for e in equities]
+        results.append(bench('pd.concat x1000', lambda: pd.concat(frames)))
+
+        def store_frame():
+            store = ResultStore(len(equities))
+            for e in equities:
+                store.append(e)
+            return store.to_frame()
+        results.append(bench('ResultStore x1000', store_frame))
+
+        results.append(bench('float_convert', lambda: float_convert('1,234.5', 1e6), number=20000))
+        results.append(bench('float_convert bad value', lambda: float_convert('—'), number=20000))
+        results.append(bench('check_float', lambda: check_float('1,234.5'), number=20000))
+        results.append(bench('check_float bad value', lambda: check_float('—'), number=20000))
+
+    fixtures = synthetic_fixtures(['BENCH'])
+    pages = {
+        'yahoo_quote' : fixtures['/yahoo/quote/BENCH'],
+        'morningstar_balance' : fixtures['/morningstar/balance-sheet/bs.html?t=BENCH'],
+        'morningstar_ratio' : fixtures['/morningstar/ratios/r.html?t=BENCH']
+        }
+    for page, html in pages.items():
+        results.append(bench('parse full html.parser ' + page,
+                             lambda: parse_page(html, None, 'html.parser')))
+        results.append(bench('parse targeted ' + page,
+                             lambda: parse_page(html, Equity.PAGE_STRAINERS[page])))
+
+    return results
+
+def e2e_benchmarks(sizes=(10, 100, 1000), workers=8, latency=0.0):
+
+    import valuation
+    import page_cache
+    from standin_server import StandIn, synthetic_fixtures
+
+    results = []
+    page_cache.use_cache(None)
+
+    for n in sizes:
+        tickers = ['T' + str(i) for i in range(n)]
+        fixtures = synthetic_fixtures(tickers, padding=20)
+        with StandIn(fixtures, latency=latency), quiet():
+            results.append(bench('evaluate_tickers x' + str(n),
+                                 lambda: valuation.evaluate_tickers(tickers, workers=workers),
+                                 repeat=1 if n >= 1000 else 3))
+
+    return results
+
+def synthetic_simfin(n_tickers=50, n_days=750, seed=0):
+    '''
+    Synthetic quarterly statements and daily prices shaped like the SimFin
+    bulk data, (Ticker, Report Date) and (Ticker, Date) indexed.
+    '''
+
+    rng = np.random.default_rng(seed)
+    tickers = ['T' + str(i) for i in range(n_tickers)]
+    days = pd.bdate_range('2018-01-01', periods=n_days)
+    quarters = pd.date_range('2017-09-30', days[-1], freq='QE')
+
+    def statements(columns):
+        index = pd.MultiIndex.from_product([tickers, quarters], names=['Ticker', 'Report Date'])
+        return pd.DataFrame(rng.lognormal(18, 1, (len(index), len(columns))),
+                            index=index, columns=columns)
+
+    income = statements(['Revenue', 'Pretax Income (Loss)', 'Interest Expense, Net', 'Net Income'])
+    balance = statements(['Total Assets', 'Total Current Assets', 'Total Current Liabilities',
+                          'Retained Earnings', 'Total Liabilities'])
+    cashflow = statements(['Net Cash from Operating Activities', 'Change in Fixed Assets & Intangibles'])
+
+    index = pd.MultiIndex.from_product([tickers, days], names=['Ticker', 'Date'])
+    prices = pd.DataFrame({'Close' : rng.lognormal(3, 0.5, len(index)),
+                           'Volume' : rng.lognormal(12, 1, len(index))}, index=index)
+    signals = pd.DataFrame({'Volume Market-Cap' : rng.lognormal(21, 1, len(index))}, index=index)
+    companies = pd.DataFrame(index=pd.Index(tickers, name='Ticker'))
+
+    return income, balance, cashflow, prices, signals, companies
+
+def asof_reference(source, index):
+    '''
+    AsOf(source).at(index) the slow way: per ticker, the statements are
+    reindexed onto their own dates plus the days in index and forward
+    filled. Tickers with no statements are left out.
+    '''
+
+    frames = []
+    tickers = set(source.index.get_level_values(0))
+    for ticker, group in pd.Series(0, index=index).groupby(level=0, sort=False):
+        if ticker not in tickers:
+            continue
+        reports = source.xs(ticker, level=0).sort_index()
+        days = group.index.get_level_values(1)
+        frame = reports.reindex(reports.index.union(days)).ffill().reindex(days)
+        frame.index = group.index
+        frames.append(frame)
+
+    return pd.concat(frames)
+
+def asof_fixture(n_tickers=100, n_days=500, seed=1):
+    '''
+    Synthetic balance and income statements and prices for the AsOf
+    checks. The balance sheet has irregular reports, tickers with no
+    statements, a report dated on a trading day, and rows out of order.
+    '''
+
+    income, balance, _, prices, _, _ = synthetic_simfin(n_tickers, n_days, seed)
+
+    rng = np.random.default_rng(seed)
+    balance = balance.iloc[rng.random(len(balance)) > 0.2].drop(['T3', 'T4'], level=0)
+    same_day = pd.MultiIndex.from_tuples([('T5', prices.loc['T5'].index[10])],
+                                         names=balance.index.names)
+    balance = pd.concat([balance, pd.DataFrame(7.0, index=same_day, columns=balance.columns)])
+    balance = balance.sample(frac=1, random_state=seed)
+
+    return balance, income, prices
+
+def check_asof():
+
+    from asof import AsOf
+
+    balance, income, prices = asof_fixture()
+    for statements in (balance, income):
+        pd.testing.assert_frame_equal(AsOf(statements).at(prices.index),
+                                      asof_reference(statements, prices.index), check_names=False)
+    print('AsOf matches reindex / ffill')
+
+def check_at_many(processes=2):
+
+    from asof import AsOf, at_many
+
+    balance, income, prices = asof_fixture()
+    frames = at_many([AsOf(balance), AsOf(income)], prices.index, processes=processes)
+    for frame, statements in zip(frames, (balance, income)):
+        pd.testing.assert_frame_equal(frame, asof_reference(statements, prices.index),
+                                      check_names=False)
+    print('at_many on {} processes matches reindex / ffill'.format(processes))
+
+def check_batch_valuation(n=2000):
+
+    from batch_valuation import value_frame
+
+    equities = synthetic_equities(n)
+    frame = pd.DataFrame([{**stock.data, **stock.quote} for stock in equities])
+    values = value_frame(frame)
+    with quiet():
+        for method, column in [('pe', 'P/E Valuation'), ('dcf', 'DCF Valuation'),
+                               ('roe', 'ROE Valuation')]:
+            expected = np.array([stock.value(method) for stock in equities])
+            np.testing.assert_array_equal(values[column].to_numpy(), expected,
+                                          err_msg=column + ' differs from Equity.value')
+    print('batch_valuation matches Equity.value to the bit')
+
+def factor_reference(income, balance, cashflow):
+    '''
+    Piotroski F and Beneish M with pandas: the statements are quarterly, so
+    the year before is four rows back in each ticker.
+    '''
+
+    now = pd.concat([income, balance, cashflow], axis=1).sort_index()
+    now['Long Term Debt'] = now['Long Term Debt'].fillna(0)
+    before = now.groupby(level=0).shift(4)
+
+    def ratios(d):
+        return {'roa' : d['Net Income'] / d['Total Assets'],
+                'cfo' : d['Net Cash from Operating Activities'],
+                'leverage' : d['Long Term Debt'] / d['Total Assets'],
+                'current' : d['Total Current Assets'] / d['Total Current Liabilities'],
+                'margin' : d['Gross Profit'] / d['Revenue'],
+                'turnover' : d['Revenue'] / d['Total Assets'],
+                'shares' : d['Shares (Diluted)'],
+                'receivables' : d['Accounts & Notes Receivable'] / d['Revenue'],
+                'quality' : 1 - (d['Total Current Assets'] + d['Property, Plant & Equipment, Net'])
+                                / d['Total Assets'],
+                'depreciation' : d['Depreciation & Amortization']
+                                 / (d['Depreciation & Amortization'] + d['Property, Plant & Equipment, Net']),
+                'sga' : d['Selling, General & Administrative'] / d['Revenue'],
+                'debt' : (d['Total Current Liabilities'] + d['Long Term Debt']) / d['Total Assets'],
+                'accruals' : (d['Net Income'] - d['Net Cash from Operating Activities']) / d['Total Assets'],
+                'revenue' : d['Revenue']}
+
+    c, p = ratios(now), ratios(before)
+    tests = [c['roa'] > 0, c['cfo'] > 0, c['roa'] > p['roa'],
+             c['cfo'] / now['Total Assets'] > c['roa'], c['leverage'] < p['leverage'],
+             c['current'] > p['current'], c['shares'] <= p['shares'],
+             c['margin'] > p['margin'], c['turnover'] > p['turnover']]
+    f = sum(test.astype(float) for test in tests).where(p['roa'].notna())
+    m = (-4.84 + 0.92 * (c['receivables'] / p['receivables']) + 0.528 * (p['margin'] / c['margin'])
+         + 0.404 * (c['quality'] / p['quality']) + 0.892 * (c['revenue'] / p['revenue'])
+         + 0.115 * (p['depreciation'] / c['depreciation']) - 0.172 * (c['sga'] / p['sga'])
+         + 4.679 * c['accruals'] - 0.327 * (c['debt'] / p['debt']))
+
+    return pd.DataFrame({'Piotroski F' : f, 'Beneish M' : m})
+
+def check_factor_engine(n_tickers=100, n_days=500, seed=3):
+
+    import factor_engine
+
+    income, balance, cashflow, _, _, _ = synthetic_simfin(n_tickers, n_days, seed)
+    rng = np.random.default_rng(seed)
+    for column in ['Gross Profit', 'Selling, General & Administrative', 'Shares (Diluted)']:
+        income[column] = rng.lognormal(17, 1, len(income))
+    for column in ['Accounts & Notes Receivable', 'Property, Plant & Equipment, Net', 'Long Term Debt']:
+        balance[column] = rng.lognormal(17, 1, len(balance))
+    balance.loc[balance.sample(frac=0.1, random_state=seed).index, 'Long Term Debt'] = np.nan
+    cashflow['Depreciation & Amortization'] = rng.lognormal(15, 1, len(cashflow))
+
+    scores = factor_engine.factor_scores(income, balance, cashflow,
+                                         outputs=['Piotroski F', 'Beneish M']).sort_index()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expected = factor_reference(income, balance, cashflow).reindex(scores.index)
+    np.testing.assert_array_equal(scores['Piotroski F'], expected['Piotroski F'])
+    np.testing.assert_allclose(scores['Beneish M'], expected['Beneish M'], rtol=1e-12)
+    print('Piotroski F and Beneish M match groupby / shift(4)')
+
+def whole_dollar_simfin(n_tickers=100, n_days=500, seed=2):
+    '''
+    synthetic_simfin with the statements and market caps in whole dollars,
+    as SimFin's are, and with negative values where SimFin's can have them.
+    '''
+
+    income, balance, cashflow, prices, signals, companies = synthetic_simfin(n_tickers, n_days, seed)
+    rng = np.random.default_rng(seed)
+    for frame in (income, balance, cashflow):
+        frame[:] = np.round(frame.to_numpy())
+    for frame, column in [(income, 'Pretax Income (Loss)'), (income, 'Interest Expense, Net'),
+                          (income, 'Net Income'), (balance, 'Retained Earnings')]:
+        frame[column] *= rng.choice([-1.0, 1.0], len(frame))
+    signals['Volume Market-Cap'] = np.round(signals['Volume Market-Cap'])
+
+    return income, balance, cashflow, prices.sort_index(), signals.sort_index(), companies
+
+#largest difference compact mode may make, relative to 1 + |Altman Z|, and
+#to the explained variance ratios and components of the PCA
+COMPACT_ZTOL = 1e-4
+COMPACT_PCATOL = 1e-4
+
+def check_compact():
+
+    import simfin_data
+
+    def altman_and_pca():
+        z = simfin_data.altman_z_test(rand=False)
+        x = z[simfin_data.altman_factors].replace([np.inf, -np.inf], np.nan).dropna()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            pca, _ = simfin_data.pca_analysis(x)
+        return z['Altman Z'].to_numpy(np.float64), pca
+
+    names = ['df_income', 'df_balance', 'df_cashflow', 'df_prices', 'df_volume_signals', 'df_companies']
+    for name, frame in zip(names, whole_dollar_simfin()):
+        setattr(simfin_data, name, frame)
+    compact = simfin_data.COMPACT
+    try:
+        z, pca = altman_and_pca()
+        with quiet():
+            simfin_data.compact_datasets()
+        z_, pca_ = altman_and_pca()
+        daily = simfin_data.daily_fin_data()
+    finally:
+        simfin_data.COMPACT = compact
+
+    #the statements, and so the daily panels, have to actually shrink
+    for frame in [simfin_data.df_income, simfin_data.df_balance, simfin_data.df_cashflow, *daily]:
+        assert (frame.dtypes == np.float32).all(), frame.dtypes[frame.dtypes != np.float32]
+
+    np.testing.assert_array_equal(np.isnan(z), np.isnan(z_))
+    error = np.nanmax(np.abs(z - z_) / (1 + np.abs(z)))
+    assert error <= COMPACT_ZTOL, 'Altman Z off by {:.2e}'.format(error)
+    np.testing.assert_allclose(pca_.explained_variance_ratio_, pca.explained_variance_ratio_,
+                               rtol=0, atol=COMPACT_PCATOL)
+    #components are only defined up to sign
+    np.testing.assert_allclose(np.abs(pca_.components_), np.abs(pca.components_),
+                               rtol=0, atol=COMPACT_PCATOL)
+    print('compact Altman Z and PCA match float64 on whole dollars, Z within {:.1e}'.format(error))
+
+def equivalence_checks():
+
+    check_asof()
+    check_at_many()
+    check_batch_valuation()
+    check_factor_engine()
+    check_compact()
+
+    return []
+
+#process counts to time the parallel daily_fin_data at, against serial
+REINDEX_PROCESSES = (2, 4, 8)
+
+def simfin_benchmarks():
+
+    #simfin_data imports simfin lazily, so check for it up front
+    if importlib.util.find_spec('simfin') is None:
+        print('skipping simfin benchmarks: simfin is not installed')
+        return []
+
+    try:
+        with quiet():
+            import simfin_data
+    except Exception as e:
+        print('skipping simfin benchmarks: ' + str(e))
+        return []
+
+    income, balance, cashflow, prices, signals, companies = synthetic_simfin()
+    simfin_data.df_income, simfin_data.df_balance = income, balance
+    simfin_data.df_cashflow, simfin_data.df_prices = cashflow, prices
+    simfin_data.df_companies = companies
+
+    results = []
+    with quiet():
+        results.append(bench('daily_fin_data', simfin_data.daily_fin_data, repeat=3))
+        for processes in REINDEX_PROCESSES:
+            results.append(bench('daily_fin_data processes=' + str(processes), 
+                                 lambda: simfin_data.daily_fin_data(processes=processes), repeat=3))
+        serial = results[0]['best']
+        speedups = ['{} processes {:.2f}x'.format(n, serial / r['best']) 
+                    for n, r in zip(REINDEX_PROCESSES, results[1:])]
+    print('daily_fin_data speedup: ' + ', '.join(speedups))
+    with quiet():
+        income_daily, balance_daily, cashflow_daily = simfin_data.daily_fin_data()
+        simfin_data.df_income_daily = income_daily
+        simfin_data.df_balance_daily = balance_daily
+        simfin_data.df_cashflow_daily = cashflow_daily
+        simfin_data.df_volume_signals = signals
+
+        results.append(bench('altman_z_test', lambda: simfin_data.altman_z_test(rand=False), repeat=3))
+        results.append(bench('daily_factor_scores', simfin_data.daily_factor_scores, repeat=3))
+        x = simfin_data.altman_z_test(rand=False)[simfin_data.altman_factors]
+        x = x.replace([np.inf, -np.inf], np.nan).dropna()
+        results.append(bench('pca_analysis', lambda: simfin_data.pca_analysis(x), repeat=3))
+        x_path = os.path.join(tempfile.mkdtemp(), 'x_.npy')
+        for solver in ('incremental', 'randomized'):
+            results.append(bench('pca_analysis out of core ' + solver,
+                                 lambda: simfin_data.pca_analysis(x, batch_size=10000, solver=solver,
+                                                                  x_path=x_path), repeat=3))
+        
+        report = simfin_data.compact_datasets()
+        results.append(bench('altman_z_test compact', lambda: simfin_data.altman_z_test(rand=False), 
+                             repeat=3))
+    print(report.round(1))
+
+    return results
+
+#run in a fresh, isolated interpreter (python -I). Prints the seconds the
+#import took, or with {{trace}} on, the peak Python allocations made by it
+#(tracemalloc) and how much it grew RSS, in bytes. The two are separate runs
+#so tracing doesn't slow the timed import.
+STARTUP_SCRIPT = '''
+import sys
+from time import perf_counter
+sys.path[:0] = {paths!r}
+
+def rss():
+    try:
+        with open('/proc/self/status') as f:
+            line = [l for l in f if l.startswith('VmRSS:')][0]
+        return int(line.split()[1]) * 1024
+    except (OSError, IndexError):
+        return float('nan')
+
+if {trace}:
+    import tracemalloc
+    before = rss()
+    tracemalloc.start()
+    import {module}
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(peak, rss() - before)
+else:
+    start = perf_counter()
+    import {module}
+    print(perf_counter() - start)
+'''
+
+#the last commit before imports were made lazy (user-018), timed by the
+#startup group next to the working tree as the before numbers
+STARTUP_BASELINE_REV = 'caaf6db'
+
+def export_revision(rev):
+    '''
+    The tree at git revision rev, written to a temp directory. The dead
+    test_utils import valuation.py had then is dropped, so valuation can
+    be imported at all.
+
+    Returns
+    -------
+    string
+        the directory, or None if git can't produce rev.
+
+    '''
+
+    import tarfile
+
+    run = subprocess.run(['git', '-C', ROOT, 'archive', '--format=tar', rev], capture_output=True)
+    if run.returncode != 0:
+        return None
+
+    directory = tempfile.mkdtemp(prefix='startup_' + rev + '_')
+    with tarfile.open(fileobj=io.BytesIO(run.stdout)) as tar:
+        tar.extractall(directory, filter='data')
+
+    path = os.path.join(directory, 'valuation', 'valuation.py')
+    with open(path, encoding='utf-8') as f:
+        lines = [line for line in f if line.strip() != 'from test_utils import *']
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+    return directory
+
+def startup_run(module, root, trace):
+
+    paths = [root] if module == 'simfin_data' else [os.path.join(root, 'valuation'), root]
+    script = STARTUP_SCRIPT.format(paths=paths, module=module, trace=trace)
+    run = subprocess.run([sys.executable, '-I', '-c', script], cwd=root,
+                         capture_output=True, text=True)
+    if run.returncode != 0:
+        raise ImportError(run.stderr.strip().splitlines()[-1])
+
+    return [float(value) for value in run.stdout.split()]
+
+def startup_benchmarks(modules=('sys', 'valuation', 'simfin_data'), repeat=5,
+                       baseline_rev=STARTUP_BASELINE_REV):
+    '''
+    Import time, peak Python allocations and RSS growth of each module in a
+    fresh interpreter, for the working tree and for the tree at
+    baseline_rev. sys is already loaded, so it gives the cost of the
+    interpreter itself.
+    '''
+
+    roots = [('', ROOT)]
+    if baseline_rev:
+        directory = export_revision(baseline_rev)
+        if directory is None:
+            print('skipping startup at ' + baseline_rev + ': git archive failed')
+        else:
+            roots.append((' @' + baseline_rev, directory))
+
+    results = []
+    try:
+        for label, root in roots:
+            for module in modules:
+                name = 'import ' + module + label
+                try:
+                    times = [startup_run(module, root, False)[0] for _ in range(repeat)]
+                    peak, rss = startup_run(module, root, True)
+                except ImportError as e:
+                    print('skipping ' + name + ': ' + str(e))
+                    continue
+
+                print('{:<45} {:>12.6f}s {:>8.1f}MB peak {:>8.1f}MB RSS'.format(
+                          name, min(times), peak / 1024**2, rss / 1024**2),
+                      file=sys.__stdout__, flush=True)
+                results.append({'name' : name, 'best' : min(times),
+                                'mean' : float(np.mean(times)), 'repeat' : len(times),
+                                'number' : 1, 'peak_mb' : peak / 1024**2, 
+                                'rss_mb' : rss / 1024**2})
+    finally:
+        for _, root in roots[1:]:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return results
+
+GROUPS = {
+    'check' : equivalence_checks,
+    'micro' : micro_benchmarks,
+    'e2e' : e2e_benchmarks,
+    'simfin' : simfin_benchmarks,
+    'startup' : startup_benchmarks
+    }
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    '''
+    Benchmarks that got slower than baseline by more than tolerance.
+
+    Returns
+    -------
+    list
+        (name, baseline seconds, seconds) for each regression.
+
+    '''
+
+    base = {r['name'] : r['best'] for r in baseline['results']}
+
+    return [(r['name'], base[r['name']], r['best']) for r in results
+            if r['name'] in base and r['best'] > base[r['name']] * (1 + tolerance)]
+
+#flags main understands, see the module docstring
+FLAGS = ('--update-baseline', '--no-compare', '--help', '-h')
+
+USAGE = '''usage: python benchmarks/benchmark_suite.py [group ...] [--update-baseline] [--no-compare]
+
+groups: {}, default all
+--update-baseline  save this run as benchmarks/baseline.json
+--no-compare       only time, don't compare against the baseline'''
+
+def main(args):
+
+    if '--help' in args or '-h' in args:
+        print(USAGE.format(', '.join(GROUPS)))
+        return 0
+
+    unknown = [a for a in args if a not in FLAGS and a not in GROUPS]
+    if unknown:
+        print('unknown argument(s): ' + ' '.join(unknown), file=sys.stderr)
+        print(USAGE.format(', '.join(GROUPS)), file=sys.stderr)
+        return 2
+
+    update = '--update-baseline' in args
+    no_compare = '--no-compare' in args
+    groups = [a for a in args if a in GROUPS] or list(GROUPS.keys())
+
+    results = []
+    for group in groups:
+        print('-- ' + group)
+        results += GROUPS[group]()
+
+    run = {'date' : datetime.now().isoformat(timespec='seconds'),
+           'python' : platform.python_version(),
+           'machine' : platform.node(),
+           'results' : results}
+
+    os.makedirs(os.path.dirname(RESULTS), exist_ok=True)
+    with open(RESULTS, 'w') as f:
+        json.dump(run, f, indent=2)
+
+    if update:
+        with open(BASELINE, 'w') as f:
+            json.dump(run, f, indent=2)
+        print('saved baseline to ' + BASELINE)
+        return 0
+
+    if no_compare:
+        return 0
+
+    if not os.path.exists(BASELINE):
+        print('ERROR no baseline at ' + BASELINE + ', nothing was compared. Run with '
+              '--update-baseline to save one, or --no-compare to only time', file=sys.stderr)
+        return 2
+
+    with open(BASELINE) as f:
+        regressions = compare(results, json.load(f))
+
+    for name, base, now in regressions:
+        print('REGRESSION {}: {:.6f}s -> {:.6f}s ({:+.0%})'.format(name, base, now, now / base - 1))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main(sys.argv[1:]))
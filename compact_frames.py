@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 23:31:07 2026
+
+@author: David Billingsley
+"""
+
+'''
+Compact in-memory forms of the SimFin frames, for running the analysis over
+the whole market on a box that can't hold the float64 daily panels.
+
+    - float64 columns become float32 when the values stay within float32's
+      range and the round trip stays within rtol relative error. Statement
+      values are whole dollars far above 2**24, so they lose their last
+      digits, which rtol allows for. Columns in EXACT_COLUMNS (ids, share
+      counts) are kept float64 so they stay exact.
+    - integer columns take the narrowest int type that holds them.
+    - string columns (Currency, Fiscal Period, ...) become categoricals.
+    - (Ticker, Date) MultiIndexes are rebuilt from their levels and integer
+      codes, so each ticker string is held once and any tuples pandas has
+      built for the index are dropped.
+    - frames that have the same index share one copy of it.
+
+    df_prices = compact(df_prices)
+    memory_usage({'df_prices' : df_prices})     #MB per frame
+'''
+import numpy as np
+try:
+    from valuation.lazy import lazy_import
+except ImportError:
+    #valuation/ itself is on the path, so valuation is valuation.py
+    from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+#largest relative error float32 is allowed to introduce
+RTOL = 1e-6
+
+#float columns that must stay exact, so are never made float32
+EXACT_COLUMNS = ('SimFinId', 'Fiscal Year', 'Shares (Basic)', 'Shares (Diluted)',
+                 'Shares Outstanding', 'Common Shares Outstanding')
+
+
+def float32_safe(values, rtol=RTOL):
+    '''
+    Whether a float64 array can be stored as float32.
+    '''
+
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return True
+
+    if np.abs(finite).max() > np.finfo(np.float32).max:
+        return False
+
+    small = finite.astype(np.float32).astype(np.float64)
+    nonzero = finite != 0
+    error = np.abs(small[nonzero] - finite[nonzero]) / np.abs(finite[nonzero])
+
+    return not len(error) or error.max() <= rtol
+
+def compact_column(series, rtol=RTOL, exact=EXACT_COLUMNS):
+    '''
+    The column in its compact dtype, or as is if there isn't one. Float 
+    columns named in exact stay as they are.
+    '''
+
+    kind = series.dtype.kind
+
+    if kind == 'f' and series.dtype.itemsize > 4:
+        if series.name in exact:
+            return series
+        values = series.to_numpy()
+        return series.astype(np.float32) if float32_safe(values, rtol) else series
+
+    if kind in 'iu':
+        return pd.to_numeric(series, downcast='integer' if kind == 'i' else 'unsigned')
+
+    if kind == 'O' or series.dtype == 'string':
+        #only worth it when values repeat
+        if series.nunique(dropna=True) <= len(series) // 2:
+            return series.astype('category')
+
+    return series
+
+def compact_index(index):
+    '''
+    A MultiIndex rebuilt from its levels and codes, without any tuples
+    pandas has cached for it. Other indexes are returned as is.
+    '''
+
+    if not isinstance(index, pd.MultiIndex):
+        return index
+
+    return pd.MultiIndex(levels=index.levels, codes=index.codes, names=index.names,
+                         verify_integrity=False)
+
+def compact(df, rtol=RTOL, exact=EXACT_COLUMNS):
+    '''
+    A compact copy of a SimFin frame, see the module docstring.
+
+    Parameters
+    ----------
+    df : DataFrame or Series
+
+    rtol : float, optional
+        Largest relative error allowed when going to float32. The default
+        is RTOL.
+    exact : list, optional
+        Float columns to keep float64. The default is EXACT_COLUMNS.
+
+    Returns
+    -------
+    DataFrame or Series
+
+    '''
+
+    if isinstance(df, pd.Series):
+        return compact_column(df, rtol, exact).set_axis(compact_index(df.index))
+
+    columns = {column : compact_column(df[column], rtol, exact) for column in df.columns}
+    out = pd.DataFrame(columns, copy=False)
+    out.index = compact_index(df.index)
+
+    return out
+
+def share_indexes(frames):
+    '''
+    Makes frames with equal indexes use the same index object, so it is
+    held in memory once.
+
+    Parameters
+    ----------
+    frames : list
+        DataFrames, changed in place.
+
+    Returns
+    -------
+    list
+        the frames.
+
+    '''
+
+    shared = []
+    for frame in frames:
+        for index in shared:
+            if frame.index is index:
+                break
+            if len(frame.index) == len(index) and frame.index.equals(index):
+                frame.index = index
+                break
+        else:
+            shared.append(frame.index)
+
+    return frames
+
+def memory_usage(frames):
+    '''
+    Memory used by each frame, index included.
+
+    Parameters
+    ----------
+    frames : dict
+        name -> DataFrame or Series
+
+    Returns
+    -------
+    Series
+        name -> MB. An index shared with a frame earlier in frames is only
+        counted there.
+
+    '''
+
+    seen = set()
+    usage = {}
+    for name, frame in frames.items():
+        total = frame.memory_usage(deep=True, index=False)
+        total = total.sum() if isinstance(total, pd.Series) else total
+        if id(frame.index) not in seen:
+            seen.add(id(frame.index))
+            total += frame.index.memory_usage(deep=True)
+        usage[name] = total / 2**20
+
+    return pd.Series(usage, name='MB')
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:24:41 2026
+
+@author: David Billingsley
+"""
+
+'''
+Altman Z, Piotroski F and Beneish M from the SimFin statements, computed
+together. The three scores are built from the same handful of ratios (asset
+turnover, margins, leverage, accruals) and their year-over-year changes, so
+each ratio is computed once per chunk of tickers and kept, and each
+statement column is only read if some ratio needs it.
+
+Everything is worked out at report frequency, one row per balance sheet
+report, with the income and cash flow statements (and market cap, for X4)
+taken as of the report date and the prior year's values as of a year
+before it, see asof.py. Scores on the daily price grid are then one as-of
+lookup into that, instead of another pass over daily panels.
+
+    scores = factor_scores(df_income, df_balance, df_cashflow,
+                           market_cap=df_volume_signals['Volume Market-Cap'])
+    scores[['Altman Z', 'Piotroski F', 'Beneish M']]
+
+To add a score, write it as a function of a Factors object (see piotroski_f)
+and add it to SCORES; ratios it shares with the others come from the memo.
+'''
+import numpy as np
+from asof import AsOf
+try:
+    from valuation.lazy import lazy_import
+except ImportError:
+    #valuation/ itself is on the path, so valuation is valuation.py
+    from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+#column names, as in simfin.names
+REVENUE = 'Revenue'
+GROSS_PROFIT = 'Gross Profit'
+SGA = 'Selling, General & Administrative'
+PRETAX_INCOME = 'Pretax Income (Loss)'
+INTEREST_EXPENSE = 'Interest Expense, Net'
+NET_INCOME = 'Net Income'
+SHARES_DILUTED = 'Shares (Diluted)'
+RECEIVABLES = 'Accounts & Notes Receivable'
+TOTAL_CURRENT_ASSETS = 'Total Current Assets'
+PPE = 'Property, Plant & Equipment, Net'
+TOTAL_ASSETS = 'Total Assets'
+TOTAL_CURRENT_LIABILITIES = 'Total Current Liabilities'
+LONG_TERM_DEBT = 'Long Term Debt'
+TOTAL_LIABILITIES = 'Total Liabilities'
+RETAINED_EARNINGS = 'Retained Earnings'
+DEPRECIATION = 'Depreciation & Amortization'
+CFO = 'Net Cash from Operating Activities'
+MARKET_CAP = 'Volume Market-Cap'
+
+#statement each column is read from
+SOURCES = {
+    'income' : [REVENUE, GROSS_PROFIT, SGA, PRETAX_INCOME, INTEREST_EXPENSE, NET_INCOME,
+                SHARES_DILUTED],
+    'balance' : [RECEIVABLES, TOTAL_CURRENT_ASSETS, PPE, TOTAL_ASSETS,
+                 TOTAL_CURRENT_LIABILITIES, LONG_TERM_DEBT, TOTAL_LIABILITIES,
+                 RETAINED_EARNINGS],
+    'cashflow' : [DEPRECIATION, CFO],
+    'market_cap' : [MARKET_CAP]
+    }
+
+#SimFin leaves these empty when a company has none
+ZERO_IF_MISSING = (LONG_TERM_DEBT,)
+
+#the prior year's report is the latest one on or before a year back, and no
+#more than a quarter older than that
+YEAR = 365
+PRIOR_TOLERANCE = 92
+
+#weight of each factor in Altman Z
+ALTMAN_WEIGHTS = {'X1' : 1.2, 'X2' : 1.4, 'X3' : 3.3, 'X4' : 0.6, 'X5' : 1.0}
+
+#Beneish (1999) 8 variable model
+BENEISH_INTERCEPT = -4.84
+BENEISH_WEIGHTS = {'DSRI' : 0.92, 'GMI' : 0.528, 'AQI' : 0.404, 'SGI' : 0.892,
+                   'DEPI' : 0.115, 'SGAI' : -0.172, 'TATA' : 4.679, 'LVGI' : -0.327}
+
+#tickers per chunk in factor_scores
+FACTOR_CHUNK = 1000
+
+
+def _ratio(numerator, denominator):
+
+    return lambda f, prior: f.column(numerator, prior) / f.column(denominator, prior)
+
+#ratios shared between the scores, computed for the current or prior year
+INTERMEDIATES = {
+    'roa' : _ratio(NET_INCOME, TOTAL_ASSETS),
+    'cfo_to_assets' : _ratio(CFO, TOTAL_ASSETS),
+    'leverage' : _ratio(LONG_TERM_DEBT, TOTAL_ASSETS),
+    'current_ratio' : _ratio(TOTAL_CURRENT_ASSETS, TOTAL_CURRENT_LIABILITIES),
+    'gross_margin' : _ratio(GROSS_PROFIT, REVENUE),
+    'asset_turnover' : _ratio(REVENUE, TOTAL_ASSETS),
+    'receivables_to_sales' : _ratio(RECEIVABLES, REVENUE),
+    'sga_to_sales' : _ratio(SGA, REVENUE),
+    'retained_earnings' : _ratio(RETAINED_EARNINGS, TOTAL_ASSETS),
+    'working_capital' : lambda f, prior: (f.column(TOTAL_CURRENT_ASSETS, prior) -
+                                          f.column(TOTAL_CURRENT_LIABILITIES, prior)) /
+                                         f.column(TOTAL_ASSETS, prior),
+    'ebit_to_assets' : lambda f, prior: (f.column(PRETAX_INCOME, prior) -
+                                         f.column(INTEREST_EXPENSE, prior)) /
+                                        f.column(TOTAL_ASSETS, prior),
+    'market_leverage' : _ratio(MARKET_CAP, TOTAL_LIABILITIES),
+    'asset_quality' : lambda f, prior: 1 - (f.column(TOTAL_CURRENT_ASSETS, prior) +
+                                            f.column(PPE, prior)) / f.column(TOTAL_ASSETS, prior),
+    'depreciation_rate' : lambda f, prior: f.column(DEPRECIATION, prior) /
+                                           (f.column(DEPRECIATION, prior) + f.column(PPE, prior)),
+    'total_leverage' : lambda f, prior: (f.column(TOTAL_CURRENT_LIABILITIES, prior) +
+                                         f.column(LONG_TERM_DEBT, prior)) /
+                                        f.column(TOTAL_ASSETS, prior),
+    'accruals' : lambda f, prior: (f.column(NET_INCOME, prior) - f.column(CFO, prior)) /
+                                  f.column(TOTAL_ASSETS, prior),
+    }
+
+
+class Factors():
+    '''
+    Statement columns, ratios and scores for one chunk of report rows, each
+    computed the first time it is asked for and then kept.
+    '''
+
+    def __init__(self, fetch):
+        '''
+        Parameters
+        ----------
+        fetch : callable
+            fetch(column, prior) -> numpy array of the column for every row
+            of the chunk, for the current or prior year, np.nan where there
+            is no value.
+
+        '''
+
+        self.fetch = fetch
+        self.memo = {}
+
+    def remember(self, key, compute):
+
+        if key not in self.memo:
+            self.memo[key] = compute()
+
+        return self.memo[key]
+
+    def column(self, name, prior=False):
+
+        return self.remember(('column', name, prior),
+                             lambda: np.asarray(self.fetch(name, prior), dtype=np.float64))
+
+    def get(self, name, prior=False):
+        '''
+        An intermediate ratio from INTERMEDIATES.
+        '''
+
+        return self.remember((name, prior), lambda: INTERMEDIATES[name](self, prior))
+
+    def delta(self, name):
+        '''
+        Change in a ratio (or column) since the prior year.
+        '''
+
+        get = self.get if name in INTERMEDIATES else self.column
+
+        return self.remember(('delta', name), lambda: get(name) - get(name, True))
+
+    def index(self, name):
+        '''
+        A ratio over its prior year value, as in Beneish's indexes.
+        '''
+
+        return self.remember(('index', name), lambda: self.get(name) / self.get(name, True))
+
+    def score(self, name):
+
+        return self.remember(('score', name), lambda: SCORES[name](self))
+
+
+def points(passed, *inputs):
+    '''
+    1.0 where a Piotroski test passed, 0.0 where it failed and np.nan where
+    any of its inputs is missing.
+    '''
+
+    out = passed.astype(np.float64)
+    for values in inputs:
+        out[np.isnan(values)] = np.nan
+
+    return out
+
+def weighted_sum(factors, weights, start=None):
+    '''
+    start + the sum of weight * factor, added up left to right in the order
+    of weights, with one buffer for the terms.
+    '''
+
+    names = list(weights)
+    total = np.multiply(factors[names[0]], weights[names[0]])
+    if start is not None:
+        np.add(start, total, out=total)
+
+    term = np.empty_like(total)
+    for name in names[1:]:
+        np.multiply(factors[name], weights[name], out=term)
+        total += term
+
+    return total
+
+def altman_factors(f):
+
+    return {'X1' : f.get('working_capital'), 'X2' : f.get('retained_earnings'),
+            'X3' : f.get('ebit_to_assets'), 'X4' : f.get('market_leverage'),
+            'X5' : f.get('asset_turnover')}
+
+def altman_z(f):
+    '''
+    1.2 X1 + 1.4 X2 + 3.3 X3 + 0.6 X4 + 1.0 X5, with market cap as of the
+    report date.
+    '''
+
+    return weighted_sum(altman_factors(f), ALTMAN_WEIGHTS)
+
+def piotroski_f(f):
+    '''
+    Piotroski F-score, 0 to 9, from the nine tests of Piotroski (2000).
+    np.nan if any test can't be decided.
+    '''
+
+    roa, cfo = f.get('roa'), f.column(CFO)
+    tests = [
+        points(roa > 0, roa),
+        points(cfo > 0, cfo),
+        points(f.delta('roa') > 0, f.delta('roa')),
+        points(f.get('cfo_to_assets') > roa, f.get('cfo_to_assets'), roa),
+        points(f.delta('leverage') < 0, f.delta('leverage')),
+        points(f.delta('current_ratio') > 0, f.delta('current_ratio')),
+        points(f.delta(SHARES_DILUTED) <= 0, f.delta(SHARES_DILUTED)),
+        points(f.delta('gross_margin') > 0, f.delta('gross_margin')),
+        points(f.delta('asset_turnover') > 0, f.delta('asset_turnover'))]
+
+    return np.sum(tests, axis=0)
+
+def beneish_factors(f):
+
+    return {'DSRI' : f.index('receivables_to_sales'),
+            #margins and depreciation rates are the prior year over this one
+            'GMI' : 1 / f.index('gross_margin'),
+            'AQI' : f.index('asset_quality'),
+            'SGI' : f.column(REVENUE) / f.column(REVENUE, True),
+            'DEPI' : 1 / f.index('depreciation_rate'),
+            'SGAI' : f.index('sga_to_sales'),
+            'TATA' : f.get('accruals'),
+            'LVGI' : f.index('total_leverage')}
+
+def beneish_m(f):
+    '''
+    Beneish M-score, above about -1.78 suggests earnings manipulation.
+    '''
+
+    return weighted_sum(beneish_factors(f), BENEISH_WEIGHTS, start=BENEISH_INTERCEPT)
+
+#score name -> function of a Factors object
+SCORES = {
+    'Altman Z' : altman_z,
+    'Piotroski F' : piotroski_f,
+    'Beneish M' : beneish_m
+    }
+
+#outputs that are a factor of a score rather than a score
+FACTORS = {
+    'X1' : lambda f: f.get('working_capital'),
+    'X2' : lambda f: f.get('retained_earnings'),
+    'X3' : lambda f: f.get('ebit_to_assets'),
+    'X4' : lambda f: f.get('market_leverage'),
+    'X5' : lambda f: f.get('asset_turnover'),
+    TOTAL_LIABILITIES : lambda f: f.column(TOTAL_LIABILITIES),
+    }
+
+SCORE_COLUMNS = ['X1', 'X2', 'X3', 'X4', 'X5', 'Altman Z', 'Piotroski F', 'Beneish M']
+
+
+def output(f, name):
+    '''
+    A score, a factor of one, or an intermediate ratio, by name.
+    '''
+
+    if name in SCORES:
+        return f.score(name)
+    if name in FACTORS:
+        return FACTORS[name](f)
+
+    return f.get(name)
+
+def chunk_fetch(engines, tickers, days):
+    '''
+    fetch for Factors over report rows given by ticker and day number: each
+    statement is looked up as of the report date, and as of a year before
+    for the prior year. Positions are found once per statement and period.
+    '''
+
+    columns = {column : name for name, names in SOURCES.items() for column in names}
+    dates = {False : days.astype('datetime64[D]'),
+             True : (days - YEAR).astype('datetime64[D]')}
+    found = {}
+
+    def positions(name, prior):
+        if (name, prior) not in found:
+            engine = engines[name]
+            rows = engine.positions(tickers, dates[prior])
+            if prior:
+                #too old to be the prior year
+                old = engine.report_days(rows) < days - YEAR - PRIOR_TOLERANCE
+                rows = np.where(old, -1, rows)
+            found[name, prior] = rows
+        return found[name, prior]
+
+    def fetch(column, prior):
+        name = columns[column]
+        if name not in engines or column not in engines[name].columns:
+            return np.full(len(days), np.nan)
+        rows = positions(name, prior)
+        values = engines[name].take(rows, [column])[column].astype(np.float64)
+        if column in ZERO_IF_MISSING:
+            #only for reports that exist
+            values[np.isnan(values) & (rows >= 0)] = 0.0
+        return values
+
+    return fetch
+
+def factor_scores(income, balance, cashflow, market_cap=None, tickers=None,
+                  outputs=SCORE_COLUMNS, chunk=FACTOR_CHUNK):
+    '''
+    Scores for every balance sheet report.
+
+    Parameters
+    ----------
+    income, balance, cashflow : DataFrame
+        SimFin statements indexed by (Ticker, Report Date).
+    market_cap : Series, optional
+        Market cap indexed by (Ticker, Date), e.g.
+        df_volume_signals['Volume Market-Cap']. X4 and Altman Z are np.nan
+        without it. The default is None.
+    tickers : list, optional
+        The default is None, which is every ticker with a balance sheet.
+    outputs : list, optional
+        Scores, their factors (X1-X5, Total Liabilities) or INTERMEDIATES
+        to return. The default is SCORE_COLUMNS.
+    chunk : int, optional
+        Tickers computed at once. The default is FACTOR_CHUNK.
+
+    Returns
+    -------
+    DataFrame
+        indexed by (Ticker, Report Date), sorted.
+
+    '''
+
+    engines = {'income' : AsOf(income), 'balance' : AsOf(balance), 'cashflow' : AsOf(cashflow)}
+    if market_cap is not None:
+        engines['market_cap'] = AsOf(market_cap.to_frame(MARKET_CAP))
+
+    base = engines['balance']
+    codes = np.arange(len(base.tickers)) if tickers is None else \
+        np.unique(base.tickers.get_indexer(list(tickers)))
+    codes = codes[codes >= 0]
+    report_days = base.report_days(np.arange(len(base.keys)))
+
+    frames = []
+    for i in range(0, len(codes), chunk):
+        part = codes[i:i + chunk]
+        #rows of a ticker are contiguous in the sorted statement
+        starts = np.searchsorted(base.codes, part, side='left')
+        stops = np.searchsorted(base.codes, part, side='right')
+        rows = np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+
+        days = report_days[rows]
+        f = Factors(chunk_fetch(engines, base.tickers[base.codes[rows]], days))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = {name : output(f, name) for name in outputs}
+        frames.append(pd.DataFrame(out, index=base.frame.index[rows]))
+
+    if not frames:
+        return pd.DataFrame(columns=list(outputs))
+
+    return pd.concat(frames)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 01:12:53 2026
+
+@author: David Billingsley
+"""
+
+'''
+Out-of-core StandardScaler + PCA, for factor matrices with a row per ticker
+and day that are too big to scale and decompose in memory. The matrix is
+read in batches of rows, three times:
+
+    1. StandardScaler.partial_fit on each batch
+    2. each batch is scaled and written to x_, a memory-mapped .npy file
+    3. the components are fitted from x_ batch by batch, either with
+       IncrementalPCA ('incremental') or from the covariance matrix, built
+       up batch by batch, with a randomized SVD ('randomized')
+
+so memory is a few batches plus the features x features covariance, however
+many rows there are. The fitted pca and x_ can be used like the ones
+pca_analysis returns in memory.
+
+IncrementalPCA only carries n components from batch to batch, so it comes
+close to PCA rather than matching it. With a handful of features, as for the
+altman factors, 'randomized' gives the same components as an in-memory PCA
+to rounding.
+
+    pca, x_ = pca_out_of_core(x, n=2, batch_size=100000)
+'''
+import os
+import tempfile
+import numpy as np
+try:
+    from valuation.lazy import lazy_import
+except ImportError:
+    #valuation/ itself is on the path, so valuation is valuation.py
+    from lazy import lazy_import
+
+decomposition = lazy_import('sklearn.decomposition')
+preprocessing = lazy_import('sklearn.preprocessing')
+extmath = lazy_import('sklearn.utils.extmath')
+
+#rows read at once
+BATCH_SIZE = 100000
+
+SOLVERS = ('incremental', 'randomized')
+
+
+def batch_source(x, batch_size=BATCH_SIZE):
+    '''
+    A function that yields x in batches of rows, as float64 arrays, every
+    time it is called.
+
+    Parameters
+    ----------
+    x : DataFrame, array, memmap or callable
+        A callable is taken to be a batch source already and returned as is.
+    batch_size : int, optional
+        The default is BATCH_SIZE.
+
+    Returns
+    -------
+    callable
+
+    '''
+
+    if callable(x):
+        return x
+
+    def batches():
+        for start in range(0, len(x), batch_size):
+            rows = x.iloc[start:start + batch_size] if hasattr(x, 'iloc') else x[start:start + batch_size]
+            yield np.asarray(rows, dtype=np.float64)
+
+    return batches
+
+def fit_scaler(batches):
+    '''
+    StandardScaler fitted one batch at a time.
+
+    Returns
+    -------
+    tuple
+        (scaler, rows, features)
+
+    '''
+
+    scaler = preprocessing.StandardScaler()
+    rows = 0
+    for batch in batches():
+        if len(batch):
+            scaler.partial_fit(batch)
+            rows += len(batch)
+
+    if not rows:
+        raise ValueError('no rows to fit')
+
+    return scaler, rows, scaler.n_features_in_
+
+def write_scaled(batches, scaler, shape, path):
+    '''
+    Scales every batch and writes it to a memory-mapped .npy file at path.
+
+    Returns
+    -------
+    numpy memmap
+        opened read-only.
+
+    '''
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    x_ = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=shape)
+    start = 0
+    for batch in batches():
+        x_[start:start + len(batch)] = scaler.transform(batch)
+        start += len(batch)
+    x_.flush()
+    del x_
+
+    return np.load(path, mmap_mode='r')
+
+def scratch_path(directory=None):
+    '''
+    A new, uniquely named .npy file for x_, so calls never write over an
+    x_ that is still mapped. It is left on disk with x_; delete it once 
+    done with x_.
+
+    Parameters
+    ----------
+    directory : string, optional
+        The default is None, which is the system temp directory.
+
+    Returns
+    -------
+    string
+
+    '''
+
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    handle, path = tempfile.mkstemp(prefix='pca_x_', suffix='.npy', dir=directory)
+    os.close(handle)
+
+    return path
+
+def fit_incremental(x_, n, batch_size):
+    '''
+    IncrementalPCA fitted on x_ one batch at a time.
+    '''
+
+    pca = decomposition.IncrementalPCA(n_components=n)
+    #IncrementalPCA needs at least n rows in every batch, so the last, short
+    #batch is folded into the one before it
+    starts = list(range(0, len(x_), max(batch_size, n)))
+    if len(starts) > 1 and len(x_) - starts[-1] < n:
+        starts.pop()
+    for i, start in enumerate(starts):
+        stop = starts[i + 1] if i + 1 < len(starts) else len(x_)
+        pca.partial_fit(np.asarray(x_[start:stop]))
+
+    return pca
+
+def fit_randomized(x_, n, batch_size, seed=0):
+    '''
+    PCA from the covariance of x_, summed up one batch at a time, with a
+    randomized SVD. Returns a sklearn PCA with the fitted attributes set, so
+    transform, components_ and explained_variance_ratio_ work as usual.
+    '''
+
+    rows, features = x_.shape
+    total = np.zeros(features)
+    scatter = np.zeros((features, features))
+    for start in range(0, rows, batch_size):
+        batch = np.asarray(x_[start:start + batch_size])
+        total += batch.sum(axis=0)
+        scatter += batch.T @ batch
+
+    mean = total / rows
+    covariance = (scatter - rows * np.outer(mean, mean)) / (rows - 1)
+
+    #the covariance is symmetric, so its singular vectors are eigenvectors
+    U, S, Vt = extmath.randomized_svd(covariance, n, random_state=seed)
+    U, Vt = extmath.svd_flip(U, Vt, u_based_decision=False)
+
+    total_variance = np.trace(covariance)
+    pca = decomposition.PCA(n_components=n, svd_solver='randomized', random_state=seed)
+    pca.components_ = Vt
+    pca.explained_variance_ = S
+    pca.explained_variance_ratio_ = S / total_variance
+    pca.singular_values_ = np.sqrt(S * (rows - 1))
+    pca.mean_ = mean
+    pca.n_components_ = n
+    pca.n_samples_ = rows
+    pca.n_features_in_ = features
+    pca.noise_variance_ = (total_variance - S.sum()) / (features - n) if n < features else 0.0
+
+    return pca
+
+def pca_out_of_core(x, n=2, batch_size=BATCH_SIZE, solver='incremental', x_path=None):
+    '''
+    StandardScales x and fits a PCA to it, a batch of rows at a time.
+
+    Parameters
+    ----------
+    x : DataFrame, array, memmap or callable
+        the data to fit, or a function yielding it in batches (see
+        batch_source). Rows must be finite.
+    n : int, optional
+        the number of principal components. The default is 2.
+    batch_size : int, optional
+        Rows read at once. The default is BATCH_SIZE.
+    solver : string, optional
+        'incremental' or 'randomized'. The default is 'incremental'.
+    x_path : string, optional
+        .npy file to write the scaled data to, overwritten if it exists. 
+        The default is None, which writes a new temp file, see 
+        scratch_path.
+
+    Returns
+    -------
+    pca : IncrementalPCA or PCA
+        the fitted PCA object
+    x_ : numpy memmap
+        StandardScaler transformed data, read-only, on disk at x_path
+
+    '''
+
+    if solver not in SOLVERS:
+        raise ValueError('solver must be one of ' + ', '.join(SOLVERS))
+
+    batches = batch_source(x, batch_size)
+    x_path = scratch_path() if x_path is None else x_path
+
+    scaler, rows, features = fit_scaler(batches)
+    x_ = write_scaled(batches, scaler, (rows, features), x_path)
+
+    if solver == 'incremental':
+        pca = fit_incremental(x_, n, batch_size)
+    else:
+        pca = fit_randomized(x_, n, batch_size)
+
+    return pca, x_
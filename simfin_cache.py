@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 22:10:26 2026
+
+@author: David Billingsley
+"""
+
+'''
+Columnar binary cache for the SimFin bulk datasets. The first load of a
+dataset parses the SimFin CSV as usual, then writes every column (and index
+level) to its own .npy file. Numbers keep their dtype, so results don't
+change; strings (tickers, currencies, fiscal periods) are stored as small
+integer codes into a table of the distinct values, and load back as
+categoricals. Later loads memory-map those files, or read only the columns
+asked for, instead of parsing the CSV again.
+
+A cached dataset is rebuilt when it is older than its refresh window (the
+same refresh_days / refresh_days_shareprices the StockHub uses), when the
+SimFin CSV behind it has been downloaded again since, or when it was built
+with different parameters.
+
+    cached_frame('df_prices', lambda: hub.load_shareprices(variant='daily'),
+                 refresh_days=1, source='us-shareprices-daily.csv',
+                 columns=['Close'])
+'''
+import os
+import json
+import shutil
+import numpy as np
+from time import time
+try:
+    from valuation.lazy import lazy_import
+except ImportError:
+    #valuation/ itself is on the path, so valuation is valuation.py
+    from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simfin_cache')
+
+#bump when the file layout changes, so old caches are rebuilt
+VERSION = 1
+
+
+def compact(codes):
+    '''
+    Category codes in the narrowest int type that holds them.
+    '''
+
+    for dtype in (np.int8, np.int16, np.int32):
+        if len(codes) == 0 or codes.max() <= np.iinfo(dtype).max:
+            return codes.astype(dtype)
+
+    return codes.astype(np.int64)
+
+def encode(series):
+    '''
+    Splits a column into the arrays that are saved for it.
+
+    Returns
+    -------
+    tuple
+        (kind, arrays) where arrays is a dict of name -> numpy array.
+
+    '''
+
+    values = series.to_numpy()
+
+    if series.dtype.kind in 'biuf':
+        return 'numeric', {'values' : values}
+
+    if series.dtype.kind == 'M' and values.dtype.kind == 'M':
+        return 'datetime', {'values' : values}
+
+    #strings and everything else become category codes
+    codes, uniques = pd.factorize(series)
+    return 'category', {'codes' : compact(codes),
+                        'categories' : np.asarray(uniques.astype(str), dtype=str)}
+
+def decode(kind, arrays):
+
+    if kind == 'category':
+        return pd.Categorical.from_codes(arrays['codes'], arrays['categories'])
+
+    return arrays['values']
+
+def save_frame(df, path, signature=None):
+    '''
+    Writes a DataFrame as one .npy file per column and index level.
+
+    Parameters
+    ----------
+    df : DataFrame
+
+    path : string
+        directory to write to. Anything already there is replaced.
+    signature : dict, optional
+        Parameters the frame was built with, checked by cached_frame. The
+        default is None.
+
+    Returns
+    -------
+    None.
+
+    '''
+
+    tmp = path + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    index = df.index if isinstance(df.index, pd.MultiIndex) else pd.MultiIndex.from_arrays([df.index])
+    meta = {'version' : VERSION, 'created' : time(), 'signature' : signature or {},
+            'rows' : len(df), 'index' : [], 'columns' : []}
+
+    for i, name in enumerate(index.names):
+        level = pd.Series(index.levels[i])
+        kind, arrays = encode(level)
+        arrays['level_codes'] = compact(np.asarray(index.codes[i]))
+        files = {}
+        for key, values in arrays.items():
+            files[key] = 'index_{}_{}.npy'.format(i, key)
+            np.save(os.path.join(tmp, files[key]), values, allow_pickle=False)
+        meta['index'].append({'name' : name, 'kind' : kind, 'files' : files})
+
+    for i, column in enumerate(df.columns):
+        kind, arrays = encode(df[column])
+        files = {}
+        for key, values in arrays.items():
+            files[key] = 'column_{}_{}.npy'.format(i, key)
+            np.save(os.path.join(tmp, files[key]), values, allow_pickle=False)
+        meta['columns'].append({'name' : column, 'kind' : kind, 'files' : files})
+
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f, default=str)
+
+    #swap the finished directory in, so a crash never leaves half a cache
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp, path)
+
+def read_meta(path):
+    '''
+    The metadata of a cached frame, or None if there isn't one.
+    '''
+
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_frame(path, columns=None, mmap=True):
+    '''
+    Reads a frame written by save_frame.
+
+    Parameters
+    ----------
+    path : string
+
+    columns : list, optional
+        Columns to read. The default is None, which reads them all.
+    mmap : boolean, optional
+        Memory-map the numeric columns rather than reading them into memory.
+        The default is True.
+
+    Returns
+    -------
+    DataFrame
+
+    '''
+
+    meta = read_meta(path)
+    load = lambda name: np.load(os.path.join(path, name), allow_pickle=False,
+                                mmap_mode='r' if mmap else None)
+    arrays = lambda entry: {key : load(name) for key, name in entry['files'].items()}
+
+    levels, codes, names = [], [], []
+    for entry in meta['index']:
+        level = arrays(entry)
+        codes.append(level.pop('level_codes'))
+        #levels are distinct values already, so plain arrays
+        levels.append(pd.Index(np.asarray(decode(entry['kind'], level))))
+        names.append(entry['name'])
+
+    if len(levels) == 1:
+        index = pd.Index(np.asarray(levels[0])[codes[0]], name=names[0])
+    else:
+        index = pd.MultiIndex(levels=levels, codes=codes, names=names, verify_integrity=False)
+
+    entries = meta['columns']
+    if columns is not None:
+        entries = [e for e in entries if e['name'] in set(columns)]
+        missing = set(columns) - set(e['name'] for e in entries)
+        if missing:
+            raise KeyError('not in the cache: ' + ', '.join(sorted(missing)))
+
+    data = {entry['name'] : decode(entry['kind'], arrays(entry)) for entry in entries}
+
+    return pd.DataFrame(data, index=index, copy=False)
+
+def is_fresh(meta, refresh_days, source=None, signature=None):
+    '''
+    Whether a cached frame can be used: built with the same signature and
+    cache version, less than refresh_days old, and newer than its source
+    file.
+    '''
+
+    if meta is None or meta.get('version') != VERSION:
+        return False
+
+    if signature is not None and meta.get('signature') != json.loads(json.dumps(signature, default=str)):
+        return False
+
+    if time() - meta['created'] > refresh_days * 86400:
+        return False
+
+    if source is not None and os.path.exists(source) and os.path.getmtime(source) > meta['created']:
+        return False
+
+    return True
+
+def cached_frame(name, load, refresh_days, source=None, signature=None, columns=None,
+                 mmap=True, path=CACHE_DIR):
+    '''
+    A SimFin dataset from the columnar cache, building the cache with load()
+    first if it is missing or stale.
+
+    Parameters
+    ----------
+    name : string
+        dataset name, e.g. 'df_income'.
+    load : callable
+        Loads the dataset the slow way, e.g. from a StockHub.
+    refresh_days : float
+        Rebuild the cache once it is older than this.
+    source : string, optional
+        Path of the SimFin CSV behind the dataset. If it has been written
+        since the cache was built, the cache is rebuilt. The default is None.
+    signature : dict, optional
+        Parameters the dataset depends on (market, variant, offset, ...).
+        The cache is rebuilt if they change. The default is None.
+    columns : list, optional
+        Columns to read. The default is None, which reads them all.
+    mmap : boolean, optional
+        Memory-map the cached columns. The default is True.
+    path : string, optional
+        Cache directory. The default is CACHE_DIR.
+
+    Returns
+    -------
+    DataFrame
+
+    '''
+
+    directory = os.path.join(path, name)
+
+    if not is_fresh(read_meta(directory), refresh_days, source, signature):
+        df = load()
+        os.makedirs(path, exist_ok=True)
+        save_frame(df, directory, signature)
+        if columns is None and not mmap:
+            return df
+
+    return load_frame(directory, columns=columns, mmap=mmap)
+
+def clear(path=CACHE_DIR):
+
+    shutil.rmtree(path, ignore_errors=True)
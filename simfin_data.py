@@ -8,49 +8,275 @@ Created on Thu May 20 18:08:20 2021
 '''
 This uses altman-z score and PCA to analyze bankruptcy risk across the market
 based on financial statement data.
+
+Importing this module is cheap: simfin, pandas, sklearn and the rest are
+imported on first use, and the datasets (df_companies, df_income,
+df_prices, hub, ...) are loaded the first time they are used, then kept.
+They can be read as module attributes as before, e.g. simfin_data.df_prices,
+or assigned to replace the loaded data.
+
+The statements and share prices go through a columnar cache (see
+simfin_cache.py), so only the first session after SimFin refreshes them
+parses the CSVs; use load_columns to read just the columns you need.
+
+Set COMPACT = True before the datasets are loaded to keep them in float32 /
+categorical form (see compact_frames.py), at about half the memory, or call
+compact_datasets() to convert what is already loaded.
 '''
 
 
-import simfin as sf
-from simfin.names import *
-import pandas as pd
+import os
+import sys
+import shutil
+import multiprocessing
 import numpy as np
-import seaborn as sns
 import random
-from scipy import stats
-from sklearn import linear_model
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-import matplotlib.pyplot as plt
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, timedelta
-
-sf.set_data_dir('C:/Users/David Billingsley/InvestmentResearch/simfin_api_data')
-sf.set_api_key(api_key='free')
+try:
+    from valuation.tracing import log, span
+    from valuation.lazy import lazy_import
+except ImportError:
+    #valuation/ itself is on the path, so valuation is valuation.py
+    from tracing import log, span
+    from lazy import lazy_import
+import simfin_cache
+import compact_frames
+import factor_engine
+import incremental_pca
+from asof import AsOf, at_many
+
+#imported on first use, see valuation/lazy.py
+sf = lazy_import('simfin')
+pd = lazy_import('pandas')
+sns = lazy_import('seaborn')
+stats = lazy_import('scipy.stats')
+linear_model = lazy_import('sklearn.linear_model')
+decomposition = lazy_import('sklearn.decomposition')
+preprocessing = lazy_import('sklearn.preprocessing')
+plt = lazy_import('matplotlib.pyplot')
+
+#index names, as in simfin.names
+TICKER = 'Ticker'
+REPORT_DATE = 'Report Date'
+
+DATA_DIR = 'C:/Users/David Billingsley/InvestmentResearch/simfin_api_data'
 
 #hub parameters
 days = 90
 market='us'
-offset = pd.DateOffset(days=days)
 refresh_days = 30
 refresh_days_shareprices = 1
 
-#Get some random sample tickers, for testing purposes
-df_companies = sf.load_companies(index=TICKER, market=market)
-tickers_rand = random.choices(df_companies.index, k=5)
+#read the bulk datasets through simfin_cache
+USE_CACHE = True
+
+#opt-in: keep the frames below in compact form as they are loaded
+COMPACT = False
+COMPACT_DATASETS = ('df_income', 'df_balance', 'df_cashflow', 'df_prices', 
+                    'df_volume_signals', 'df_returns_1_3y')
+
+#processes daily_fin_data spreads the reindexing over, None for serial
+REINDEX_PROCESSES = None
+
+#tickers per chunk in altman_z_stream
+ALTMAN_CHUNK = 500
+
+#file altman_z_stream leaves in its output directory, so it only ever 
+#replaces a directory it wrote
+STREAM_MARKER = '_altman_stream'
 
-hub = sf.StockHub(market=market, offset=offset,
-                  refresh_days=refresh_days,
-                  refresh_days_shareprices=refresh_days_shareprices)
+#SimFin bulk dataset behind each cached frame, as (dataset, variant)
+BULK_DATASETS = {
+    'df_income' : ('income', 'ttm'),
+    'df_balance' : ('balance', 'ttm'),
+    'df_cashflow' : ('cashflow', 'ttm'),
+    'df_prices' : ('shareprices', 'daily')
+    }
 
+def load_hub():
+    
+    sf.set_data_dir(DATA_DIR)
+    sf.set_api_key(api_key='free')
+    
+    return sf.StockHub(market=market, offset=dataset('offset'),
+                       refresh_days=refresh_days,
+                       refresh_days_shareprices=refresh_days_shareprices)
+
+def load_companies():
+    
+    dataset('hub')
+    
+    return sf.load_companies(index=TICKER, market=market)
+
+def load_bulk(name, columns=None):
+    '''
+    Loads one of BULK_DATASETS through the StockHub, via the columnar cache 
+    if USE_CACHE is on.
 
-df_income = hub.load_income(variant = 'ttm')
-df_balance = hub.load_balance(variant = 'ttm')
-df_cashflow = hub.load_cashflow(variant = 'ttm')
-df_prices = hub.load_shareprices(variant ='daily')
-df_industries = sf.load_industries()
-df_returns_1_3y = hub.mean_log_returns(name='Mean Log Return 1-3y',
-                         future=True, annualized=True,
-                         min_years=1, max_years=3)
+    Parameters
+    ----------
+    name : string
+        e.g. 'df_balance'
+    columns : list, optional
+        Only read these columns from the cache. The default is None, which 
+        reads them all.
+
+    Returns
+    -------
+    DataFrame
+
+    '''
+    
+    dataset_, variant = BULK_DATASETS[name]
+    load = lambda: getattr(dataset('hub'), 'load_' + dataset_)(variant=variant)
+    if not USE_CACHE:
+        frame = load()
+        return frame if columns is None else frame[columns]
+    
+    prices = dataset_ == 'shareprices'
+    source = os.path.join(DATA_DIR, '{}-{}-{}.csv'.format(market, dataset_, variant))
+    signature = {'market' : market, 'variant' : variant, 
+                 'offset' : None if prices else days}
+    
+    return simfin_cache.cached_frame(name, load, 
+                                     refresh_days_shareprices if prices else refresh_days,
+                                     source=source, signature=signature, columns=columns)
+
+def load_columns(name, columns):
+    '''
+    Only some columns of a bulk dataset, e.g. 
+    load_columns('df_balance', ['Total Assets', 'Total Liabilities']). Reads 
+    them from the columnar cache without loading the rest, unless the whole
+    dataset has already been loaded.
+    '''
+    
+    if name in globals():
+        return globals()[name][columns]
+    
+    return load_bulk(name, columns)
+
+def load_daily(name):
+    
+    income_daily, balance_daily, cashflow_daily = daily_fin_data()
+    globals().setdefault('df_income_daily', income_daily)
+    globals().setdefault('df_balance_daily', balance_daily)
+    globals().setdefault('df_cashflow_daily', cashflow_daily)
+    
+    return globals()[name]
+
+#how to load each dataset the first time it is used
+LOADERS = {
+    'offset' : lambda: pd.DateOffset(days=days),
+    'hub' : load_hub,
+    'df_companies' : load_companies,
+    #Get some random sample tickers, for testing purposes
+    'tickers_rand' : lambda: random.choices(dataset('df_companies').index, k=5),
+    'df_income' : lambda: load_bulk('df_income'),
+    'df_balance' : lambda: load_bulk('df_balance'),
+    'df_cashflow' : lambda: load_bulk('df_cashflow'),
+    'df_prices' : lambda: load_bulk('df_prices'),
+    'df_industries' : lambda: (dataset('hub'), sf.load_industries())[1],
+    'df_returns_1_3y' : lambda: dataset('hub').mean_log_returns(name='Mean Log Return 1-3y',
+                                    future=True, annualized=True,
+                                    min_years=1, max_years=3),
+    'df_volume_signals' : lambda: signals(),
+    'df_income_daily' : lambda: load_daily('df_income_daily'),
+    'df_balance_daily' : lambda: load_daily('df_balance_daily'),
+    'df_cashflow_daily' : lambda: load_daily('df_cashflow_daily')
+    }
+
+_dataset_lock = threading.RLock()
+
+def dataset(name):
+    '''
+    Gets a dataset, loading it on first use. A dataset that has been assigned
+    as a module attribute (simfin_data.df_prices = ...) is used as is.
+
+    Parameters
+    ----------
+    name : string
+        a key of LOADERS, e.g. 'df_income'
+
+    Returns
+    -------
+    the dataset
+
+    '''
+    
+    if name not in globals():
+        with _dataset_lock:
+            if name not in globals():
+                with span('load', dataset=name):
+                    value = LOADERS[name]()
+                if COMPACT and name in COMPACT_DATASETS:
+                    with span('compact', dataset=name):
+                        value = compact_frames.compact(value)
+                globals().setdefault(name, value)
+    
+    return globals()[name]
+
+def __getattr__(name):
+    
+    #simfin_data.df_income etc. load on first access
+    if name in LOADERS:
+        return dataset(name)
+    
+    raise AttributeError('module ' + __name__ + ' has no attribute ' + name)
+
+def loaded_frames():
+    '''
+    The datasets loaded so far that are DataFrames or Series, by name.
+    '''
+    
+    return {name : globals()[name] for name in LOADERS 
+            if name in globals() and isinstance(globals()[name], (pd.DataFrame, pd.Series))}
+
+def memory_report():
+    '''
+    MB held by each loaded dataset, index included.
+    '''
+    
+    return compact_frames.memory_usage(loaded_frames())
+
+def compact_datasets(rtol=compact_frames.RTOL):
+    '''
+    Converts every loaded dataset to compact form in place (float32 where 
+    precision allows, categorical strings, shared indexes), and turns 
+    COMPACT on so datasets loaded later are compact too.
+
+    Parameters
+    ----------
+    rtol : float, optional
+        Largest relative error allowed when going to float32. The default is
+        compact_frames.RTOL.
+
+    Returns
+    -------
+    DataFrame
+        MB per dataset before and after.
+
+    '''
+    
+    global COMPACT
+    COMPACT = True
+    
+    before = memory_report()
+    with _dataset_lock:
+        frames = loaded_frames()
+        for name, frame in frames.items():
+            with span('compact', dataset=name):
+                globals()[name] = compact_frames.compact(frame, rtol)
+        compact_frames.share_indexes([globals()[name] for name in frames 
+                                      if isinstance(globals()[name], pd.DataFrame)])
+    after = memory_report()
+    
+    report = pd.DataFrame({'Before' : before, 'After' : after})
+    report.loc['Total'] = report.sum()
+    log('Memory before: {:.1f} MB, after: {:.1f} MB'.format(*report.loc['Total']))
+    
+    return report
 
 def signals():
     '''
@@ -58,10 +284,12 @@ def signals():
 
     Returns
     -------
-    None.
+    DataFrame
+        volume signals, including Volume Market-Cap.
 
     '''
-    df_volume_signals = hub.volume_signals(window = 21)
+    
+    return dataset('hub').volume_signals(window = 21)
 
 
 def sample(df):
@@ -81,7 +309,7 @@ def sample(df):
 
     '''
     
-    return df.loc[tickers_rand]
+    return df.loc[dataset('tickers_rand')]
     
 def split_dates():
     '''
@@ -117,9 +345,36 @@ in 4 data points used to construct the TTM.
 '''
 
 
-def daily_fin_data():
+_engines = {}
+
+def asof_engine(name):
     '''
-    Offset data by 6 months and re-index all data to daily.
+    The AsOf lookup engine over a statement dataset, e.g. 'df_balance', 
+    built once per loaded frame.
+    '''
+    
+    frame = dataset(name)
+    engine = _engines.get(name)
+    if engine is None or engine[0] is not frame:
+        with span('asof_index', dataset=name):
+            engine = (frame, AsOf(frame))
+        _engines[name] = engine
+    
+    return engine[1]
+
+def daily_fin_data(processes=None):
+    '''
+    Offset data by 6 months and re-index all data to daily. Each value is the
+    one from the latest report on or before the day, see asof.py. To look up
+    a few columns on the daily grid without building whole daily copies of 
+    the statements, use daily_columns.
+
+    Parameters
+    ----------
+    processes : int, optional
+        Number of processes to spread the reindexing over, split by 
+        statement and by groups of tickers. The result is the same as the 
+        serial one. The default is None, which uses REINDEX_PROCESSES.
 
     Returns
     -------
@@ -131,20 +386,114 @@ def daily_fin_data():
         daily cash flow statement data
 
     '''
-    print("Building daily income data... ")
-    df_income_daily = sf.reindex(df_src=df_income, df_target = df_prices, group_index = TICKER, method='ffill')
-    print('Done!')
-    print("Building daily balance sheet data... ")
-    df_balance_daily = sf.reindex(df_src=df_balance, df_target = df_prices, group_index = TICKER, method='ffill')
-    print('Done!')
-    print("Building daily cash flow data... ")
-    df_cashflow_daily = sf.reindex(df_src=df_cashflow, df_target = df_prices, group_index = TICKER, method='ffill')
-    print('Done!')
-    print('getting daily volume signals')
+    processes = REINDEX_PROCESSES if processes is None else processes
+    days = dataset('df_prices').index
+    
+    if processes is not None and processes > 1:
+        log('Building daily income, balance sheet and cash flow data on {} processes... '.format(processes))
+        engines = [asof_engine(name) for name in ('df_income', 'df_balance', 'df_cashflow')]
+        with span('reindex', statement='all', processes=processes):
+            df_income_daily, df_balance_daily, df_cashflow_daily = at_many(engines, days, processes)
+        log('Done!')
+        if COMPACT:
+            compact_frames.share_indexes([df_income_daily, df_balance_daily, df_cashflow_daily])
+        return df_income_daily, df_balance_daily, df_cashflow_daily
+    
+    log("Building daily income data... ")
+    with span('reindex', statement='income'):
+        df_income_daily = asof_engine('df_income').at(days)
+    log('Done!')
+    log("Building daily balance sheet data... ")
+    with span('reindex', statement='balance'):
+        df_balance_daily = asof_engine('df_balance').at(days)
+    log('Done!')
+    log("Building daily cash flow data... ")
+    with span('reindex', statement='cashflow'):
+        df_cashflow_daily = asof_engine('df_cashflow').at(days)
+    log('Done!')
+    
+    if COMPACT:
+        compact_frames.share_indexes([df_income_daily, df_balance_daily, df_cashflow_daily])
     
     return df_income_daily, df_balance_daily, df_cashflow_daily
 
 
+def ticker_rows(index, tickers):
+    '''
+    Rows of a (Ticker, Date) index sorted by ticker that belong to tickers,
+    found by binary search rather than a scan of the whole index.
+
+    Returns
+    -------
+    numpy array
+        int64 row positions, in index order.
+
+    '''
+    
+    rows = []
+    for ticker in sorted(set(tickers)):
+        try:
+            loc = index.get_loc(ticker)
+        except KeyError:
+            continue
+        rows.append(np.arange(loc.start, loc.stop) if isinstance(loc, slice) else np.flatnonzero(loc))
+    
+    return np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+
+def daily_grid(tickers=None):
+    '''
+    The (Ticker, Date) trading days of tickers, from the share prices.
+    '''
+    
+    days = dataset('df_prices').index
+    if tickers is None:
+        return days
+    
+    if days.is_monotonic_increasing:
+        return days.take(ticker_rows(days, tickers))
+    
+    return days[days.get_level_values(0).isin(tickers)]
+
+def daily_columns(columns, tickers=None):
+    '''
+    Statement and signal columns on the daily grid of tickers. Statement 
+    values are looked up as of each day from the statements at their own 
+    frequency, so only the columns asked for are ever expanded to daily.
+
+    Parameters
+    ----------
+    columns : dict
+        dataset name -> list of columns, e.g. 
+        {'df_balance' : ['Total Assets'], 'df_volume_signals' : [...]}.
+        df_volume_signals is daily already and is aligned as is.
+    tickers : list, optional
+        The default is None, which is every ticker with share prices.
+
+    Returns
+    -------
+    DataFrame
+        indexed by (Ticker, Date).
+
+    '''
+    
+    grid = daily_grid(tickers)
+    out = {}
+    for name, names in columns.items():
+        if name == 'df_volume_signals':
+            signals_ = dataset(name)
+            rows = slice(None)
+            #aligning just the tickers' rows keeps this the size of the grid
+            if tickers is not None and signals_.index.is_monotonic_increasing:
+                rows = ticker_rows(signals_.index, tickers)
+            out.update({column : signals_[column].iloc[rows].reindex(grid).to_numpy() 
+                        for column in names})
+        else:
+            engine = asof_engine(name)
+            with span('asof', dataset=name):
+                out.update(engine.take(engine.positions_for(grid), names))
+    
+    return pd.DataFrame(out, index=grid)
+
 def altman_z_test(rand=True):
     '''
     Calculate altman z-score for set of tickers.
@@ -162,43 +511,282 @@ def altman_z_test(rand=True):
 
     '''
     if rand:
-        tickers = tickers_rand
+        tickers = dataset('tickers_rand')
     else:
-        tickers = df_companies.index
-
-        total_assets = df_balance_daily.loc[tickers, ['Total Assets']]
-        total_current_assets = df_balance_daily.loc[tickers, ['Total Current Assets']]
-        total_current_liabilities = df_balance_daily.loc[tickers, ['Total Current Liabilities']]
-        retained_earnings = df_balance_daily.loc[tickers, ['Retained Earnings']]
-        pretax_income = df_income_daily.loc[tickers, ['Pretax Income (Loss)']]
-        interest_expense = df_income_daily.loc[tickers, ['Interest Expense, Net']]
-        revenue  = df_income_daily.loc[tickers, ['Revenue']]
-        mcap = df_volume_signals.loc[tickers, ['Volume Market-Cap']]
-        total_liabilities = df_balance_daily.loc[tickers, ['Total Liabilities']]
-            
-    
-    df_az = pd.concat([ total_assets, 
-                      total_current_assets, 
-                      total_current_liabilities, 
-                      retained_earnings,
-                      pretax_income,
-                      interest_expense,
-                      revenue,
-                      mcap,
-                      total_liabilities], axis=1)
-    
-    
-    df_az['X1'] = (df_az['Total Current Assets'] - df_az['Total Current Liabilities'])/df_az['Total Assets']
-    df_az['X2'] = df_az['Retained Earnings']/df_az['Total Assets']
-    df_az['X3'] = (df_az['Pretax Income (Loss)'] - df_az['Interest Expense, Net'])/df_az['Total Assets']
-    df_az['X4'] = df_az['Volume Market-Cap']/df_az['Total Liabilities']
-    df_az['X5'] = df_az['Revenue']/df_az['Total Assets']
-    
-    df_az['Altman Z'] = 1.2 * df_az['X1'] + 1.4 * df_az['X2'] + 3.3 *\
-        df_az['X3'] + 0.6 * df_az['X4'] + 1.0 * df_az['X5']
+        tickers = dataset('df_companies').index
+    
+    #the nine factor columns on the daily grid, looked up as of each day 
+    #rather than sliced out of full daily copies of the statements
+    df_az = daily_columns(ALTMAN_SOURCES, tickers)[altman_factors]
+    
+    for column, values in altman_scores(df_az).items():
+        df_az[column] = values
     
     return df_az
 
+def altman_scores(factors):
+    '''
+    X1-X5 and Altman Z in one pass over the factor columns, reusing 
+    buffers the size of the input instead of building a temporary column
+    per operation. Gives the same numbers as the column arithmetic in
+    pandas.
+
+    Parameters
+    ----------
+    factors : DataFrame or dict
+        the altman_factors columns.
+
+    Returns
+    -------
+    dict
+        'X1' ... 'X5', 'Altman Z' -> numpy array.
+
+    '''
+    
+    f = {column : np.asarray(factors[column]) for column in altman_factors}
+    assets = f['Total Assets']
+    
+    x1 = np.subtract(f['Total Current Assets'], f['Total Current Liabilities'])
+    np.divide(x1, assets, out=x1)
+    x2 = np.divide(f['Retained Earnings'], assets)
+    x3 = np.subtract(f['Pretax Income (Loss)'], f['Interest Expense, Net'])
+    np.divide(x3, assets, out=x3)
+    x4 = np.divide(f['Volume Market-Cap'], f['Total Liabilities'])
+    x5 = np.divide(f['Revenue'], assets)
+    
+    #summed in the same order as 1.2*X1 + 1.4*X2 + ... so results match
+    scores = {'X1' : x1, 'X2' : x2, 'X3' : x3, 'X4' : x4, 'X5' : x5}
+    scores['Altman Z'] = factor_engine.weighted_sum(scores, ALTMAN_WEIGHTS)
+    
+    return scores
+
+def altman_z_chunk(tickers):
+    '''
+    altman_z_test for one chunk of tickers.
+    '''
+    
+    with span('altman_chunk', tickers=len(tickers)):
+        df_az = daily_columns(ALTMAN_SOURCES, tickers)[altman_factors]
+        for column, values in altman_scores(df_az).items():
+            df_az[column] = values
+    
+    return df_az
+
+def _altman_part(args):
+    
+    tickers, path = args
+    df_az = altman_z_chunk(tickers)
+    simfin_cache.save_frame(df_az, path)
+    
+    return len(df_az)
+
+def altman_z_stream(path, tickers=None, chunk=ALTMAN_CHUNK, processes=None):
+    '''
+    Altman Z-scores for the whole market, a chunk of tickers at a time, 
+    each chunk written to path as soon as it is done. Only a chunk's rows
+    are ever in memory, so peak memory doesn't grow with the number of 
+    tickers. Read the results back with read_altman.
+
+    Parameters
+    ----------
+    path : string
+        directory to write to. Each chunk is a columnar part in it, see 
+        simfin_cache.save_frame. An existing directory is replaced only if 
+        it is empty or is the output of an earlier altman_z_stream, see 
+        stream_directory.
+    tickers : list, optional
+        The default is None, which is every ticker in df_companies.
+    chunk : int, optional
+        Tickers per chunk. The default is ALTMAN_CHUNK.
+    processes : int, optional
+        Number of processes to spread chunks over. The default is None, 
+        which runs in this process. Workers are forked, so they start with
+        the datasets and lookups already loaded here, including datasets
+        assigned to this module; see fork_pool. Platforms without fork 
+        (Windows) have to leave it None.
+
+    Returns
+    -------
+    int
+        rows written.
+
+    '''
+    
+    if tickers is None:
+        tickers = dataset('df_companies').index
+    tickers = sorted(set(tickers))
+    
+    parallel = processes is not None and processes > 1
+    if parallel:
+        fork_available()
+    
+    stream_directory(path)
+    jobs = [(tickers[i:i + chunk], os.path.join(path, 'part-{:06d}'.format(i // chunk)))
+            for i in range(0, len(tickers), chunk)]
+    
+    #build the shared lookups before the workers are forked, so they 
+    #inherit them instead of each building its own
+    for name in ALTMAN_SOURCES:
+        if name != 'df_volume_signals':
+            asof_engine(name)
+    dataset('df_prices').index.is_monotonic_increasing
+    
+    with span('altman_stream', tickers=len(tickers), chunks=len(jobs)):
+        if parallel:
+            with fork_pool(processes) as executor:
+                rows = sum(executor.map(_altman_part, jobs))
+        else:
+            rows = sum(_altman_part(job) for job in jobs)
+    
+    return rows
+
+def fork_available():
+    '''
+    Raises ValueError if processes can't be forked here.
+    
+    Workers started any other way (spawn, the only way on Windows) import 
+    this module afresh. They would load every dataset again from DATA_DIR,
+    and would not see datasets assigned to the module, so work that needs
+    the loaded datasets in its workers is fork-only.
+    '''
+    
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise ValueError('processes needs forked workers, which ' + sys.platform + 
+                         ' does not have. Leave processes as None.')
+
+def fork_pool(processes):
+    '''
+    A ProcessPoolExecutor whose workers are forked from this process, 
+    whatever the default start method is, so they share its loaded 
+    datasets. See fork_available.
+    '''
+    
+    fork_available()
+    
+    return ProcessPoolExecutor(max_workers=processes, 
+                               mp_context=multiprocessing.get_context('fork'))
+
+def stream_directory(path):
+    '''
+    Makes path an empty output directory for altman_z_stream, with 
+    STREAM_MARKER in it. 
+
+    Raises
+    ------
+    FileExistsError
+        if path holds anything other than the parts and marker of an 
+        earlier stream, so nothing else is ever deleted.
+
+    '''
+    
+    if os.path.exists(path):
+        names = os.listdir(path)
+        ours = STREAM_MARKER in names and all(name == STREAM_MARKER or name.startswith('part-') 
+                                              for name in names)
+        if names and not ours:
+            raise FileExistsError(path + ' is not empty and is not the output of '
+                                  'altman_z_stream, not replacing it')
+        shutil.rmtree(path)
+    
+    os.makedirs(path)
+    with open(os.path.join(path, STREAM_MARKER), 'w') as f:
+        f.write('altman_z_stream output, replaced by the next stream to this directory\n')
+
+def read_altman(path, columns=None, mmap=True):
+    '''
+    Reads the results of altman_z_stream.
+
+    Parameters
+    ----------
+    path : string
+    
+    columns : list, optional
+        Columns to read. The default is None, which reads them all.
+    mmap : boolean, optional
+        Memory-map the parts. The default is True.
+
+    Returns
+    -------
+    DataFrame
+        indexed by (Ticker, Date), as altman_z_test.
+
+    '''
+    
+    parts = sorted(name for name in os.listdir(path) if name.startswith('part-') 
+                   and not name.endswith('.tmp'))
+    frames = [simfin_cache.load_frame(os.path.join(path, name), columns=columns, mmap=mmap)
+              for name in parts]
+    
+    return pd.concat(frames) if frames else pd.DataFrame(columns=columns)
+
+
+def factor_scores(tickers=None, outputs=factor_engine.SCORE_COLUMNS, 
+                  chunk=factor_engine.FACTOR_CHUNK):
+    '''
+    Altman Z, Piotroski F and Beneish M for every report, see 
+    factor_engine.py.
+
+    Parameters
+    ----------
+    tickers : list, optional
+        The default is None, which is every ticker.
+    outputs : list, optional
+        The default is factor_engine.SCORE_COLUMNS.
+    chunk : int, optional
+        Tickers computed at once. The default is factor_engine.FACTOR_CHUNK.
+
+    Returns
+    -------
+    DataFrame
+        indexed by (Ticker, Report Date).
+
+    '''
+    
+    with span('factor_scores', outputs=len(outputs)):
+        return factor_engine.factor_scores(dataset('df_income'), dataset('df_balance'), 
+                                           dataset('df_cashflow'), 
+                                           market_cap=dataset('df_volume_signals')['Volume Market-Cap'],
+                                           tickers=tickers, outputs=outputs, chunk=chunk)
+
+def daily_factor_scores(tickers=None, scores=('Altman Z', 'Piotroski F', 'Beneish M')):
+    '''
+    Scores on the daily price grid. Each day takes the statement side of 
+    the scores from the latest report on or before it; Altman Z is then
+    finished with that day's market cap, as in altman_z_test.
+
+    Parameters
+    ----------
+    tickers : list, optional
+        The default is None, which is every ticker with share prices.
+    scores : list, optional
+        The default is ('Altman Z', 'Piotroski F', 'Beneish M').
+
+    Returns
+    -------
+    DataFrame
+        indexed by (Ticker, Date).
+
+    '''
+    
+    scores = list(scores)
+    altman = 'Altman Z' in scores
+    outputs = [s for s in scores if s != 'Altman Z']
+    if altman:
+        outputs += ['X1', 'X2', 'X3', 'X5', 'Total Liabilities']
+    
+    by_report = factor_scores(tickers, outputs=outputs)
+    grid = daily_grid(tickers)
+    engine = AsOf(by_report)
+    with span('asof', dataset='factor_scores'):
+        daily = engine.take(engine.positions_for(grid), outputs)
+    
+    if altman:
+        mcap = daily_columns({'df_volume_signals' : ['Volume Market-Cap']}, tickers)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily['X4'] = np.divide(mcap['Volume Market-Cap'].to_numpy(), daily['Total Liabilities'])
+        daily['Altman Z'] = factor_engine.weighted_sum(daily, ALTMAN_WEIGHTS)
+    
+    return pd.DataFrame({score : daily[score] for score in scores}, index=grid)
 
 def new_altman_z_coefs(rand=True):
     clf = linear_model.LinearRegression(fit_intercept=True)
@@ -207,41 +795,105 @@ def new_altman_z_coefs(rand=True):
     x.replace([np.inf, -np.inf], np.nan, inplace=True)
     x.dropna(inplace=True)
     if rand:
-        y = df_returns_1_3y.loc[tickers_rand].fillna(0)
+        y = dataset('df_returns_1_3y').loc[dataset('tickers_rand')].fillna(0)
     else:
-        y = df_returns_1_3y.fillna(0)
-    y_ = sf.reindex(df_src = y, df_target = x, group_index=TICKER, method='ffill')
+        y = dataset('df_returns_1_3y').fillna(0)
+    if isinstance(y, pd.Series):
+        y = y.to_frame()
+    #returns as of each row of x
+    y_ = AsOf(y).lookup(x.index.get_level_values(0), x.index.get_level_values(1)).fillna(0)
     reg = clf.fit(x, y_)
     return reg, x, y_
 
-def pca_analysis(x, n = 2):
+def pca_analysis(x, n = 2, batch_size=None, solver=None, x_path=None):
     '''
-    StandardScales data and fits a PCA object to it.
+    StandardScales data and fits a PCA object to it. With batch_size (or 
+    solver='incremental', or x the path of altman_z_stream output) it runs
+    out of core, see incremental_pca.py: x is read in batches of rows and
+    x_ is written to disk and memory-mapped, so the whole market fits.
 
     Parameters
     ----------
     x : data
-        the data to fit PCA to
+        the data to fit PCA to, or a directory written by altman_z_stream,
+        whose altman_factors are used, dropping rows with infs or NaNs.
     n : int, optional
         the number of principal components desired in the PCA fit
+    batch_size : int, optional
+        Rows read at once out of core. The default is None, which fits in 
+        memory unless x is a path or solver is 'incremental'.
+    solver : string, optional
+        'randomized' for a randomized SVD, in memory or out of core, or 
+        'incremental' for IncrementalPCA out of core. The default is None,
+        which is sklearn's own choice in memory and 'incremental' out of 
+        core.
+    x_path : string, optional
+        .npy file for x_ out of core, overwritten if it exists. The 
+        default is None, which is a new pca_x_*.npy file in the 
+        simfin_cache directory for each call, see 
+        incremental_pca.scratch_path.
 
     Returns
     -------
     pca : PCA
         the fitted PCA object
     x_ : numpy array
-        StandardScaler transformed data
+        StandardScaler transformed data, a read-only memmap out of core
 
     '''
- 
     
-    pca = PCA(n_components = n)
+    if batch_size is not None or solver == 'incremental' or isinstance(x, str):
+        batch_size = incremental_pca.BATCH_SIZE if batch_size is None else batch_size
+        if isinstance(x, str):
+            x = altman_batches(x, batch_size)
+        if x_path is None:
+            x_path = incremental_pca.scratch_path(simfin_cache.CACHE_DIR)
+        with span('pca', out_of_core=True, solver=solver or 'incremental'):
+            return incremental_pca.pca_out_of_core(x, n, batch_size=batch_size, 
+                                                   solver=solver or 'incremental', 
+                                                   x_path=x_path)
+    
+    pca = decomposition.PCA(n_components = n, svd_solver = solver or 'auto')
     
-    x_ = StandardScaler().fit_transform(x)
+    x_ = preprocessing.StandardScaler().fit_transform(x)
     
     pca.fit(x_)
     return pca, x_
 
+def altman_batches(path, batch_size=incremental_pca.BATCH_SIZE, columns=None):
+    '''
+    A batch source (see incremental_pca.batch_source) over the output of 
+    altman_z_stream: the columns of each part, memory-mapped, in batches of
+    rows, leaving out rows with infs or NaNs.
+
+    Parameters
+    ----------
+    path : string
+    
+    batch_size : int, optional
+        The default is incremental_pca.BATCH_SIZE.
+    columns : list, optional
+        The default is None, which is altman_factors.
+
+    Returns
+    -------
+    callable
+
+    '''
+    
+    columns = altman_factors if columns is None else columns
+    parts = sorted(os.path.join(path, name) for name in os.listdir(path) 
+                   if name.startswith('part-') and not name.endswith('.tmp'))
+    
+    def batches():
+        for part in parts:
+            frame = simfin_cache.load_frame(part, columns=columns, mmap=True)
+            for start in range(0, len(frame), batch_size):
+                values = frame.iloc[start:start + batch_size][columns].to_numpy(np.float64)
+                yield values[np.isfinite(values).all(axis=1)]
+    
+    return batches
+
 
 def biplot(score, coeff, labels=None, k=20000, **kwargs):
     '''
@@ -249,12 +901,14 @@ def biplot(score, coeff, labels=None, k=20000, **kwargs):
     '''
     
     fontsize=kwargs['fontsize'] if 'fontsize' in kwargs.keys() else 'medium'
-    fontcolor =kwargs['fontcolor'] if 'fontcolor' in kwargs.keys else 'blue'
+    fontcolor =kwargs['fontcolor'] if 'fontcolor' in kwargs.keys() else 'blue'
     
+    #sample without permuting every row, and read the rows in order, so a 
+    #memory-mapped score only reads the k rows plotted
+    random_indices = np.sort(np.random.default_rng().choice(len(score), size=min(k, len(score)), 
+                                                            replace=False))
     
-    random_indices = np.random.choice(len(score), size=k, replace=False )
-    
-    score = score[random_indices, :]
+    score = np.asarray(score[random_indices, :])
     
     xs = score[:,0]
     ys = score[:,1]
@@ -282,7 +936,19 @@ def call_biplot(score, components, k=20000, labels=None, **kwargs):
 altman_factors = ['Total Assets', 'Total Current Assets', 'Total Current Liabilities',
                   'Retained Earnings', 'Pretax Income (Loss)', 'Interest Expense, Net',
                   'Revenue', 'Volume Market-Cap', 'Total Liabilities' ]
+
+#weight of each factor in Altman Z
+ALTMAN_WEIGHTS = factor_engine.ALTMAN_WEIGHTS
+
+#where each altman factor comes from
+ALTMAN_SOURCES = {
+    'df_balance' : ['Total Assets', 'Total Current Assets', 'Total Current Liabilities',
+                    'Retained Earnings', 'Total Liabilities'],
+    'df_income' : ['Pretax Income (Loss)', 'Interest Expense, Net', 'Revenue'],
+    'df_volume_signals' : ['Volume Market-Cap']
+    }
 #to get x do new altman_z_coeffs, then pca_analysis, then feed x_ into biploth
+#for the whole market, altman_z_stream(path), then pca_analysis(path), then the same
 
 
 #How to handle NaNs in signals? I guess you could just .fillna(method = 'ffill')
@@ -314,10 +980,10 @@ and appropriate margin of safety is.
 ### - UNUSED FUNCTIONS I MAY BUT PROBABLY WILL NOT WANT TO REUSE ###
 def val_signals():
 
-    df_val_signals = sf.val_signals(df_income_ttm=df_income,
-                                    df_balance_ttm=df_balance,
-                                    df_cashflow_ttm=df_cashflow,
-                                    df_prices=df_prices, fill_method='ffill'
+    df_val_signals = sf.val_signals(df_income_ttm=dataset('df_income'),
+                                    df_balance_ttm=dataset('df_balance'),
+                                    df_cashflow_ttm=dataset('df_cashflow'),
+                                    df_prices=dataset('df_prices'), fill_method='ffill'
                                     )
     
 #Add date offset in financial data to remove lookahead bias from restatements.
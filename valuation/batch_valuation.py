@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 13:40:05 2026
+
+@author: David Billingsley
+"""
+
+'''
+Vectorized versions of the Equity.value methods. These value a whole
+DataFrame of tickers at once, e.g. the output of evaluate_tickers or a
+concat of Equity.out_all, with array math instead of a Python loop per
+ticker. Every function broadcasts, so parameters can be scalars or arrays.
+'''
+import numpy as np
+from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+#same defaults as Equity
+MARGIN_OF_SAFETY = 0.15
+DISCOUNT_RATE = 0.08
+GROWTH_DECAY_RATE = 0.05
+Y10_MULTIPLIER = 12
+
+VALUATION_COLUMNS = ['P/E Valuation', 'DCF Valuation', 'ROE Valuation']
+RETURN_COLUMNS = ['P/E Value Return', 'DCF Value Return', 'ROE Value Return']
+
+
+def finite(values):
+    '''
+    Replaces infs from division by zero with np.nan, the way Equity ends up
+    with no valuation when a ZeroDivisionError is raised.
+    '''
+
+    values = np.asarray(values, dtype=float)
+
+    return np.where(np.isfinite(values), values, np.nan)
+
+def power(base, exponent):
+    '''
+    base**exponent as Equity.value computes it. Python's float pow and
+    np.float_power both call the C library's pow, while np.power has its
+    own vectorized pow that can differ in the last bit.
+    '''
+
+    return np.float_power(base, np.asarray(exponent, dtype=float))
+
+def powers(base, exponents):
+    '''
+    power for each of exponents, along a new trailing axis.
+    '''
+
+    return power(np.asarray(base, dtype=float)[..., None], np.asarray(exponents, dtype=float))
+
+def pe_values(eps, growth, pe, margin_of_safety=MARGIN_OF_SAFETY,
+              discount_rate=DISCOUNT_RATE):
+    '''
+    P/E valuation: EPS grown for five years at the safe growth rate, times
+    the median historical P/E, discounted back five years.
+
+    Parameters
+    ----------
+    eps : array
+        EPS TTM
+    growth : array
+        Growth Rate
+    pe : array
+        Median Historical P/E
+    margin_of_safety : float or array, optional
+        The default is MARGIN_OF_SAFETY = 0.15.
+    discount_rate : float or array, optional
+        The default is DISCOUNT_RATE = 0.08.
+
+    Returns
+    -------
+    array
+        P/E valuations
+
+    '''
+
+    safe_growth_rate = growth * (1.0 - margin_of_safety)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        five_year_value = eps * power(1 + safe_growth_rate, 5) * pe
+
+        return finite(five_year_value / power(1 + discount_rate, 5))
+
+def dcf_values(fcf, cash, liabilities, shares, growth,
+               margin_of_safety=MARGIN_OF_SAFETY, discount_rate=DISCOUNT_RATE,
+               growth_decline=GROWTH_DECAY_RATE, year_10_multiplier=Y10_MULTIPLIER):
+    '''
+    Discount cash flow valuation: ten years of free cash flow growing at a
+    decaying safe growth rate, discounted, plus a year 10 multiple, plus cash
+    less liabilities, per share.
+
+    The decaying growth isn't a geometric series, so the ten growth factors
+    are multiplied out with a cumulative product along a trailing axis of
+    length 10. Every step is done in the same order as Equity.value, so the
+    results are the same to the bit.
+
+    Parameters
+    ----------
+    fcf : array
+        Free Cash Flow
+    cash : array
+        Cash and Cash Equivalents
+    liabilities : array
+        Total Liabilities
+    shares : array
+        Shares Outstanding
+    growth : array
+        Growth Rate
+    margin_of_safety : float or array, optional
+        The default is MARGIN_OF_SAFETY = 0.15.
+    discount_rate : float or array, optional
+        The default is DISCOUNT_RATE = 0.08.
+    growth_decline : float or array, optional
+        The default is GROWTH_DECAY_RATE = 0.05.
+    year_10_multiplier : float or array, optional
+        The default is Y10_MULTIPLIER = 12.
+
+    Returns
+    -------
+    array
+        DCF valuations
+
+    '''
+
+    fcf, cash, liabilities, shares, growth, margin_of_safety, discount_rate, \
+        growth_decline, year_10_multiplier = np.broadcast_arrays(
+            *[np.asarray(x, dtype=float) for x in [fcf, cash, liabilities,
+              shares, growth, margin_of_safety, discount_rate, growth_decline,
+              year_10_multiplier]])
+
+    safe_growth_rate = growth * (1.0 - margin_of_safety)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        growth_series = 1 + safe_growth_rate[..., None] * powers(1 - growth_decline, range(10))
+
+        #multiply fcf through the factors left to right, same as Equity.value
+        fcf_x_growth_series = np.cumprod(
+            np.concatenate([fcf[..., None], growth_series], axis=-1), axis=-1)[..., 1:]
+
+        npv_fcf_series = fcf_x_growth_series / powers(1 + discount_rate, range(1, 11))
+
+        total_npv_fcf = np.sum(npv_fcf_series, axis=-1)
+        year_10_fcf_value = npv_fcf_series[..., -1] * year_10_multiplier
+
+        company_value = total_npv_fcf + year_10_fcf_value + cash - liabilities
+
+        return finite(company_value / shares)
+
+def roe_values(equity, shares, roe, dividend, growth,
+               margin_of_safety=MARGIN_OF_SAFETY, discount_rate=DISCOUNT_RATE):
+    '''
+    Return on equity valuation: book value per share grown for ten years,
+    times ROE, capitalized at the discount rate and discounted back, plus the
+    discounted dividends over the period.
+
+    The ten discounted dividends are laid out along a trailing axis and 
+    summed with np.sum, as Equity.value sums its list of them, so the 
+    results are the same to the bit.
+
+    Parameters
+    ----------
+    equity : array
+        Shareholders Equity
+    shares : array
+        Shares Outstanding
+    roe : array
+        Return on Equity 5-yr
+    dividend : array
+        Dividend Per Share
+    growth : array
+        Growth Rate
+    margin_of_safety : float or array, optional
+        The default is MARGIN_OF_SAFETY = 0.15.
+    discount_rate : float or array, optional
+        The default is DISCOUNT_RATE = 0.08.
+
+    Returns
+    -------
+    array
+        ROE valuations
+
+    '''
+
+    equity, shares, roe, dividend, growth, margin_of_safety, discount_rate = \
+        np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in [equity, shares, roe,
+                              dividend, growth, margin_of_safety, discount_rate]])
+
+    safe_growth_rate = growth * (1.0 - margin_of_safety)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        eq = equity / shares
+
+        growth_series = powers(1 + safe_growth_rate, range(1, 11))
+        y10_net_income = eq * growth_series[..., -1] * roe
+        required_value = y10_net_income / discount_rate
+        npv_required_value = required_value / power(1 + discount_rate, 10)
+
+        #div * (1+g)**(k+1) / (1+r)**k for k in 0..9
+        div_series = dividend[..., None] * growth_series
+        npv_div_series = div_series / powers(1 + discount_rate, range(10))
+        npv_dividends = np.sum(npv_div_series, axis=-1)
+
+        return finite(npv_required_value + npv_dividends)
+
+def value_returns(price, values):
+    '''
+    Return if price converged to value, see Equity.value_return.
+    '''
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return finite((values - price) / price)
+
+def value_frame(df, margin_of_safety=MARGIN_OF_SAFETY, discount_rate=DISCOUNT_RATE,
+                growth_decline=GROWTH_DECAY_RATE, year_10_multiplier=Y10_MULTIPLIER):
+    '''
+    Values every row of a DataFrame of fundamentals with all three methods.
+
+    Parameters
+    ----------
+    df : DataFrame
+        One row per ticker with the columns from Equity.out_all.
+    margin_of_safety : float, optional
+        The default is MARGIN_OF_SAFETY = 0.15.
+    discount_rate : float, optional
+        The default is DISCOUNT_RATE = 0.08.
+    growth_decline : float, optional
+        The default is GROWTH_DECAY_RATE = 0.05.
+    year_10_multiplier : float, optional
+        The default is Y10_MULTIPLIER = 12.
+
+    Returns
+    -------
+    DataFrame
+        P/E, DCF and ROE valuations and value returns, indexed like df.
+
+    '''
+
+    col = lambda name: df[name].to_numpy(dtype=float)
+    growth = col('Growth Rate')
+
+    values = [
+        pe_values(col('EPS'), growth, col('Median Historical P/E'),
+                  margin_of_safety, discount_rate),
+        dcf_values(col('Free Cash Flow'), col('Cash and Cash Equivalents'),
+                   col('Total Liabilities'), col('Shares Outstanding'), growth,
+                   margin_of_safety, discount_rate, growth_decline, year_10_multiplier),
+        roe_values(col('Shareholders Equity'), col('Shares Outstanding'),
+                   col('Return on Equity 5-yr'), col('Dividend Per Share'), growth,
+                   margin_of_safety, discount_rate)
+        ]
+
+    price = col('Price')
+    out = dict(zip(VALUATION_COLUMNS, values))
+    out.update(zip(RETURN_COLUMNS, [value_returns(price, v) for v in values]))
+
+    return pd.DataFrame(out, index=df.index)
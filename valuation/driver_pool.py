@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 10:12:31 2026
+
+@author: David Billingsley
+"""
+
+'''
+A pool of headless Chrome drivers shared across Equity instances so that
+browser startup is paid once per run instead of once per ticker.
+'''
+import atexit
+import threading
+from contextlib import contextmanager
+from lazy import lazy_import
+
+#selenium is only imported when the first driver is started
+webdriver = lazy_import('selenium.webdriver')
+
+
+def new_driver(headless=True):
+    '''
+    Starts a new Chrome driver.
+
+    Parameters
+    ----------
+    headless : boolean, optional
+        Whether to run Chrome without a window. The default is True.
+
+    Returns
+    -------
+    WebDriver
+        a Chrome driver
+
+    '''
+
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless')
+    driver = webdriver.Chrome(options = options)
+
+    #no implicit wait. Set_data waits explicitly for each element it needs,
+    #see wait_for in valuation_utils.
+    driver.implicitly_wait(0)
+
+    return driver
+
+
+class DriverPool():
+    '''
+    Pool of Chrome drivers. Drivers are checked out for one ticker at a time,
+    reset when checked back in, and recycled after max_uses tickers or after
+    a crash.
+    '''
+
+    def __init__(self, size=4, max_uses=50, headless=True, factory=new_driver):
+        self.size = size
+        self.max_uses = max_uses
+        self.headless = headless
+        self.factory = factory
+
+        self.idle = []
+        self.uses = {}
+        self.live = 0
+        self.lock = threading.Condition()
+        self.stats = {'hits' : 0, 'misses' : 0, 'recycled' : 0, 'crashed' : 0}
+
+    def checkout(self):
+        '''
+        Gets a driver from the pool, starting one if none are idle and the pool
+        isn't full, otherwise waiting for one to be checked in.
+
+        Returns
+        -------
+        WebDriver
+
+
+        '''
+
+        with self.lock:
+            while not self.idle and self.live >= self.size:
+                self.lock.wait()
+            if self.idle:
+                self.stats['hits'] += 1
+                return self.idle.pop()
+            self.stats['misses'] += 1
+            self.live += 1
+
+        try:
+            driver = self.factory(headless=self.headless)
+        except Exception:
+            with self.lock:
+                self.live -= 1
+                self.lock.notify()
+            raise
+
+        self.uses[id(driver)] = 0
+        return driver
+
+    def checkin(self, driver, crashed=False):
+        '''
+        Returns a driver to the pool. The driver is reset so the next ticker
+        starts from a blank page, or quit if it crashed, can't be reset, or
+        has been used max_uses times.
+
+        Parameters
+        ----------
+        driver : WebDriver
+            a driver from checkout()
+        crashed : boolean, optional
+            Whether the driver failed while checked out. The default is False.
+
+        Returns
+        -------
+        None.
+
+        '''
+
+        self.uses[id(driver)] = self.uses.get(id(driver), 0) + 1
+
+        if crashed:
+            self.stats['crashed'] += 1
+        elif self.uses[id(driver)] >= self.max_uses:
+            self.stats['recycled'] += 1
+        else:
+            try:
+                self.reset(driver)
+                with self.lock:
+                    self.idle.append(driver)
+                    self.lock.notify()
+                return
+            except Exception:
+                self.stats['crashed'] += 1
+
+        self.discard(driver)
+
+    def reset(self, driver):
+        '''
+        Clears state left over from the last ticker.
+        '''
+
+        driver.delete_all_cookies()
+        driver.get('about:blank')
+
+    def discard(self, driver):
+        '''
+        Quits a driver and frees its place in the pool.
+        '''
+
+        self.uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+        with self.lock:
+            self.live -= 1
+            self.lock.notify()
+
+    @contextmanager
+    def driver(self):
+        '''
+        Lends a driver for the duration of a with block. The driver is only
+        checked out the first time it is used, so a block that is served 
+        entirely from the page cache never starts a browser. If anything
+        escapes the block the driver is treated as crashed and recycled.
+        '''
+
+        driver = LazyDriver(self)
+        try:
+            yield driver
+        except Exception:
+            if driver._driver is not None:
+                self.checkin(driver._driver, crashed=True)
+            raise
+        if driver._driver is not None:
+            self.checkin(driver._driver)
+
+    def resize(self, size):
+        '''
+        Grows the pool to at least size drivers.
+        '''
+
+        with self.lock:
+            self.size = max(self.size, size)
+            self.lock.notify_all()
+
+    def close(self):
+        '''
+        Quits all idle drivers.
+        '''
+
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for driver in idle:
+            self.discard(driver)
+
+    def __str__(self):
+
+        return 'DriverPool(size={}, live={}, idle={}, hits={}, misses={}, recycled={}, crashed={})'.format(
+            self.size, self.live, len(self.idle), self.stats['hits'],
+            self.stats['misses'], self.stats['recycled'], self.stats['crashed'])
+
+
+class LazyDriver():
+    '''
+    Stands in for a WebDriver and checks one out of the pool on first use.
+    '''
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._driver = None
+
+    def __getattr__(self, name):
+
+        return getattr(self.checkout(), name)
+
+    def checkout(self):
+        '''
+        The pooled driver, checked out now if it hasn't been yet. Call it
+        before taking a host slot (see driver_get), so no thread ever waits
+        for a driver while holding a slot that a thread with a driver is
+        waiting for.
+        '''
+
+        if self._driver is None:
+            self._driver = self._pool.checkout()
+
+        return self._driver
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+def default_pool(size=1):
+    '''
+    Gets the pool shared by every Equity for the whole run, creating it on
+    first use.
+
+    Parameters
+    ----------
+    size : int, optional
+        Minimum number of drivers the pool should allow. The default is 1.
+
+    Returns
+    -------
+    DriverPool
+
+
+    '''
+
+    global _default_pool
+
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = DriverPool(size=size)
+            atexit.register(_default_pool.close)
+        else:
+            _default_pool.resize(size)
+
+    return _default_pool
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 20:41:05 2026
+
+@author: David Billingsley
+"""
+
+'''
+Persistent store of the fields Equity.set_data scrapes, one value and fetch
+time per ticker and field, so that re-running a basket only re-fetches the
+fields that have gone stale. How long a field stays fresh depends on how
+often it changes: the price is refreshed daily, balance sheet and key ratio
+items once the next quarterly report should be out.
+
+    store = FundamentalsStore()
+    store.stale(tickers)        #ticker -> fields to re-fetch
+    store.put('X', stock.data)
+    store.frame(tickers)        #one row of fundamentals per ticker
+'''
+import os
+import sqlite3
+import threading
+import numpy as np
+from time import time
+from datetime import date, datetime, timedelta
+from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fundamentals_store')
+
+#days after a quarter closes by which its report is assumed to be out
+EARNINGS_LAG = 45
+
+
+def same_day(fetched, now):
+    '''
+    Fresh until the end of the day it was fetched.
+    '''
+
+    return date.fromtimestamp(fetched) == date.fromtimestamp(now)
+
+def max_age(seconds):
+    '''
+    Fresh for seconds after it was fetched.
+    '''
+
+    return lambda fetched, now: now - fetched <= seconds
+
+def last_report(now, lag=EARNINGS_LAG):
+    '''
+    When the most recent quarterly report should have come out: the latest
+    quarter end that is at least lag days before now, plus lag days.
+
+    Returns
+    -------
+    float
+        timestamp
+
+    '''
+
+    day = date.fromtimestamp(now) - timedelta(days=lag)
+    quarter = (day.month - 1) // 3
+    end = date(day.year, 3 * quarter + 3, 1)
+    end = date(end.year + end.month // 12, end.month % 12 + 1, 1) - timedelta(days=1)
+    if end > day:
+        end = date(day.year, 3 * quarter + 1, 1) - timedelta(days=1)
+
+    return datetime.combine(end + timedelta(days=lag), datetime.min.time()).timestamp()
+
+def after_earnings(lag=EARNINGS_LAG):
+    '''
+    Fresh until the next quarterly report should be out, see last_report.
+    '''
+
+    return lambda fetched, now: fetched >= last_report(now, lag)
+
+#freshness rule per field, rule(fetched, now) -> True if still fresh
+FRESHNESS = {
+    'Price' : same_day,
+    'EPS' : same_day,
+    'Growth Rate' : max_age(7 * 86400),
+    'Median Historical P/E' : after_earnings(),
+    'Cash and Cash Equivalents' : after_earnings(),
+    'Total Liabilities' : after_earnings(),
+    'Shareholders Equity' : after_earnings(),
+    'Free Cash Flow' : after_earnings(),
+    'Shares Outstanding' : after_earnings(),
+    'Dividend Per Share' : after_earnings(),
+    'Return on Equity 5-yr' : after_earnings()
+    }
+
+
+class FundamentalsStore():
+    '''
+    Field values by ticker in a sqlite file, each with the time it was
+    fetched. A field that was fetched but isn't on the page (no dividend,
+    no growth estimate) is stored as NULL with its fetch time, so it
+    follows its freshness rule like any value. Callers leave out fields
+    whose fetch failed, so those stay stale and are tried again next run.
+    '''
+
+    def __init__(self, path=STORE_DIR, freshness=None):
+        self.path = path
+        self.freshness = dict(FRESHNESS) if freshness is None else freshness
+
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(path, 'fundamentals.sqlite'),
+                                  check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS fields (
+                            ticker TEXT,
+                            field TEXT,
+                            value REAL,
+                            fetched REAL,
+                            PRIMARY KEY (ticker, field))''')
+        self.db.commit()
+
+    def put(self, ticker, values, fetched=None):
+        '''
+        Stores fields for ticker.
+
+        Parameters
+        ----------
+        ticker : string
+
+        values : dict
+            field -> value, e.g. Equity.data, for the fields that were 
+            fetched. None, np.nan and other values that aren't finite are 
+            stored as missing (NULL); values that aren't numbers at all are 
+            skipped.
+        fetched : float, optional
+            Timestamp the values were fetched at. The default is None, which
+            is now.
+
+        Returns
+        -------
+        int
+            number of fields stored.
+
+        '''
+
+        fetched = time() if fetched is None else fetched
+        rows = []
+        for field, value in values.items():
+            try:
+                value = np.nan if value is None else float(value)
+            except (TypeError, ValueError):
+                continue
+            rows.append((ticker.upper(), field, value if np.isfinite(value) else None, fetched))
+
+        with self.lock:
+            self.db.executemany('INSERT OR REPLACE INTO fields VALUES (?,?,?,?)', rows)
+            self.db.commit()
+
+        return len(rows)
+
+    def get(self, ticker):
+        '''
+        Returns
+        -------
+        dict
+            field -> (value, fetched) for ticker. value is None for a field
+            stored as missing.
+
+        '''
+
+        with self.lock:
+            rows = self.db.execute('SELECT field, value, fetched FROM fields WHERE ticker=?',
+                                   (ticker.upper(),)).fetchall()
+
+        return {field : (value, fetched) for field, value, fetched in rows}
+
+    def stale(self, tickers, fields=None, now=None):
+        '''
+        Fields that need re-fetching, because they were never stored or
+        their freshness rule says they are out of date.
+
+        Parameters
+        ----------
+        tickers : list
+
+        fields : list, optional
+            Fields to check. The default is None, which checks every field
+            with a freshness rule.
+        now : float, optional
+            Timestamp to judge freshness at. The default is None, which is
+            now.
+
+        Returns
+        -------
+        dict
+            ticker -> list of stale fields, for tickers with any.
+
+        '''
+
+        now = time() if now is None else now
+        fields = list(self.freshness.keys()) if fields is None else list(fields)
+        tickers = [t.upper() for t in tickers]
+
+        with self.lock:
+            rows = self.db.execute('SELECT ticker, field, fetched FROM fields').fetchall()
+        fetched = {(ticker, field) : at for ticker, field, at in rows}
+
+        stale = {}
+        for ticker in tickers:
+            old = [field for field in fields
+                   if (ticker, field) not in fetched
+                   or not self.freshness.get(field, same_day)(fetched[ticker, field], now)]
+            if old:
+                stale[ticker] = old
+
+        return stale
+
+    def frame(self, tickers=None):
+        '''
+        Stored values as a DataFrame.
+
+        Parameters
+        ----------
+        tickers : list, optional
+            The default is None, which gives every stored ticker.
+
+        Returns
+        -------
+        DataFrame
+            one row per ticker (in the order given) by field, np.nan where a
+            field isn't stored, and the date the price was fetched as Date.
+
+        '''
+
+        with self.lock:
+            rows = self.db.execute('SELECT ticker, field, value, fetched FROM fields').fetchall()
+
+        long = pd.DataFrame(rows, columns=['Ticker', 'Field', 'Value', 'Fetched'])
+        frame = long.pivot(index='Ticker', columns='Field', values='Value')
+        prices = long[long['Field'] == 'Price'].set_index('Ticker')['Fetched']
+        frame['Date'] = prices.map(lambda at: date.fromtimestamp(at))
+        frame = frame.reindex(columns=list(dict.fromkeys(list(self.freshness.keys()) +
+                                                         list(frame.columns))))
+        frame.columns.name = None
+
+        if tickers is not None:
+            frame = frame.reindex([t.upper() for t in tickers])
+        frame.index.name = None
+
+        return frame
+
+    def clear(self):
+
+        with self.lock:
+            self.db.execute('DELETE FROM fields')
+            self.db.commit()
+
+    def __str__(self):
+
+        with self.lock:
+            tickers, fields = self.db.execute(
+                'SELECT COUNT(DISTINCT ticker), COUNT(*) FROM fields').fetchone()
+
+        return 'FundamentalsStore({}, tickers={}, fields={})'.format(self.path, tickers, fields)
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def default_store():
+    '''
+    Gets the store shared by every run, creating it on first use.
+    '''
+
+    global _default_store
+
+    with _default_lock:
+        if _default_store is None:
+            _default_store = FundamentalsStore()
+
+    return _default_store
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 21:34:50 2026
+
+@author: David Billingsley
+"""
+
+'''
+Deferred imports, so that importing valuation (or simfin_data) doesn't pay
+for selenium, pandas, BeautifulSoup, sklearn etc. until something actually
+uses them.
+
+    pd = lazy_import('pandas')      #nothing imported yet
+    pd.DataFrame(...)               #pandas is imported here, once
+'''
+import importlib
+import threading
+
+
+class LazyModule():
+    '''
+    Stands in for a module and imports it on first attribute access. Safe to
+    use from several threads at once.
+    '''
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+
+        return module
+
+    def __getattr__(self, attr):
+
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+
+        return dir(self._load())
+
+    def __repr__(self):
+
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+
+        return '<lazy module {} ({})>'.format(self.__dict__['_name'], state)
+
+
+def lazy_import(name):
+    '''
+    A module that is imported the first time one of its attributes is used.
+
+    Parameters
+    ----------
+    name : string
+        e.g. 'pandas' or 'sklearn.decomposition'
+
+    Returns
+    -------
+    LazyModule
+
+    '''
+
+    return LazyModule(name)
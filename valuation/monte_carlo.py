@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 15:10:52 2026
+
+@author: David Billingsley
+"""
+
+'''
+Monte Carlo valuation. The P/E, DCF and ROE valuations lean heavily on a
+single scraped Growth Rate, Median Historical P/E and Return on Equity, so
+this samples those inputs from distributions around the scraped values and
+reports quantiles of each valuation and the probability that it is above
+the current price.
+'''
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from lazy import lazy_import
+from batch_valuation import pe_values, dcf_values, roe_values, VALUATION_COLUMNS, \
+    MARGIN_OF_SAFETY, DISCOUNT_RATE, GROWTH_DECAY_RATE, Y10_MULTIPLIER
+
+#only needed to build the result, so workers never import it
+pd = lazy_import('pandas')
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+#paths valued at once. The DCF method holds about four temporaries of ten
+#floats per path, so this bounds working memory at roughly 64 * CHUNK bytes.
+CHUNK = 2**16
+
+
+class Normal():
+    '''
+    Normal distribution centered on the scraped value. scale is a fraction
+    of the scraped value if relative, otherwise an absolute standard
+    deviation.
+    '''
+
+    def __init__(self, scale, relative=True):
+        self.scale = scale
+        self.relative = relative
+
+    def sample(self, rng, center, size):
+
+        sd = self.scale * abs(center) if self.relative else self.scale
+
+        return rng.normal(center, sd, size)
+
+
+class LogNormal():
+    '''
+    Log-normal distribution with mean equal to the scraped value, for inputs
+    that can't go negative like P/E.
+    '''
+
+    def __init__(self, sigma):
+        self.sigma = sigma
+
+    def sample(self, rng, center, size):
+
+        return center * rng.lognormal(-self.sigma**2 / 2, self.sigma, size)
+
+
+class Uniform():
+    '''
+    Uniform distribution within +/- width of the scraped value. width is a
+    fraction of the scraped value if relative.
+    '''
+
+    def __init__(self, width, relative=True):
+        self.width = width
+        self.relative = relative
+
+    def sample(self, rng, center, size):
+
+        #rng.uniform raises on a NaN or infinite range, where normal and 
+        #lognormal just return NaN
+        if not np.isfinite(center):
+            return np.full(size, np.nan)
+
+        width = self.width * abs(center) if self.relative else self.width
+
+        return rng.uniform(center - width, center + width, size)
+
+
+DISTRIBUTIONS = {
+    'Growth Rate' : Normal(0.25),
+    'Median Historical P/E' : LogNormal(0.2),
+    'Return on Equity 5-yr' : Normal(0.2)
+    }
+
+
+def simulate_ticker(row, distributions, n_paths, seed, params, chunk=CHUNK):
+    '''
+    Simulates n_paths valuations for one ticker.
+
+    Parameters
+    ----------
+    row : dict
+        The ticker's fundamentals, columns from Equity.out_all.
+    distributions : dict
+        input column -> distribution to sample it from. Inputs not listed
+        are held at their scraped value.
+    n_paths : int
+        Number of paths.
+    seed : numpy SeedSequence
+        Seed for this ticker.
+    params : dict
+        margin_of_safety, discount_rate, growth_decline, year_10_multiplier.
+    chunk : int, optional
+        Paths valued at once. The default is CHUNK.
+
+    Returns
+    -------
+    array
+        n_paths x 3 valuations, P/E, DCF and ROE.
+
+    '''
+
+    values = np.empty((n_paths, len(VALUATION_COLUMNS)))
+
+    #one generator per input, each drawn from in order across chunks, so
+    #results don't depend on the chunk size
+    rngs = {name : np.random.default_rng(child) for name, child in
+            zip(sorted(distributions.keys()), seed.spawn(len(distributions)))}
+
+    for start in range(0, n_paths, chunk):
+        stop = min(start + chunk, n_paths)
+
+        sample = dict(row)
+        for name, dist in distributions.items():
+            sample[name] = dist.sample(rngs[name], row[name], stop - start)
+
+        growth = sample['Growth Rate']
+        values[start:stop, 0] = pe_values(sample['EPS'], growth, sample['Median Historical P/E'],
+                                          params['margin_of_safety'], params['discount_rate'])
+        values[start:stop, 1] = dcf_values(sample['Free Cash Flow'], sample['Cash and Cash Equivalents'],
+                                           sample['Total Liabilities'], sample['Shares Outstanding'],
+                                           growth, **params)
+        values[start:stop, 2] = roe_values(sample['Shareholders Equity'], sample['Shares Outstanding'],
+                                           sample['Return on Equity 5-yr'], sample['Dividend Per Share'],
+                                           growth, params['margin_of_safety'], params['discount_rate'])
+
+    return values
+
+def summarize(values, price, quantiles):
+    '''
+    Quantiles of each valuation and the probability it is above price.
+    NaN paths (e.g. a missing input) are ignored, and the probability is NaN
+    when there is no price.
+    '''
+
+    rows = []
+    for i in range(len(VALUATION_COLUMNS)):
+        v = values[:, i]
+        v = v[~np.isnan(v)]
+        if len(v) == 0:
+            rows.append([np.nan] * (len(quantiles) + 1))
+            continue
+        above = np.mean(v > price) if np.isfinite(price) else np.nan
+        rows.append(list(np.quantile(v, quantiles)) + [above])
+
+    return rows
+
+def _simulate_summary(args):
+
+    row, distributions, n_paths, seed, params, chunk, quantiles = args
+    values = simulate_ticker(row, distributions, n_paths, seed, params, chunk)
+
+    return summarize(values, row['Price'], quantiles)
+
+def monte_carlo(df, n_paths=100000, distributions=None, seed=None, processes=None,
+                quantiles=QUANTILES, chunk=CHUNK, margin_of_safety=MARGIN_OF_SAFETY,
+                discount_rate=DISCOUNT_RATE, growth_decline=GROWTH_DECAY_RATE,
+                year_10_multiplier=Y10_MULTIPLIER):
+    '''
+    Monte Carlo valuation of every ticker in df.
+
+    Parameters
+    ----------
+    df : DataFrame
+        One row per ticker with the columns from Equity.out_all.
+    n_paths : int, optional
+        Paths per ticker. The default is 100000.
+    distributions : dict, optional
+        input column -> distribution. The default is None, which uses
+        DISTRIBUTIONS.
+    seed : int, optional
+        Seed for reproducible results. Results are the same for a given seed
+        whatever processes and chunk are. The default is None.
+    processes : int, optional
+        Number of processes to spread tickers over. The default is None,
+        which runs in this process. Each job carries its ticker's row, the
+        distributions and the parameters, so workers need no state from
+        this process and any start method works, spawn on Windows 
+        included. A spawned worker only imports numpy and batch_valuation.
+    quantiles : list, optional
+        Quantiles to report. The default is QUANTILES.
+    chunk : int, optional
+        Paths valued at once per ticker. The default is CHUNK.
+    margin_of_safety, discount_rate, growth_decline, year_10_multiplier : float
+        Valuation parameters, see Equity.value.
+
+    Returns
+    -------
+    DataFrame
+        indexed by (ticker, method), with a column per quantile and the
+        probability that value exceeds price.
+
+    '''
+
+    if distributions is None:
+        distributions = DISTRIBUTIONS
+
+    params = {'margin_of_safety' : margin_of_safety, 'discount_rate' : discount_rate,
+              'growth_decline' : growth_decline, 'year_10_multiplier' : year_10_multiplier}
+
+    seeds = np.random.SeedSequence(seed).spawn(len(df))
+    jobs = [(row, distributions, n_paths, ticker_seed, params, chunk, quantiles)
+            for row, ticker_seed in zip(df.to_dict('records'), seeds)]
+
+    if processes is not None and processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            summaries = list(executor.map(_simulate_summary, jobs))
+    else:
+        summaries = [_simulate_summary(job) for job in jobs]
+
+    index = pd.MultiIndex.from_product([df.index, VALUATION_COLUMNS], names=['Ticker', 'Method'])
+    columns = ['q' + str(q) for q in quantiles] + ['P(Value > Price)']
+
+    return pd.DataFrame([row for summary in summaries for row in summary],
+                        index=index, columns=columns)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 16:48:13 2026
+
+@author: David Billingsley
+"""
+
+'''
+Parses whole Morningstar grids (the quarterly balance sheet and the key
+ratios tables) into DataFrames of periods by line items, converting every
+cell to a number at once instead of one find/check_float/float_convert per
+field.
+'''
+import re
+import numpy as np
+from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+BALANCE_ROW = re.compile(r'^data_')
+BALANCE_CELL = re.compile(r'^Y_\d+$')
+RATIO_ROW = re.compile(r'^i\d+$')
+RATIO_PERIOD = re.compile(r'^Y\d+$')
+
+
+def to_numeric(frame):
+    '''
+    Converts a DataFrame of scraped strings to floats. Thousands separators
+    are dropped and anything that isn't a number (e.g. '—') becomes np.nan.
+    '''
+
+    if frame.empty:
+        return frame.astype(float)
+
+    stacked = frame.stack()
+    numbers = pd.to_numeric(stacked.astype(str).str.replace(',', '', regex=False),
+                            errors='coerce')
+
+    return numbers.unstack().reindex(index=frame.index, columns=frame.columns)
+
+def period_key(label):
+    '''
+    Sorts Y_1, Y_2, ..., Y_10 (or Y0 ... Y10) numerically.
+    '''
+
+    return int(re.sub(r'\D', '', label))
+
+def balance_table(soup):
+    '''
+    Parses the Morningstar balance sheet into a DataFrame.
+
+    Each line item is a div with an id like 'data_i1' (cash and cash
+    equivalents), 'data_ttg5' (total liabilities), 'data_ttg8' (shareholders'
+    equity), holding one cell per period with ids Y_1 ... Y_5 and the
+    unrounded value in a rawvalue attribute.
+
+    Parameters
+    ----------
+    soup : BeautifulSoup object
+        the balance sheet page
+
+    Returns
+    -------
+    DataFrame
+        periods (Y_1 ... oldest to newest) by line item id.
+
+    '''
+
+    rows = {}
+    for row in soup.find_all(id=BALANCE_ROW):
+        rows[row['id']] = {cell['id'] : cell.get('rawvalue')
+                           for cell in row.find_all(id=BALANCE_CELL)}
+
+    frame = pd.DataFrame(rows)
+    frame = frame.reindex(sorted(frame.index, key=period_key))
+
+    return to_numeric(frame)
+
+def ratio_table(soup):
+    '''
+    Parses the Morningstar key ratios tables into one DataFrame.
+
+    Each line item is a row whose th has an id like 'i11' (free cash flow),
+    'i7' (shares), 'i6' (dividends), 'i26' (return on equity), followed by a
+    td per period. Periods come from the td headers attribute ('Y10 i11')
+    where there is one, otherwise from the cell's position. The period
+    labels from the table header ('2012-12' ... 'TTM') are kept in
+    frame.attrs['periods'].
+
+    Parameters
+    ----------
+    soup : BeautifulSoup object
+        the key ratios page
+
+    Returns
+    -------
+    DataFrame
+        periods (Y0 ... Y10, oldest to newest, TTM last) by line item id.
+
+    '''
+
+    periods = {th['id'] : th.text.strip() for th in soup.find_all('th', id=RATIO_PERIOD)}
+
+    rows = {}
+    for th in soup.find_all('th', id=RATIO_ROW):
+        cells = {}
+        for position, td in enumerate(th.parent.find_all('td', recursive=False)):
+            headers = td.get('headers') or []
+            if isinstance(headers, str):
+                headers = headers.split()
+            period = [h for h in headers if RATIO_PERIOD.match(h)]
+            cells[period[0] if period else 'Y' + str(position)] = td.text
+        rows[th['id']] = cells
+
+    frame = pd.DataFrame(rows)
+    frame = frame.reindex(sorted(frame.index, key=period_key))
+    frame = to_numeric(frame)
+    frame.attrs['periods'] = periods
+
+    return frame
+
+def latest(table, item, period=None, factor=1.0):
+    '''
+    A single value out of a parsed table.
+
+    Parameters
+    ----------
+    table : DataFrame
+        from balance_table or ratio_table
+    item : string
+        line item id, e.g. 'i11'
+    period : string, optional
+        period id, e.g. 'Y10'. The default is None, which takes the newest
+        period.
+    factor : float, optional
+        Multiply the value by this factor. The default is 1.0.
+
+    Returns
+    -------
+    float
+        the value, or np.nan if it is missing.
+
+    '''
+
+    if item not in table.columns:
+        return np.nan
+
+    column = table[item]
+    if period is None:
+        return column.iloc[-1] * factor if len(column) else np.nan
+
+    return column.get(period, np.nan) * factor
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 11:02:47 2026
+
+@author: David Billingsley
+"""
+
+'''
+On-disk cache of scraped pages, so that re-valuing a basket with different
+parameters doesn't have to go back to Yahoo and Morningstar.
+'''
+import os
+import zlib
+import sqlite3
+import hashlib
+import threading
+from time import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'page_cache')
+
+#how long a cached page stays fresh, in seconds, by host. Quotes move daily,
+#fundamentals quarterly.
+CACHE_TTLS = {
+    'finance.yahoo.com' : 6 * 3600,
+    'financials.morningstar.com' : 7 * 86400
+    }
+DEFAULT_TTL = 86400
+
+#total compressed size the cache may grow to before least recently used pages
+#are evicted.
+MAX_BYTES = 500 * 1024**2
+
+
+class CacheMiss(LookupError):
+    '''
+    Raised in offline mode when a page has never been cached.
+    '''
+
+
+class PageCache():
+    '''
+    Cache of page html keyed by url and page state (e.g. 'quarterly' for the
+    Morningstar balance sheet after switching frequency). Pages are stored
+    zlib-compressed in a sqlite file, expire after a per-host TTL, and are
+    evicted least recently used first once the cache is over max_bytes.
+
+    In offline mode every lookup is served from the cache regardless of age,
+    and a miss raises CacheMiss instead of fetching.
+    '''
+
+    def __init__(self, path=CACHE_DIR, ttls=None, max_bytes=MAX_BYTES, offline=False):
+        self.path = path
+        self.ttls = dict(CACHE_TTLS) if ttls is None else ttls
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.stats = {'hits' : 0, 'misses' : 0, 'stale' : 0, 'evicted' : 0}
+
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(path, 'pages.sqlite'),
+                                  check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS pages (
+                            key TEXT PRIMARY KEY,
+                            url TEXT,
+                            state TEXT,
+                            fetched REAL,
+                            accessed REAL,
+                            size INTEGER,
+                            html BLOB)''')
+        self.db.commit()
+
+    def key(self, url, state=''):
+
+        return hashlib.sha1((url + '|' + state).encode('utf-8')).hexdigest()
+
+    def ttl(self, url):
+
+        return self.ttls.get(urlparse(url).netloc, DEFAULT_TTL)
+
+    def get(self, url, state=''):
+        '''
+        Gets a cached page.
+
+        Parameters
+        ----------
+        url : string
+
+        state : string, optional
+            State the page was in when cached. The default is ''.
+
+        Returns
+        -------
+        string
+            the page html, or None if it isn't cached or has expired (expired
+            pages are still returned in offline mode).
+
+        '''
+
+        key = self.key(url, state)
+
+        with self.lock:
+            row = self.db.execute('SELECT fetched, html FROM pages WHERE key=?',
+                                  (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+
+            fetched, html = row
+            if not self.offline and time() - fetched > self.ttl(url):
+                self.stats['stale'] += 1
+                return None
+
+            self.db.execute('UPDATE pages SET accessed=? WHERE key=?', (time(), key))
+            self.db.commit()
+            self.stats['hits'] += 1
+
+        return zlib.decompress(html).decode('utf-8')
+
+    def put(self, url, html, state=''):
+        '''
+        Stores a page, then evicts least recently used pages if the cache is
+        over max_bytes.
+
+        Parameters
+        ----------
+        url : string
+
+        html : string or bytes
+
+        state : string, optional
+            State the page is in. The default is ''.
+
+        Returns
+        -------
+        None.
+
+        '''
+
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        blob = zlib.compress(html, 6)
+        now = time()
+
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO pages VALUES (?,?,?,?,?,?,?)',
+                            (self.key(url, state), url, state, now, now, len(blob), blob))
+            self.evict()
+            self.db.commit()
+
+    def evict(self):
+        '''
+        Deletes least recently used pages until the cache fits in max_bytes.
+        Call with the lock held.
+        '''
+
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in self.db.execute('SELECT key, size FROM pages ORDER BY accessed').fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute('DELETE FROM pages WHERE key=?', (key,))
+            total -= size
+            self.stats['evicted'] += 1
+
+    def fetch(self, url, load, state='', refresh=False):
+        '''
+        Gets a page from the cache, or calls load() to fetch it and caches
+        the result.
+
+        Parameters
+        ----------
+        url : string
+
+        load : callable
+            Fetches the page html if it isn't cached.
+        state : string, optional
+            State the page is in. The default is ''.
+        refresh : boolean, optional
+            Skip the cache and fetch anyway. The default is False.
+
+        Raises
+        ------
+        CacheMiss
+            in offline mode if the page isn't cached.
+
+        Returns
+        -------
+        string
+            the page html
+
+        '''
+
+        html = None if refresh and not self.offline else self.get(url, state)
+        if html is not None:
+            return html
+
+        if self.offline:
+            raise CacheMiss('No cached page for ' + url + ' ' + state)
+
+        html = load()
+        if isinstance(html, bytes):
+            html = html.decode('utf-8', errors='replace')
+        self.put(url, html, state)
+
+        return html
+
+    def clear(self):
+
+        with self.lock:
+            self.db.execute('DELETE FROM pages')
+            self.db.commit()
+
+    def __str__(self):
+
+        return 'PageCache({}, offline={}, hits={}, misses={}, stale={}, evicted={})'.format(
+            self.path, self.offline, self.stats['hits'], self.stats['misses'],
+            self.stats['stale'], self.stats['evicted'])
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+_disabled = False
+
+def default_cache():
+    '''
+    Gets the cache shared by every Equity, creating it on first use. Returns
+    None if caching has been turned off with use_cache(None).
+    '''
+
+    global _default_cache
+
+    with _default_lock:
+        if _default_cache is None and not _disabled:
+            _default_cache = PageCache()
+
+    return _default_cache
+
+def use_cache(cache):
+    '''
+    Sets the cache shared by every Equity.
+
+    Parameters
+    ----------
+    cache : PageCache
+        the cache to use, or None to turn caching off.
+
+    Returns
+    -------
+    None.
+
+    '''
+
+    global _default_cache, _disabled
+
+    with _default_lock:
+        _default_cache = cache
+        _disabled = cache is None
+
+@contextmanager
+def offline_mode(offline):
+    '''
+    Sets offline on the shared cache for the with block and puts back what 
+    it was after, so one offline run doesn't leave later ones offline.
+    Does nothing if caching is off.
+    '''
+
+    cache = default_cache()
+    if cache is None:
+        yield cache
+        return
+
+    previous = cache.offline
+    cache.offline = offline
+    try:
+        yield cache
+    finally:
+        cache.offline = previous
+
+def cached_fetch(url, load, state='', refresh=False):
+    '''
+    Fetches through the shared cache, or calls load() directly if caching is
+    off. See PageCache.fetch.
+    '''
+
+    cache = default_cache()
+    if cache is None:
+        return load()
+
+    return cache.fetch(url, load, state=state, refresh=refresh)
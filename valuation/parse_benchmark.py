@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 16:02:39 2026
+
+@author: David Billingsley
+"""
+
+'''
+Compares parse time and peak memory per page for the old approach (a full
+html.parser tree of every page) against the targeted approach set_data uses
+now (the fastest available parser, building only the parts of each page in
+Equity.PAGE_STRAINERS). Run it after a scrape so the page cache has pages
+in it, or pass your own html.
+'''
+import sys
+import tracemalloc
+from time import perf_counter
+import pandas as pd
+from valuation_utils import parse_page, PARSER
+from page_cache import PageCache, CACHE_DIR
+from valuation import Equity
+
+
+def page_name(url, state):
+    '''
+    Which of Equity.page_specs a cached url is, or None.
+    '''
+
+    if 'finance.yahoo.com' in url:
+        return 'yahoo_analysis' if '/analysis' in url else 'yahoo_quote'
+    if 'price-ratio' in url:
+        return 'morningstar_pe'
+    if 'balance-sheet' in url:
+        return 'morningstar_balance'
+    if 'ratios' in url:
+        return 'morningstar_ratio'
+
+    return None
+
+def measure(html, only=None, parser='html.parser', repeat=5):
+    '''
+    Best of repeat parse times and the peak memory of one parse.
+
+    Returns
+    -------
+    tuple
+        (seconds, peak bytes)
+
+    '''
+
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        parse_page(html, only, parser)
+        times.append(perf_counter() - start)
+
+    tracemalloc.start()
+    soup = parse_page(html, only, parser)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del soup
+
+    return min(times), peak
+
+def benchmark_pages(pages, repeat=5):
+    '''
+    Benchmarks full html.parser parsing against targeted parsing.
+
+    Parameters
+    ----------
+    pages : list
+        (page name, html) tuples, page names from Equity.page_specs.
+    repeat : int, optional
+        Parses per page, the best time is kept. The default is 5.
+
+    Returns
+    -------
+    DataFrame
+        per page: size, full and targeted parse time (ms) and peak memory
+        (MB), and the speedup.
+
+    '''
+
+    rows = []
+    for name, html in pages:
+        full_time, full_peak = measure(html, None, 'html.parser', repeat)
+        fast_time, fast_peak = measure(html, Equity.PAGE_STRAINERS.get(name), PARSER, repeat)
+        rows.append({'Page' : name,
+                     'Size (KB)' : len(html) / 1024,
+                     'Full (ms)' : full_time * 1e3,
+                     'Targeted (ms)' : fast_time * 1e3,
+                     'Speedup' : full_time / fast_time,
+                     'Full Peak (MB)' : full_peak / 1024**2,
+                     'Targeted Peak (MB)' : fast_peak / 1024**2})
+
+    return pd.DataFrame(rows)
+
+def cached_pages(path=CACHE_DIR, limit=50):
+    '''
+    Reads up to limit pages of each kind out of the page cache.
+    '''
+
+    cache = PageCache(path=path, offline=True)
+    counts = {}
+    pages = []
+    for url, state in cache.db.execute('SELECT url, state FROM pages').fetchall():
+        name = page_name(url, state)
+        if name is None or counts.get(name, 0) >= limit:
+            continue
+        counts[name] = counts.get(name, 0) + 1
+        pages.append((name, cache.get(url, state)))
+
+    return pages
+
+
+if __name__ == '__main__':
+
+    path = sys.argv[1] if len(sys.argv) > 1 else CACHE_DIR
+    results = benchmark_pages(cached_pages(path))
+    print('parser: ' + PARSER)
+    print(results.groupby('Page').mean(numeric_only=True).to_string())
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 20:12:37 2026
+
+@author: David Billingsley
+"""
+
+'''
+Collects valuation results for a basket in preallocated arrays, one row slot
+per ticker, instead of building a one-row DataFrame per ticker with
+Equity.out_all and pd.concat'ing thousands of them. The arrays grow by
+doubling, so adding a ticker is constant time, and one DataFrame is built at
+the end.
+
+    store = ResultStore(len(tickers))
+    for stock in stocks:
+        store.append(stock)
+    store.to_frame()
+
+ResultWriter does the same in batches of rows appended to a CSV file or a
+directory of Parquet parts, so a long run keeps bounded memory and what has
+been written survives a crash.
+'''
+import os
+import numpy as np
+from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+#columns of Equity.out_all, in order
+RESULT_COLUMNS = ['Price', 'Date', 'P/E Valuation', 'DCF Valuation', 'ROE Valuation',
+                  'P/E Value Return', 'DCF Value Return', 'ROE Value Return',
+                  'EPS', 'Growth Rate', 'Median Historical P/E', 'Cash and Cash Equivalents',
+                  'Total Liabilities', 'Free Cash Flow', 'Shares Outstanding', 'Dividend Per Share',
+                  'Return on Equity 5-yr', 'Shareholders Equity']
+
+NUMERIC_COLUMNS = [c for c in RESULT_COLUMNS if c != 'Date']
+
+
+class ResultStore():
+    '''
+    Columnar accumulator of valuation results. Every numeric column lives in
+    one float64 array of shape (capacity, columns), dates in a datetime64
+    array, and tickers in a list, so a row costs 8 bytes per column no
+    matter how many tickers there are.
+    '''
+
+    def __init__(self, capacity=1024, columns=NUMERIC_COLUMNS):
+        '''
+        Parameters
+        ----------
+        capacity : int, optional
+            Rows to preallocate. The store grows past it if needed. The
+            default is 1024.
+        columns : list, optional
+            Numeric columns to keep. The default is NUMERIC_COLUMNS.
+
+        '''
+
+        self.columns = list(columns)
+        self.positions = {c : i for i, c in enumerate(self.columns)}
+        self.values = np.full((max(capacity, 1), len(self.columns)), np.nan)
+        self.dates = np.full(max(capacity, 1), np.datetime64('NaT'), dtype='datetime64[D]')
+        self.tickers = []
+        self.slots = {}
+
+    def __len__(self):
+
+        return len(self.tickers)
+
+    def grow(self, capacity):
+
+        values = np.full((capacity, len(self.columns)), np.nan)
+        values[:len(self)] = self.values[:len(self)]
+        dates = np.full(capacity, np.datetime64('NaT'), dtype='datetime64[D]')
+        dates[:len(self)] = self.dates[:len(self)]
+        self.values, self.dates = values, dates
+
+    def slot(self, ticker):
+        '''
+        Allocates the next row for ticker and returns its position.
+        '''
+
+        row = len(self)
+        if row == len(self.values):
+            self.grow(2 * row)
+
+        self.tickers.append(ticker)
+        self.slots[ticker] = row
+
+        return row
+
+    def add(self, ticker, record, date=None):
+        '''
+        Writes one ticker's results into a new row.
+
+        Parameters
+        ----------
+        ticker : string
+
+        record : dict
+            column -> value. Columns the store doesn't keep are ignored and
+            values that aren't numbers are left as np.nan.
+        date : date, optional
+            Quote date. The default is None, which reads record['Date'].
+
+        Returns
+        -------
+        int
+            the row.
+
+        '''
+
+        row = self.slot(ticker)
+        positions = self.positions
+        values = self.values[row]
+        for key, value in record.items():
+            i = positions.get(key)
+            if i is not None:
+                try:
+                    values[i] = value
+                except (TypeError, ValueError):
+                    pass
+
+        if date is None:
+            date = record.get('Date')
+        #NaN and NaT aren't equal to themselves
+        if date is not None and date == date:
+            self.dates[row] = np.datetime64(date, 'D')
+
+        return row
+
+    def append(self, stock):
+        '''
+        Adds an Equity's quote, valuations, value returns and data.
+        '''
+
+        return self.add(stock.ticker, {**stock.quote, **stock.valuation,
+                                       **stock.value_returns, **stock.data})
+
+    def row(self, ticker):
+        '''
+        The latest results for ticker, as a dict.
+        '''
+
+        row = self.slots[ticker]
+        record = dict(zip(self.columns, self.values[row].tolist()))
+        record['Date'] = self.dates[row].astype(object)
+
+        return record
+
+    def nbytes(self):
+
+        return self.values.nbytes + self.dates.nbytes
+
+    def to_frame(self):
+        '''
+        Returns
+        -------
+        DataFrame
+            One row per ticker added, in order, with the columns of
+            Equity.out_all.
+
+        '''
+
+        n = len(self)
+        frame = pd.DataFrame(self.values[:n].copy(), index=pd.Index(self.tickers),
+                             columns=self.columns)
+        dates = self.dates[:n].astype(object)
+        frame.insert(min(1, frame.shape[1]), 'Date', np.where(pd.isna(dates), np.nan, dates))
+
+        return frame
+
+
+class ResultWriter():
+    '''
+    Appends valuation results to a file in batches of rows. A path ending in
+    .parquet is a directory of Parquet parts, one per batch; anything else is
+    a CSV file. Either way a batch is written whole, and read_results reads
+    everything written so far.
+
+        with ResultWriter('valuations.csv', batch_size=100) as writer:
+            for ticker, record in rows:
+                writer.add(ticker, record)
+    '''
+
+    def __init__(self, path, batch_size=100):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.batch_size = batch_size
+        self.store = ResultStore(batch_size)
+        self.written = 0
+
+    def add(self, ticker, record):
+        '''
+        Buffers one row, writing the batch once it is full.
+        '''
+
+        self.store.add(ticker, record)
+        if len(self.store) >= self.batch_size:
+            self.flush()
+
+    def append(self, stock):
+
+        self.add(stock.ticker, {**stock.quote, **stock.valuation,
+                                **stock.value_returns, **stock.data})
+
+    def flush(self):
+        '''
+        Writes the buffered rows.
+        '''
+
+        if not len(self.store):
+            return
+
+        frame = self.store.to_frame()
+        frame.index.name = 'Ticker'
+        frame = frame.reset_index()
+
+        if self.parquet:
+            os.makedirs(self.path, exist_ok=True)
+            parts = [name for name in os.listdir(self.path) if name.endswith('.parquet')]
+            part = os.path.join(self.path, 'part-{:06d}.parquet'.format(len(parts)))
+            #write then rename, so a crash never leaves half a part
+            frame.to_parquet(part + '.tmp', index=False)
+            os.replace(part + '.tmp', part)
+        else:
+            header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            text = frame.to_csv(index=False, header=header)
+            with open(self.path, 'a', encoding='utf-8', newline='') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+
+        self.written += len(frame)
+        self.store = ResultStore(self.batch_size)
+
+    def close(self):
+
+        self.flush()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        #keep whatever finished before an error
+        self.close()
+
+
+def read_results(path, columns=None):
+    '''
+    Reads results written by ResultWriter.
+
+    Parameters
+    ----------
+    path : string
+
+    columns : list, optional
+        Columns to read. The default is None, which reads them all.
+
+    Returns
+    -------
+    DataFrame
+        indexed by ticker, or empty if nothing has been written.
+
+    '''
+
+    usecols = None if columns is None else ['Ticker'] + [c for c in columns if c != 'Ticker']
+
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=usecols or ['Ticker'] + RESULT_COLUMNS).set_index('Ticker')
+
+    if path.endswith('.parquet'):
+        parts = sorted(os.path.join(path, name) for name in os.listdir(path)
+                       if name.endswith('.parquet'))
+        if not parts:
+            return pd.DataFrame(columns=usecols or ['Ticker'] + RESULT_COLUMNS).set_index('Ticker')
+        frame = pd.concat([pd.read_parquet(part, columns=usecols) for part in parts])
+    else:
+        frame = pd.read_csv(path, usecols=usecols)
+
+    frame = frame.set_index('Ticker')
+    frame.index.name = None
+
+    return frame
+
+def written_tickers(path):
+    '''
+    Tickers already in the output at path, for resuming a run.
+    '''
+
+    return set(read_results(path, columns=['Ticker']).index)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 14:25:18 2026
+
+@author: David Billingsley
+"""
+
+'''
+Sensitivity of the P/E, DCF and ROE valuations to the valuation parameters.
+Values every ticker in a basket over a full grid of margin of safety,
+discount rate, growth decay and year 10 multiplier, for margin of safety
+studies without re-running scripts per parameter.
+'''
+import numpy as np
+from lazy import lazy_import
+from batch_valuation import pe_values, dcf_values, roe_values, VALUATION_COLUMNS
+
+pd = lazy_import('pandas')
+
+DIMS = ['ticker', 'margin_of_safety', 'discount_rate', 'growth_decline',
+        'year_10_multiplier', 'method']
+
+#number of (ticker, parameter) points valued at once. The DCF method holds
+#about four temporaries of ten floats per point, so this bounds working
+#memory at roughly 64 * CHUNK bytes on top of the result.
+CHUNK = 2**18
+
+
+class Cube():
+    '''
+    Labeled N-dimensional array of valuations. values has one axis per name
+    in dims, and coords gives the labels along each axis.
+    '''
+
+    def __init__(self, values, coords, price):
+        self.values = values
+        self.coords = coords
+        self.dims = list(coords.keys())
+        self.price = price
+
+    @property
+    def shape(self):
+
+        return self.values.shape
+
+    def sel(self, **labels):
+        '''
+        Selects by label along any axes, e.g.
+        cube.sel(ticker='X', method='DCF Valuation', discount_rate=0.08).
+        Axes given a single label are dropped, axes given a list are kept.
+
+        Returns
+        -------
+        Cube
+
+
+        '''
+
+        values = self.values
+        coords = dict(self.coords)
+
+        #work backwards so dropping an axis doesn't shift the ones left to do
+        for axis in reversed(range(len(self.dims))):
+            dim = self.dims[axis]
+            if dim not in labels:
+                continue
+            axis_labels = list(self.coords[dim])
+            if np.ndim(labels[dim]) == 0:
+                values = np.take(values, axis_labels.index(labels[dim]), axis=axis)
+                del coords[dim]
+            else:
+                positions = [axis_labels.index(label) for label in labels[dim]]
+                values = np.take(values, positions, axis=axis)
+                coords[dim] = np.asarray(self.coords[dim])[positions]
+
+        price = self.price
+        if 'ticker' in labels:
+            tickers = list(self.coords['ticker'])
+            price = price[[tickers.index(t) for t in np.atleast_1d(labels['ticker'])]]
+
+        return Cube(values, coords, price)
+
+    def value_returns(self):
+        '''
+        The return if price converged to each value, as a Cube.
+        '''
+
+        price = self.price.reshape((-1,) + (1,) * (self.values.ndim - 1)) \
+            if 'ticker' in self.dims else self.price
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return Cube((self.values - price) / price, self.coords, self.price)
+
+    def to_series(self):
+        '''
+        Flattens the cube to a Series with a MultiIndex over dims.
+        '''
+
+        index = pd.MultiIndex.from_product([self.coords[dim] for dim in self.dims],
+                                           names=self.dims)
+
+        return pd.Series(np.asarray(self.values).ravel(), index=index)
+
+    def to_xarray(self):
+        '''
+        Converts to an xarray DataArray. Needs xarray installed.
+        '''
+
+        import xarray as xr
+
+        return xr.DataArray(self.values, coords=self.coords, dims=self.dims)
+
+    def __str__(self):
+
+        return 'Cube(' + ', '.join(dim + ': ' + str(n) for dim, n in zip(self.dims, self.shape)) + ')'
+
+
+def sensitivity(df, margin_of_safety, discount_rate, growth_decline,
+                year_10_multiplier, chunk=CHUNK, dtype=np.float64, path=None):
+    '''
+    Values every ticker in df at every combination of the parameter values.
+
+    Parameters
+    ----------
+    df : DataFrame
+        One row per ticker with the columns from Equity.out_all.
+    margin_of_safety : float or list
+        Margin of safety values to try.
+    discount_rate : float or list
+        Discount rate values to try.
+    growth_decline : float or list
+        Growth decay values to try.
+    year_10_multiplier : float or list
+        Year 10 multiplier values to try.
+    chunk : int, optional
+        Number of (ticker, parameter) points valued at once. The default is
+        CHUNK.
+    dtype : numpy dtype, optional
+        dtype of the result. np.float32 halves its size. The default is
+        np.float64.
+    path : string, optional
+        If given, the result is written to a .npy file at path and memory
+        mapped instead of held in memory. The default is None.
+
+    Returns
+    -------
+    Cube
+        valuations with axes ticker x margin_of_safety x discount_rate x
+        growth_decline x year_10_multiplier x method.
+
+    '''
+
+    grid = [np.atleast_1d(np.asarray(x, dtype=float)) for x in
+            [margin_of_safety, discount_rate, growth_decline, year_10_multiplier]]
+    shape = tuple(len(g) for g in grid)
+    n_points = int(np.prod(shape))
+    n_tickers = len(df)
+
+    out_shape = (n_tickers,) + shape + (len(VALUATION_COLUMNS),)
+    if path is None:
+        values = np.empty(out_shape, dtype=dtype)
+    else:
+        values = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=out_shape)
+    flat = values.reshape(n_tickers, n_points, len(VALUATION_COLUMNS))
+
+    col = lambda name: df[name].to_numpy(dtype=float)[:, None]
+    eps, growth, pe = col('EPS'), col('Growth Rate'), col('Median Historical P/E')
+    fcf, cash = col('Free Cash Flow'), col('Cash and Cash Equivalents')
+    liabilities, shares = col('Total Liabilities'), col('Shares Outstanding')
+    equity, roe = col('Shareholders Equity'), col('Return on Equity 5-yr')
+    dividend = col('Dividend Per Share')
+
+    #value a block of parameter combinations for every ticker at a time,
+    #broadcasting tickers down the rows and parameters across the columns.
+    block = max(1, chunk // max(n_tickers, 1))
+    for start in range(0, n_points, block):
+        stop = min(start + block, n_points)
+        idx = np.unravel_index(np.arange(start, stop), shape)
+        mos, dr, gd, y10 = [g[i][None, :] for g, i in zip(grid, idx)]
+
+        flat[:, start:stop, 0] = pe_values(eps, growth, pe, mos, dr)
+        flat[:, start:stop, 1] = dcf_values(fcf, cash, liabilities, shares, growth,
+                                            mos, dr, gd, y10)
+        flat[:, start:stop, 2] = roe_values(equity, shares, roe, dividend, growth,
+                                            mos, dr)
+
+    coords = dict(zip(DIMS, [np.asarray(df.index)] + grid + [np.asarray(VALUATION_COLUMNS)]))
+
+    return Cube(values, coords, df['Price'].to_numpy(dtype=float))
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 17:31:20 2026
+
+@author: David Billingsley
+"""
+
+'''
+A local stand-in for Yahoo Finance and Morningstar that serves recorded
+pages, so the scraping pipeline can be benchmarked repeatably with no
+network. Latency, jitter and error rates are configurable.
+
+Record pages from a real run with record_from_cache, or make synthetic ones
+with synthetic_fixtures, then:
+
+    with StandIn(load_fixtures(), latency=0.3, jitter=0.1, error_rate=0.02):
+        evaluate_tickers(tickers, workers=8)
+'''
+import os
+import gzip
+import random
+import threading
+import numpy as np
+from time import sleep
+from urllib.parse import urlparse, quote, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from valuation_utils import set_source, restore_source
+from page_cache import PageCache
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+#live host -> source name, see valuation_utils.SOURCES
+HOSTS = {
+    'finance.yahoo.com' : 'yahoo',
+    'financials.morningstar.com' : 'morningstar'
+    }
+
+
+def fixture_key(url):
+    '''
+    Path the stand-in serves a live url under, e.g.
+    https://finance.yahoo.com/quote/X -> /yahoo/quote/X
+    '''
+
+    parts = urlparse(url)
+    key = '/' + HOSTS[parts.netloc] + parts.path
+
+    return key + '?' + parts.query if parts.query else key
+
+def save_fixtures(fixtures, path=FIXTURE_DIR):
+    '''
+    Writes fixtures (key -> html) to path, one gzipped file per page.
+    '''
+
+    os.makedirs(path, exist_ok=True)
+    for key, html in fixtures.items():
+        with gzip.open(os.path.join(path, quote(key, safe='') + '.html.gz'), 'wt',
+                       encoding='utf-8') as f:
+            f.write(html)
+
+def load_fixtures(path=FIXTURE_DIR):
+    '''
+    Reads fixtures written by save_fixtures.
+
+    Returns
+    -------
+    dict
+        key -> html
+
+    '''
+
+    fixtures = {}
+    for name in os.listdir(path):
+        if name.endswith('.html.gz'):
+            with gzip.open(os.path.join(path, name), 'rt', encoding='utf-8') as f:
+                fixtures[unquote(name[:-len('.html.gz')])] = f.read()
+
+    return fixtures
+
+def record_from_cache(cache=None, path=FIXTURE_DIR):
+    '''
+    Records every live page in the page cache as a fixture. Where a page was
+    cached in more than one state, the rendered one (e.g. 'quarterly') wins.
+
+    Returns
+    -------
+    dict
+        the recorded fixtures
+
+    '''
+
+    if cache is None:
+        cache = PageCache(offline=True)
+
+    fixtures = {}
+    rows = cache.db.execute('SELECT url, state FROM pages ORDER BY state').fetchall()
+    for url, state in rows:
+        if urlparse(url).netloc in HOSTS:
+            fixtures[fixture_key(url)] = cache.get(url, state)
+
+    save_fixtures(fixtures, path)
+
+    return fixtures
+
+def synthetic_fixtures(tickers, seed=0, padding=200):
+    '''
+    Makes synthetic pages for tickers, with the same structure the field
+    setters read from the live pages, for when nothing has been recorded.
+
+    Parameters
+    ----------
+    tickers : list
+
+    seed : int, optional
+        The default is 0.
+    padding : int, optional
+        KB of filler markup per page, to make pages about as big as the real
+        ones. The default is 200.
+
+    Returns
+    -------
+    dict
+        key -> html
+
+    '''
+
+    rng = np.random.default_rng(seed)
+    filler = ''.join('<div class="f{0}"><p>lorem ipsum <a href="#{0}">{0}</a></p>'
+                     '<ul><li>a</li><li>b</li></ul></div>'.format(i)
+                     for i in range(padding * 1024 // 80))
+    page = lambda body: '<html><body>' + filler + body + filler + '</body></html>'
+
+    fixtures = {}
+    for ticker in tickers:
+        ticker = ticker.upper()
+        eps = rng.normal(3, 2)
+        price = abs(eps) * rng.uniform(8, 30)
+        fixtures['/yahoo/quote/' + ticker] = page(
+            '<table><tr><td>EPS (TTM)</td><td data-test="EPS_RATIO-value"><span>{:.2f}</span></td></tr></table>'
+            '<span class="Trsdu(0.3s) Fw(b) Fz(36px) Mb(-4px) D(ib)">{:,.2f}</span>'.format(eps, price))
+        fixtures['/yahoo/quote/' + ticker + '/analysis?p=' + ticker] = page(
+            '<table><tr><td><span>Next 5 Years (per annum)</span></td><td>{:.2f}%</td></tr></table>'
+            .format(rng.uniform(-5, 30)))
+
+        pe = ''.join('<td>{:.1f}</td>'.format(x) for x in rng.uniform(8, 40, 10)) + '<td>—</td>'
+        fixtures['/morningstar/valuation/price-ratio.html?t=' + ticker] = page(
+            '<table><tr><th abbr="Price/Earnings for {}">Price/Earnings</th>{}</tr></table>'.format(ticker, pe))
+
+        balance = ''.join(
+            '<div id="{}">{}</div>'.format(row, ''.join(
+                '<div id="Y_{}" rawvalue="{:.0f}">x</div>'.format(y, v)
+                for y, v in zip(range(1, 6), rng.uniform(1e8, 1e10, 5))))
+            for row in ['data_i1', 'data_i2', 'data_ttg5', 'data_ttg8'])
+        fixtures['/morningstar/balance-sheet/bs.html?t=' + ticker] = page(balance)
+
+        header = '<tr>' + ''.join('<th id="Y{}">{}</th>'.format(y, 2012 + y if y < 10 else 'TTM')
+                                  for y in range(11)) + '</tr>'
+        ratios = ''.join(
+            '<tr><th id="{0}">{0}</th>{1}</tr>'.format(row, ''.join(
+                '<td headers="Y{} {}">{:,.2f}</td>'.format(y, row, v)
+                for y, v in zip(range(11), rng.uniform(lo, hi, 11))))
+            for row, lo, hi in [('i6', 0, 3), ('i7', 50, 5000), ('i11', -500, 5000), ('i26', -5, 40)])
+        fixtures['/morningstar/ratios/r.html?t=' + ticker] = page('<table>' + header + ratios + '</table>')
+
+    return fixtures
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+
+        standin = self.server.standin
+
+        if self.path == '/robots.txt':
+            self.send_error(404)
+            return
+
+        standin.delay()
+
+        if standin.fail():
+            standin.count('errors')
+            self.send_error(503)
+            return
+
+        html = standin.fixtures.get(self.path)
+        if html is None:
+            standin.count('not_found')
+            self.send_error(404)
+            return
+
+        standin.count('served')
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+
+        pass
+
+
+class StandIn():
+    '''
+    Local HTTP server standing in for Yahoo and Morningstar. While running
+    (or inside a with block), url_yahoo and url_morningstar point at it and
+    Morningstar pages are fetched without selenium, since the recorded pages
+    are already rendered.
+    '''
+
+    def __init__(self, fixtures, latency=0.0, jitter=0.0, error_rate=0.0,
+                 seed=None, host='127.0.0.1', port=0):
+        '''
+        Parameters
+        ----------
+        fixtures : dict
+            key -> html, from load_fixtures or synthetic_fixtures.
+        latency : float, optional
+            Seconds to wait before answering. The default is 0.0.
+        jitter : float, optional
+            Latency varies uniformly by +/- jitter seconds. The default is 0.0.
+        error_rate : float, optional
+            Fraction of requests answered with a 503. The default is 0.0.
+        seed : int, optional
+            Seed for jitter and errors. The default is None.
+        host : string, optional
+            The default is '127.0.0.1'.
+        port : int, optional
+            The default is 0, which picks a free port.
+
+        '''
+
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'served' : 0, 'errors' : 0, 'not_found' : 0}
+        self.address = (host, port)
+        self.server = None
+        self.previous = {}
+
+    @property
+    def url(self):
+
+        host, port = self.server.server_address[:2]
+
+        return 'http://{}:{}/'.format(host, port)
+
+    def delay(self):
+
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter, self.jitter)
+        sleep(max(0.0, self.latency + jitter))
+
+    def fail(self):
+
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def count(self, key):
+
+        with self.lock:
+            self.stats[key] += 1
+
+    def start(self):
+        '''
+        Starts serving in a background thread and points the sources at it.
+        '''
+
+        self.server = ThreadingHTTPServer(self.address, StandInHandler)
+        self.server.daemon_threads = True
+        self.server.standin = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        for name in HOSTS.values():
+            self.previous[name] = set_source(name, self.url + name + '/', render=False)
+
+        return self
+
+    def stop(self):
+        '''
+        Stops serving and points the sources back where they were.
+        '''
+
+        for name, previous in self.previous.items():
+            restore_source(name, previous)
+        self.previous = {}
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+
+        return self.start()
+
+    def __exit__(self, *args):
+
+        self.stop()
+
+    def __str__(self):
+
+        return 'StandIn(latency={}, jitter={}, error_rate={}, served={}, errors={}, not_found={})'.format(
+            self.latency, self.jitter, self.error_rate, self.stats['served'],
+            self.stats['errors'], self.stats['not_found'])
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 19:05:12 2026
+
+@author: David Billingsley
+"""
+
+'''
+Lightweight tracing in place of print statements. Code is wrapped in spans
+(per ticker, field, fetch, parse, valuation method, ...) that record how
+long they took, and progress messages go through log(). Both are handed to
+sinks: printing is one sink, writing JSON lines is another. The last
+MAX_SPANS finished spans are also kept in memory for summary().
+
+Nothing is printed unless PRINTING is set or printing is turned on, and for
+a full market run, where the spans kept in memory are only the most recent,
+everything can be streamed to a file instead:
+
+    TRACER.set_printing(True)
+    TRACER.add_sink(JsonLinesSink('trace.jsonl'))
+
+    with span('fetch', page='yahoo_quote'):
+        ...
+    log('getting EPS TTM')
+    summary()       #p50 / p95 latency by stage, over the recent spans
+'''
+import os
+import json
+import threading
+from time import perf_counter, time
+from collections import deque
+from contextlib import contextmanager
+
+#most recent spans kept in memory for summary(). Older ones are dropped, so
+#stream to a JsonLinesSink to keep them all.
+MAX_SPANS = 10000
+
+#print log messages. Off by default, turn on with TRACER.set_printing(True)
+#or TRACE_PRINT=1 in the environment.
+PRINTING = os.environ.get('TRACE_PRINT', '0') not in ('', '0')
+
+
+class PrintSink():
+    '''
+    Prints log messages, the way the scripts used to.
+    '''
+
+    def message(self, record):
+
+        print(record['message'])
+
+    def span(self, record):
+
+        pass
+
+
+class JsonLinesSink():
+    '''
+    Appends every finished span and log message to a JSON lines file.
+    '''
+
+    def __init__(self, path, messages=True):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.messages = messages
+        self.lock = threading.Lock()
+
+    def write(self, record):
+
+        line = json.dumps(record, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def message(self, record):
+
+        if self.messages:
+            self.write(record)
+
+    def span(self, record):
+
+        self.write(record)
+
+    def close(self):
+
+        with self.lock:
+            self.file.close()
+
+
+class Tracer():
+
+    def __init__(self, max_spans=MAX_SPANS, printing=PRINTING):
+        self.spans = deque(maxlen=max_spans)
+        self.sinks = [PrintSink()] if printing else []
+        self.local = threading.local()
+
+    def stack(self):
+
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+
+        return self.local.stack
+
+    @contextmanager
+    def span(self, stage, **tags):
+        '''
+        Times the with block as a span of the given stage. Tags (ticker,
+        field, url, ...) are inherited from enclosing spans on the same
+        thread.
+        '''
+
+        stack = self.stack()
+        if stack:
+            tags = {**stack[-1]['tags'], **tags}
+        record = {'type' : 'span', 'stage' : stage, 'tags' : tags,
+                  'parent' : stack[-1]['stage'] if stack else None,
+                  'start' : time(), 'error' : None}
+        stack.append(record)
+
+        start = perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = type(e).__name__
+            raise
+        finally:
+            record['seconds'] = perf_counter() - start
+            stack.pop()
+            self.spans.append(record)
+            for sink in self.sinks:
+                sink.span(record)
+
+    def log(self, message, **tags):
+        '''
+        Sends a progress message to the sinks, tagged with the enclosing
+        span.
+        '''
+
+        if not self.sinks:
+            return
+
+        stack = self.stack()
+        record = {'type' : 'message', 'message' : str(message), 'time' : time(),
+                  'stage' : stack[-1]['stage'] if stack else None,
+                  'tags' : {**stack[-1]['tags'], **tags} if stack else tags}
+        for sink in self.sinks:
+            sink.message(record)
+
+    def add_sink(self, sink):
+
+        self.sinks.append(sink)
+
+        return sink
+
+    def remove_sink(self, sink):
+
+        self.sinks.remove(sink)
+        if hasattr(sink, 'close'):
+            sink.close()
+
+    def set_printing(self, on):
+        '''
+        Turns the print sink on or off.
+        '''
+
+        self.sinks = [s for s in self.sinks if not isinstance(s, PrintSink)]
+        if on:
+            self.sinks.insert(0, PrintSink())
+
+    def export(self, path):
+        '''
+        Writes the spans kept in memory, the last MAX_SPANS, to a JSON lines
+        file.
+        '''
+
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in list(self.spans):
+                f.write(json.dumps(record, default=str) + '\n')
+
+    def summary(self, by='stage'):
+        '''
+        Latency by stage, over the spans kept in memory.
+
+        Parameters
+        ----------
+        by : string or list, optional
+            'stage', or a list like ['stage', 'page'] to also group by tags.
+            The default is 'stage'.
+
+        Returns
+        -------
+        DataFrame
+            count, errors, total, mean, p50, p95 and max seconds.
+
+        '''
+
+        import pandas as pd
+
+        by = [by] if isinstance(by, str) else list(by)
+        frame = pd.DataFrame([{'stage' : r['stage'], 'seconds' : r['seconds'],
+                               'error' : r['error'] is not None, **r['tags']}
+                              for r in list(self.spans)])
+        if frame.empty:
+            return frame
+
+        grouped = frame.groupby(by)
+        seconds = grouped['seconds']
+
+        return pd.DataFrame({'count' : seconds.count(),
+                             'errors' : grouped['error'].sum(),
+                             'total' : seconds.sum(),
+                             'mean' : seconds.mean(),
+                             'p50' : seconds.quantile(0.5),
+                             'p95' : seconds.quantile(0.95),
+                             'max' : seconds.max()}).sort_values('total', ascending=False)
+
+    def clear(self):
+
+        self.spans.clear()
+
+
+TRACER = Tracer()
+
+span = TRACER.span
+log = TRACER.log
+summary = TRACER.summary
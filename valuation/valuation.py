@@ -5,19 +5,31 @@ Created on Thu May 27 23:28:46 2021
 @author: David Billingsley
 """
 
-import mechanize
-from bs4 import BeautifulSoup
 import numpy as np
-from selenium import webdriver
 import warnings
 from time import sleep
 from datetime import date
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from valuation_utils import *
-from test_utils import *
+from lazy import lazy_import
+from tracing import log, span
+from driver_pool import DriverPool, default_pool
+from page_cache import cached_fetch, offline_mode
+from morningstar_tables import balance_table, ratio_table, latest, BALANCE_ROW
+from result_store import ResultStore, ResultWriter, RESULT_COLUMNS, read_results, written_tickers
+from fundamentals_store import FundamentalsStore, default_store
+from batch_valuation import value_frame, VALUATION_COLUMNS, RETURN_COLUMNS
 
-import tqdm
 import re
-import pandas as pd
+import os
+import shutil
+
+#selenium, mechanize, BeautifulSoup and pandas are only imported once 
+#something uses them, see lazy.py
+pd = lazy_import('pandas')
+mechanize = lazy_import('mechanize')
+EC = lazy_import('selenium.webdriver.support.expected_conditions')
 
 
 class Equity():
@@ -32,22 +44,68 @@ class Equity():
     DISCOUNT_RATE = 0.08
     GROWTH_DECAY_RATE = 0.05
     Y10_MULTIPLIER = 12
-    PARSER = 'html.parser'
+    PARSER = PARSER
+    
+    #page each field is read from, see page_specs
+    FIELD_PAGES = {
+        'EPS' : 'yahoo_quote',
+        'Price' : 'yahoo_quote',
+        'Growth Rate' : 'yahoo_analysis',
+        'Median Historical P/E' : 'morningstar_pe',
+        'Cash and Cash Equivalents' : 'morningstar_balance',
+        'Total Liabilities' : 'morningstar_balance',
+        'Shareholders Equity' : 'morningstar_balance',
+        'Free Cash Flow' : 'morningstar_ratio',
+        'Shares Outstanding' : 'morningstar_ratio',
+        'Dividend Per Share' : 'morningstar_ratio',
+        'Return on Equity 5-yr' : 'morningstar_ratio'
+        }
+    
+    #parts of each page the field setters read, as SoupStrainer arguments. 
+    #Only these are built when the page is parsed.
+    PAGE_STRAINERS = {
+        'yahoo_quote' : {'name' : ['td', 'span']},
+        'yahoo_analysis' : {'name' : 'tr'},
+        'morningstar_pe' : {'name' : 'tr'},
+        'morningstar_balance' : {'id' : BALANCE_ROW},
+        'morningstar_ratio' : {'name' : 'tr'}
+        }
+    
+    #method that reads each field from its parsed page
+    FIELD_SETTERS = {
+        'EPS' : 'set_eps',
+        'Price' : 'set_price',
+        'Growth Rate' : 'set_growth_rate',
+        'Median Historical P/E' : 'set_median_pe',
+        'Cash and Cash Equivalents' : 'set_cash',
+        'Total Liabilities' : 'set_total_liabilities',
+        'Shareholders Equity' : 'set_shareholders_equity',
+        'Free Cash Flow' : 'set_free_cash_flow',
+        'Shares Outstanding' : 'set_shares_outstanding',
+        'Dividend Per Share' : 'set_dividend',
+        'Return on Equity 5-yr' : 'set_roe'
+        }
+    
+    DATA_LOOKUPS = (
+        'EPS',
+        'Median Historical PE',
+        'Growth Rate',
+        'Cash and Equivalents',
+        'Total Liabilities',
+        'Free Cash Flow',
+        'Shares Outstanding',
+        'Shareholder\'s Equity',
+        'Return on Equity 5-yr',
+        'Dividend per share'
+        )
+    
+    #no per-instance __dict__, a basket can hold thousands of these
+    __slots__ = ('ticker', 'data_lookups', 'data', 'valuation', 'raw_data', 
+                 'quote', 'date', 'value_returns', 'eps_str', 'unloaded')
    
     def __init__(self, ticker):
         self.ticker = ticker.upper()
-        self.data_lookups = [
-            'EPS',
-            'Median Historical PE',
-            'Growth Rate',
-            'Cash and Equivalents',
-            'Total Liabilities',
-            'Free Cash Flow',
-            'Shares Outstanding',
-            'Shareholder\'s Equity',
-            'Return on Equity 5-yr',
-            'Dividend per share'
-            ]
+        self.data_lookups = self.DATA_LOOKUPS
         
         self.data = {}
         self.valuation = {}
@@ -55,6 +113,8 @@ class Equity():
         self.quote = {}
         self.date = date.today()
         self.value_returns = {}
+        #pages the last set_data could not load
+        self.unloaded = set()
              
     def __str__(self):
         '''
@@ -126,214 +186,514 @@ class Equity():
 
         '''
         
+        return pd.DataFrame(self.record(), index=[self.ticker])
+    
+    def record(self):
+        '''
+        All data as one row.
+
+        Returns
+        -------
+        dict
+            column -> value for the columns of out_all, in order, np.nan 
+            where missing.
+
+        '''
+        
         all_data = {**self.quote, **self.valuation, **self.value_returns, **self.data}
-        #reorder the columns
-        columns = ['Price', 'Date', 'P/E Valuation', 'DCF Valuation', 'ROE Valuation', 
-                   'P/E Value Return', 'DCF Value Return', 'ROE Value Return', 
-                   'EPS', 'Growth Rate', 'Median Historical P/E', 'Cash and Cash Equivalents',
-                   'Total Liabilities', 'Free Cash Flow', 'Shares Outstanding', 'Dividend Per Share',
-                   'Return on Equity 5-yr']
         
-        return pd.DataFrame(all_data, index=[self.ticker]).reindex(columns=columns)
+        return {column : all_data.get(column, np.nan) for column in RESULT_COLUMNS}
         
 
 
-    def set_data(self):
+    def set_data(self, fields=None, pool=None, refresh=False):
         '''
         Pull data from Morningstar and Yahoo Finance to fill in financial data
-        associated with equity.
+        associated with equity. Each page the requested fields need is 
+        downloaded and parsed once, then every field is read from it.
+
+        Parameters
+        ----------
+        fields : list, optional
+            Fields to set, from FIELD_PAGES. The default is None, which sets 
+            all of them.
+        pool : DriverPool, optional
+            Pool to check a selenium driver out of. The default is None, which 
+            uses the pool shared by all Equity objects for the run.
+        refresh : boolean, optional
+            Fetch the pages again even if they are in the page cache. The 
+            default is False.
 
         Returns
         -------
         None.
 
         '''
-        print('evaluating ' + self.ticker)        
+        log('evaluating ' + self.ticker)
+        
+        if fields is None:
+            fields = list(self.FIELD_PAGES.keys())
+        
+        #borrow a headless selenium driver from the pool for the Morningstar
+        #pages. It is only checked out if a page isn't in the cache, and goes 
+        #back to the pool (or is recycled) when we're done.
+        if pool is None:
+            pool = default_pool()
+        
+        with pool.driver() as driver:
+            soups = self.fetch_pages(self.plan_pages(fields), driver, refresh)
+        self.unloaded = {page for page, soup in soups.items() if soup is None}
+        
+        #tables parsed from a previous scrape are out of date
+        self.raw_data.clear()
+        
+        for field in fields:
+            with span('field', field=field):
+                getattr(self, self.FIELD_SETTERS[field])(soups[self.FIELD_PAGES[field]])
+        
+        return self.data
+    
+    def field_value(self, field):
+        '''
+        The value set for field, or np.nan if it hasn't been set.
+        '''
+        
+        values = self.quote if field == 'Price' else self.data
+        
+        return values.get(field, np.nan)
+    
+    def loaded_fields(self, fields):
+        '''
+        Fields whose page the last set_data loaded, so a np.nan there means
+        the page has no value for it rather than that the fetch failed.
+        '''
+        
+        return [field for field in fields if self.FIELD_PAGES[field] not in self.unloaded]
+    
+    def missing_fields(self, fields=None):
+        '''
+        Fields that haven't been set or came back as np.nan.
+
+        Parameters
+        ----------
+        fields : list, optional
+            Fields to check. The default is None, which checks all of 
+            FIELD_PAGES.
+
+        Returns
+        -------
+        list
+
+        '''
+        
+        if fields is None:
+            fields = list(self.FIELD_PAGES.keys())
+        
+        return [field for field in fields if not np.isfinite(self.field_value(field))]
+    
+    def retry_fields(self, fields=None, pool=None, attempts=RETRY_ATTEMPTS, 
+                     backoff=RETRY_BACKOFF, first=1):
+        '''
+        Fetches missing fields again, and only those, until they are all set 
+        or attempts run out. Each retry skips the page cache and waits 
+        longer than the one before.
+
+        Parameters
+        ----------
+        fields : list, optional
+            Fields to retry if missing. The default is None, which is all of 
+            FIELD_PAGES.
+        pool : DriverPool, optional
+            The default is None, which uses the shared pool.
+        attempts : int, optional
+            The default is RETRY_ATTEMPTS.
+        backoff : float, optional
+            Seconds before the first retry, doubling after. The default is 
+            RETRY_BACKOFF.
+        first : int, optional
+            Number of the first attempt, for retry_delay. The default is 1, 
+            which waits before it; 0 starts right away.
+
+        Returns
+        -------
+        list
+            fields still missing.
+
+        '''
+        
+        missing = self.missing_fields(fields)
+        
+        for attempt in range(first, first + attempts):
+            if not missing:
+                break
+            sleep(retry_delay(attempt, backoff))
+            with span('retry', attempt=attempt):
+                log('retrying ' + ', '.join(missing) + ' for ' + self.ticker)
+                self.set_data(fields=missing, pool=pool, refresh=True)
+            missing = self.missing_fields(missing)
+        
+        return missing
+    
+    def plan_pages(self, fields):
+        '''
+        Gives the unique pages needed to set fields, in fetch order.
+
+        Parameters
+        ----------
+        fields : list
+            Fields from FIELD_PAGES.
+
+        Returns
+        -------
+        list
+            page names, keys of page_specs().
+
+        '''
+        
+        pages = []
+        for field in fields:
+            page = self.FIELD_PAGES[field]
+            if page not in pages:
+                pages.append(page)
+        
+        return pages
+    
+    def page_specs(self, driver=None):
+        '''
+        Url, page state and loader for each page the scrape uses. Yahoo pages
+        are plain downloads; Morningstar pages have to be rendered by selenium
+        unless the source serves them pre-rendered (see set_source).
+
+        Returns
+        -------
+        dict
+            page name -> (url, state, load) where load() returns the html.
+
+        '''
         
-        #Use mechanize and BeautifulSoup to parse YahooFinance pages for data
         mech = mechanize.Browser()
+        mech_load = lambda url: (lambda: mech_read(mech, url))
+        
+        pe_url = url_morningstar(self.ticker, 'valuation/price-ratio.html?t=')
+        balance_url = url_morningstar(self.ticker, 'balance-sheet/bs.html?t=')
+        ratio_url = url_morningstar(self.ticker, 'ratios/r.html?t=')
+        quote_url = url_yahoo(self.ticker)
+        analysis_url = url_yahoo(self.ticker, page = '/analysis?p=')
+        
+        if SOURCES['morningstar']['render']:
+            pe_load = lambda: self.load_pe_page(driver, pe_url)
+            balance_load = lambda: self.load_balance_page(driver, balance_url)
+            ratio_load = lambda: self.load_ratio_page(driver, ratio_url)
+        else:
+            pe_load, balance_load, ratio_load = [mech_load(url) for url in 
+                                                 [pe_url, balance_url, ratio_url]]
+        
+        return {
+            'yahoo_quote' : (quote_url, '', mech_load(quote_url)),
+            'yahoo_analysis' : (analysis_url, '', mech_load(analysis_url)),
+            'morningstar_pe' : (pe_url, 'price_earnings', pe_load),
+            'morningstar_balance' : (balance_url, 'quarterly', balance_load),
+            'morningstar_ratio' : (ratio_url, '', ratio_load)
+            }
+    
+    def fetch_pages(self, pages, driver=None, refresh=False):
+        '''
+        Downloads (or reads from the page cache) and parses each page once.
+
+        Parameters
+        ----------
+        pages : list
+            page names from plan_pages
+        driver : WebDriver, optional
+            Driver for the Morningstar pages. The default is None.
+        refresh : boolean, optional
+            Skip the page cache. The default is False.
+
+        Returns
+        -------
+        dict
+            page name -> BeautifulSoup object, or None if the page could not
+            be loaded.
+
+        '''
+        
+        specs = self.page_specs(driver)
+        soups = {}
+        
+        for page in pages:
+            url, state, load = specs[page]
+            with span('page', page=page):
+                soups[page] = self.page_soup(url, state, load, self.PAGE_STRAINERS.get(page),
+                                             refresh)
+        
+        return soups
+    
+    def set_eps(self, quote_soup):
         
         #Get EPS TTM
-        print('getting EPS TTM')
+        log('getting EPS TTM')
         try:
-            self.eps_str = soup_(mech, url_yahoo(self.ticker)).find(attrs={'data-test' : 'EPS_RATIO-value'}).contents[0].text
+            self.eps_str = quote_soup.find(attrs={'data-test' : 'EPS_RATIO-value'}).contents[0].text
         except AttributeError:
-            print('Could not find EPS at ' + url_yahoo(self.ticker) + '. Maybe a bad url or non-existent stock?')
-            self.eps_str = 0
+            log('Could not find EPS at ' + url_yahoo(self.ticker) + '. Maybe a bad url or non-existent stock?')
+            self.eps_str = None
         except Exception as e:
-            print(e)
-            self.eps_str=0
+            log(e)
+            self.eps_str = None
         
-        float_convert_set(self, 'EPS', self.eps_str)    
+        float_convert_set(self, 'EPS', self.eps_str)
+    
+    def set_price(self, quote_soup):
         
         #get price
-        print('getting current price')
+        log('getting current price')
         try:
-            price = soup_(mech, url_yahoo(self.ticker))\
-                .find(class_="Trsdu(0.3s) Fw(b) Fz(36px) Mb(-4px) D(ib)").text
+            price = quote_soup.find(class_="Trsdu(0.3s) Fw(b) Fz(36px) Mb(-4px) D(ib)").text
         except Exception as e:
-            price = 0
+            price = None
         self.quote['Price'] = float_convert(price)
         self.quote['Date'] = date.today()
+    
+    def set_growth_rate(self, analysis_soup):
         
         #get Projected Growth Rate
-        print('getting growth rate') 
+        log('getting growth rate') 
         try:
-            growth_rate_str = soup_(mech, 
-                                    url_yahoo(self.ticker, page = '/analysis?p='))\
+            growth_rate_str = analysis_soup\
                 .find('span', text = 'Next 5 Years (per annum)').parent.\
                     next_sibling.text.strip('%')
             float_convert_set(self,'Growth Rate', growth_rate_str, factor = 0.01)
         except:
-            print('could not get growth rate')
+            log('could not get growth rate')
             self.data['Growth Rate'] = np.nan
+    
+    def set_median_pe(self, pe_soup):
         
         #calculate median historical p/e
         attrs = {'abbr':'Price/Earnings for ' + self.ticker}
         
-        #open a headless selenium driver, load historical pe ratios, and 
-        #make BeautifulSoup object to parse
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')
-        driver = webdriver.Chrome(options = options)
-
-        #driver should wait 10 seconds to try and load data.
-        driver.implicitly_wait(10)
-        
-        driver.get(url_morningstar(self.ticker, 'valuation/price-ratio.html?t='))
-        
         try:
-            #see if the price_earnings tab is there and click on it,
-            #or timeout after 10 secs
-            print('getting historical p/e ratio')
-            element = driver.find_element_by_id('price_earnings')
-            element.click()
-            sleep(5)
-            
-            pe_soup = BeautifulSoup(driver.page_source, 'html.parser')
-            
+            log('getting historical p/e ratio')
             pe_ratio_strs = [child.text for child in pe_soup.find(attrs=attrs).parent.children if getattr(child, 'name', None) == 'td']
-            print(pe_ratio_strs)
+            log(pe_ratio_strs)
             #don't include last value as it is TTM
             pe_ratio_strs_no_ttm = pe_ratio_strs[:-1]
     
-            pe_ratios = [check_float(num) for num in pe_ratio_strs_no_ttm if check_float(num)]
+            pe_ratios = [num for num in map(check_float, pe_ratio_strs_no_ttm) if num]
             #last 5 non-empty values.
             median_hist_pe_5yr = np.median(pe_ratios[-5:]) if len(pe_ratios) >= 5 else np.median(pe_ratios)
         
             self.data['Median Historical P/E'] = median_hist_pe_5yr
             
         except Exception as e:
-            print("An error ocurred getting median historical P/E")
-            print(e)
+            log("An error ocurred getting median historical P/E")
+            log(e)
             self.data['Median Historical P/E'] = np.nan
-            
+    
+    def balance_sheet(self, balance_soup):
+        '''
+        The quarterly balance sheet as a DataFrame of periods by line item,
+        parsed once per scrape and kept in raw_data.
+        '''
         
-        #cash and cash equivalents
-        print('loading balance sheet at ' + url_morningstar('balance-sheet/bs.html?t='))
-        driver.get(url_morningstar(self.ticker, 'balance-sheet/bs.html?t='))
+        if 'Balance Sheet' not in self.raw_data:
+            self.raw_data['Balance Sheet'] = balance_table(balance_soup)
         
-        #change to quarterly and wait 5 seconds for page to update.
-        print('updating page to quarterly')
-        script = 'javascript:SRT_stocFund.ChangeFreq(3,\'Quarterly\');'
-        driver.execute_script(script)
-        sleep(5)
+        return self.raw_data['Balance Sheet']
+    
+    def key_ratios(self, ratio_soup):
+        '''
+        The key ratios as a DataFrame of periods by line item, parsed once 
+        per scrape and kept in raw_data.
+        '''
         
-        #-- For the following valuues, each try block tries to make sure 
-        #selenium has loaded the data first, as sometimes it does not load.
+        if 'Key Ratios' not in self.raw_data:
+            self.raw_data['Key Ratios'] = ratio_table(ratio_soup)
+        
+        return self.raw_data['Key Ratios']
+    
+    def set_table_value(self, key, table, item, period, factor=1.0):
+        '''
+        Sets a field from one cell of a parsed Morningstar table, or np.nan if
+        the table or cell is missing.
+        '''
         
-        #get cash and cash equiv.
-        print('getting cash and cash equivalents')
-        try:     
-            element = driver.find_element_by_id('data_i1')
-            balance_soup = BeautifulSoup(driver.page_source, 'html.parser')
-            cash_str = balance_soup.find(id='data_i1').find(id='Y_5')['rawvalue']
-            print(cash_str)
-            if check_float(cash_str):
-                self.data['Cash and Cash Equivalents'] = check_float(cash_str)
-        except Exception as e:
-            print(e)
-            self.data['Cash and Cash Equivalents'] = np.nan
-            
-        #total liabilities
         try:
-            print('getting total liabilities')
-            element = driver.find_element_by_id('data_ttg5')
-            total_liabilities_str = balance_soup.find(id='data_ttg5').find(id='Y_5')['rawvalue']
-            print(total_liabilities_str)
-            if check_float(total_liabilities_str):
-                self.data['Total Liabilities'] = check_float(total_liabilities_str)
+            self.data[key] = latest(table(), item, period, factor)
         except Exception as e:
-            print(e)
-            self.data['Total Liabilities'] = np.nan
-            
+            log(e)
+            self.data[key] = np.nan
+        log(self.data[key])
+    
+    def set_cash(self, balance_soup):
+        
+        #get cash and cash equiv.
+        log('getting cash and cash equivalents')
+        self.set_table_value('Cash and Cash Equivalents', 
+                             lambda: self.balance_sheet(balance_soup), 'data_i1', 'Y_5')
+    
+    def set_total_liabilities(self, balance_soup):
+        
+        #total liabilities
+        log('getting total liabilities')
+        self.set_table_value('Total Liabilities', 
+                             lambda: self.balance_sheet(balance_soup), 'data_ttg5', 'Y_5')
+    
+    def set_shareholders_equity(self, balance_soup):
+        
         #shareholders' equity
-        try:
-            print('getting shareholders equity')
-            element = driver.find_element_by_id('data_ttg8')
-            shareholders_equity_str = balance_soup.find(id='data_ttg8').find(id='Y_5')['rawvalue']
-            print(shareholders_equity_str)
-            if check_float(shareholders_equity_str):
-                self.data['Shareholders Equity'] = check_float(shareholders_equity_str)
-        except Exception as e:
-            print(e)
-            self.data['Shareholders Equity'] = np.nan
-            
-        #free cash flow
-        try:
-            print('getting free cash flow')
-            driver.get(url_morningstar(self.ticker, 'ratios/r.html?t='))
-            driver.find_element_by_id('i11')
-            ratio_soup = BeautifulSoup(driver.page_source,'html.parser')
-            free_cash_flow_str = ratio_soup.find(id='i11').parent.find('td', attrs={'headers' : 'Y10 i11'}).text.replace(',', '')
-            print(free_cash_flow_str)
-            if check_float(free_cash_flow_str):
-                self.data['Free Cash Flow'] = float_convert(free_cash_flow_str, 1e6)
-        except Exception as e:
-            print(e)
-            self.data['Free Cash Flow'] = np.nan
-            
-        #shares outstanding
-        try:
-            print('getting shares outstanding')
-            driver.find_element_by_id('i7')
-            shares_outstanding_str = ratio_soup.find(id='i7').parent.find('td', attrs={'headers' : 'Y10 i7'}).text.replace(',', '')
-            print(shares_outstanding_str)
-            if check_float(shares_outstanding_str):
-                self.data['Shares Outstanding'] = float_convert(shares_outstanding_str, 1e6)
-        except Exception as e:
-            print(e)
-            self.data['Shares Outstanding'] = np.nan
-            
+        log('getting shareholders equity')
+        self.set_table_value('Shareholders Equity', 
+                             lambda: self.balance_sheet(balance_soup), 'data_ttg8', 'Y_5')
+    
+    def set_free_cash_flow(self, ratio_soup):
+        
+        #free cash flow, in millions
+        log('getting free cash flow')
+        self.set_table_value('Free Cash Flow', 
+                             lambda: self.key_ratios(ratio_soup), 'i11', 'Y10', 1e6)
+    
+    def set_shares_outstanding(self, ratio_soup):
+        
+        #shares outstanding, in millions
+        log('getting shares outstanding')
+        self.set_table_value('Shares Outstanding', 
+                             lambda: self.key_ratios(ratio_soup), 'i7', 'Y10', 1e6)
+    
+    def set_dividend(self, ratio_soup):
+        
         #dividend
+        log('getting dividend per share')
+        self.set_table_value('Dividend Per Share', 
+                             lambda: self.key_ratios(ratio_soup), 'i6', 'Y10')
+    
+    def set_roe(self, ratio_soup):
+        
+        #return on equity, from the profitability tab of the ratio page
+        log('getting return on equity')
         try:
-            print('getting dividend per share')
-            driver.find_element_by_id('i6')
-            dividend_str = ratio_soup.find(id='i6').parent.find('td', attrs={'headers' : 'Y10 i6'}).text.replace(',', '')
-            print(dividend_str)
-            if check_float(dividend_str):
-                self.data['Dividend Per Share'] = float_convert(dividend_str)
-            else: 
-                self.data['Dividend Per Share'] = np.nan
-        except Exception as e:
-            print(e)
-            self.data['Dividend Per Share'] = np.nan
-            
-        #return on equity
-        print('getting return on equity')
-        try:
-            driver.get(url_morningstar(self.ticker, 'ratios/r.html?t=')+'#tab-profitability')
-            roe_row = ratio_soup.find(id='i26').parent.children
-            roe_historical = [float_convert(child.text, 1e-2) for child in roe_row if (getattr(child, 'name', None) == 'td' and check_float(child.text))]
-            print(roe_historical)
+            #cells that don't parse and 0.0 cells are left out, as they were 
+            #when the row was read cell by cell with check_float
+            roe_historical = self.key_ratios(ratio_soup)['i26'].dropna()
+            roe_historical = roe_historical[roe_historical != 0] * 1e-2
+            log(list(roe_historical))
             #-6 to -2 because -1 is TTM
             self.data['Return on Equity 5-yr'] = np.average(roe_historical[-6:-2])
         except Exception as e:
-            print(e)
+            log(e)
             self.data['Return on Equity 5-yr'] = np.nan
+    
+    def page_soup(self, url, state, load, only=None, refresh=False):
+        '''
+        Gets a page through the page cache and parses it.
 
-        driver.quit()
-        return self.data
+        Parameters
+        ----------
+        url : string
+            
+        state : string
+            State of the page once load() has fetched it, part of the cache 
+            key.
+        load : callable
+            Fetches the page and returns its source.
+        only : SoupStrainer or dict, optional
+            Only build the parts of the page that match, see parse_page. The 
+            default is None.
+        refresh : boolean, optional
+            Skip the page cache. The default is False.
+
+        Returns
+        -------
+        BeautifulSoup object
+            or None if the page could not be loaded.
+
+        '''
+        
+        try:
+            with span('fetch', url=url):
+                html = cached_fetch(url, load, state=state, refresh=refresh)
+            with span('parse'):
+                return parse_page(html, only, self.PARSER)
+        except Exception as e:
+            log('Could not load ' + url)
+            log(e)
+            return None
+    
+    def load_pe_page(self, driver, url):
+        '''
+        Loads the Morningstar price ratio page and switches to the P/E tab.
+        Raises TimeoutException if the P/E row never shows up.
+        '''
+        
+        from selenium.webdriver.common.by import By
+        
+        attrs = {'abbr':'Price/Earnings for ' + self.ticker}
+        
+        driver_get(driver, url)
+        
+        #wait for the price_earnings tab to be clickable and click on it,
+        #then wait for the p/e row to show up.
+        element = wait_for(driver, 'price_earnings', 
+                           EC.element_to_be_clickable((By.ID, 'price_earnings')))
+        element.click()
+        wait_for(driver, 'pe_row', EC.presence_of_element_located(
+            (By.CSS_SELECTOR, '[abbr="' + attrs['abbr'] + '"]')))
+        
+        return driver.page_source
+    
+    def load_balance_page(self, driver, url):
+        '''
+        Loads the Morningstar balance sheet and switches it to quarterly.
+        Raises TimeoutException if cash and cash equivalents never load.
+        '''
+        
+        from selenium.webdriver.common.by import By
+        from selenium.common.exceptions import TimeoutException
+        
+        log('loading balance sheet at ' + url)
+        driver_get(driver, url)
+        
+        #change to quarterly and wait for the annual table to be replaced.
+        log('updating page to quarterly')
+        annual = driver.find_elements(By.ID, 'data_i1')
+        script = 'javascript:SRT_stocFund.ChangeFreq(3,\'Quarterly\');'
+        driver.execute_script(script)
+        if annual:
+            try:
+                wait_for(driver, 'quarterly', EC.staleness_of(annual[0]))
+            except TimeoutException:
+                log('balance sheet did not update to quarterly')
+        
+        #-- make sure selenium has loaded the data first, as sometimes it 
+        #does not load.
+        wait_for(driver, 'data_i1', EC.presence_of_element_located((By.ID, 'data_i1')))
+        for step in ['data_ttg5', 'data_ttg8']:
+            try:
+                wait_for(driver, step, EC.presence_of_element_located((By.ID, step)))
+            except TimeoutException:
+                log(step + ' did not load')
+        
+        return driver.page_source
+    
+    def load_ratio_page(self, driver, url):
+        '''
+        Loads the Morningstar key ratios page. Raises TimeoutException if free
+        cash flow never loads.
+        '''
+        
+        from selenium.webdriver.common.by import By
+        from selenium.common.exceptions import TimeoutException
+        
+        driver_get(driver, url)
+        
+        wait_for(driver, 'i11', EC.presence_of_element_located((By.ID, 'i11')))
+        for step in ['i7', 'i6', 'i26']:
+            try:
+                wait_for(driver, step, EC.presence_of_element_located((By.ID, step)))
+            except TimeoutException:
+                log(step + ' did not load')
+        
+        return driver.page_source
     
     def value(self, method, margin_of_safety=MARGIN_OF_SAFETY, 
                discount_rate=DISCOUNT_RATE, growth_decline = GROWTH_DECAY_RATE, 
@@ -412,7 +772,7 @@ class Equity():
             
         if method == 'roe':
             
-            safe_growth_rate = self.safe_growth(self.data['Growth Rate'])
+            safe_growth_rate = self.safe_growth(self.data['Growth Rate'], margin_of_safety)
             shs_eq = self.data['Shareholders Equity']
             roe = self.data['Return on Equity 5-yr']
             sh_out = self.data['Shares Outstanding']
@@ -449,12 +809,6 @@ class Equity():
         
         return today
     
-    def quote(self):
-        
-        #this doesn't do anything yet
-        
-        return self.quote
-    
     def value_return(self, price, value):
         
         #tells what the return would be if the price converged to the value.
@@ -522,37 +876,409 @@ class Equity():
 #make Nas for empty values.
 #turn functions like float_convert and dollar form into helper fuctions in their own package
 
-def evaluate(ticker):
+def evaluate(ticker, pool=None, retries=0):
     
     stock = Equity(ticker)
     
-    stock.set_data()
+    with span('ticker', ticker=stock.ticker):
+        
+        stock.set_data(pool=pool)
+        
+        if retries:
+            stock.retry_fields(pool=pool, attempts=retries)
+        
+        for method in ['pe', 'dcf', 'roe']:
+            with span('value', method=method):
+                try:
+                    stock.value(method=method)
+                except:
+                    log('Could not complete ' + method.upper() + ' valuation')
+            
+        try:
+            stock.get_value_returns()
+        except:
+            log('Could not get value returns.')
+        
+    return stock
 
-    try:
-        stock.value(method='pe')
-    except:
-        print('Could not complete PE valuation')
+def evaluate_safe(ticker, pool=None, retries=0):
+    '''
+    Evaluates ticker, isolating any failure to that ticker so one bad scrape
+    doesn't bring down a whole basket.
+
+    Parameters
+    ----------
+    ticker : string
+        
+    pool : DriverPool, optional
+        Pool of selenium drivers. The default is None.
+    retries : int, optional
+        Times to retry fields that came back missing. The default is 0.
+
+    Returns
+    -------
+    Equity
+        the evaluated equity, or an empty one if evaluation failed.
+
+    '''
     
     try:
-        stock.value(method='dcf')
-    except:
-        print('Could not complete DCF valuation')
+        return evaluate(ticker, pool=pool, retries=retries)
+    except Exception as e:
+        log('Could not evaluate ' + ticker)
+        log(e)
+        return Equity(ticker)
+
+def evaluate_tickers(tickers, workers=1, host_limits=None, pool=None, offline=False,
+                     retries=0):
+    '''
+    Evaluates a basket of tickers.
+
+    Parameters
+    ----------
+    tickers : list
+        tickers to evaluate
+    workers : int, optional
+        Number of tickers to evaluate at once. The default is 1, which 
+        evaluates serially.
+    host_limits : dict, optional
+        Per-host caps on simultaneous requests, e.g. 
+        {'financials.morningstar.com' : 2}. The default is None, which uses
+        HOST_LIMITS.
+    pool : DriverPool, optional
+        Pool of selenium drivers reused across tickers. The default is None, 
+        which uses the shared pool, grown to at least workers drivers.
+    offline : boolean, optional
+        Replay pages from the page cache without any network calls, e.g. to 
+        re-value a basket with different parameters. The default is False.
+    retries : int, optional
+        Times to retry, with backoff, each field that came back missing. The 
+        default is 0; see also repair_tickers.
+
+    Returns
+    -------
+    DataFrame
+        valuations for every ticker, in the same order as tickers.
+
+    '''
+    
+    if host_limits is not None:
+        set_host_limits(host_limits)
+    
+    if pool is None:
+        pool = default_pool(size=workers)
+    
+    evaluate_ = lambda ticker: evaluate_safe(ticker, pool=pool, retries=retries)
+    
+    #each result goes straight into its row of the store and the Equity is 
+    #dropped, rather than keeping a one-row DataFrame per ticker to concat
+    tickers = list(tickers)
+    store = ResultStore(len(tickers))
+    
+    with offline_mode(offline) as cache:
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for stock in executor.map(evaluate_, tickers):
+                    store.append(stock)
+        else:
+            for ticker in tickers:
+                store.append(evaluate_(ticker))
+    
+    log(pool)
+    log(cache)
         
-    try:
-        stock.value(method='roe')
-    except:
-        print('Could not complete ROE valuation')
+    return store.to_frame()
+
+def iter_evaluate(tickers, workers=1, pool=None, retries=0):
+    '''
+    Evaluates tickers, yielding each one's row as soon as it is done rather 
+    than holding the whole basket. With workers > 1 rows come in the order 
+    they finish, and only a few tickers beyond those being evaluated are 
+    queued at a time.
+
+    Parameters
+    ----------
+    tickers : iterable
         
-    try:
-        stock.get_value_returns()
-    except:
-        print('Could not get value returns.')
+    workers : int, optional
+        Number of tickers to evaluate at once. The default is 1.
+    pool : DriverPool, optional
+        The default is None, which uses the shared pool.
+    retries : int, optional
+        Times to retry missing fields. The default is 0.
+
+    Yields
+    ------
+    tuple
+        (ticker, row) with row as from Equity.record.
+
+    '''
+    
+    if pool is None:
+        pool = default_pool(size=workers)
+    
+    evaluate_ = lambda ticker: evaluate_safe(ticker, pool=pool, retries=retries)
+    tickers = iter(tickers)
+    
+    if workers <= 1:
+        for ticker in tickers:
+            stock = evaluate_(ticker)
+            yield stock.ticker, stock.record()
+        return
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(evaluate_, ticker) for ticker in islice(tickers, 2 * workers)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for ticker in islice(tickers, 1):
+                        pending.add(executor.submit(evaluate_, ticker))
+                    stock = future.result()
+                    yield stock.ticker, stock.record()
+        finally:
+            #the caller stopped early
+            for future in pending:
+                future.cancel()
+
+def stream_tickers(tickers, path, workers=1, batch_size=100, resume=True, pool=None, 
+                   retries=0, host_limits=None, offline=False):
+    '''
+    Evaluates a basket into a file, yielding rows as they finish and 
+    appending them in batches (see ResultWriter), so memory stays bounded 
+    and a run that dies can be picked up where it left off.
+    
+        for ticker, row in stream_tickers(tickers, 'valuations.csv', workers=8):
+            ...
+        valuations = read_results('valuations.csv')
+
+    Parameters
+    ----------
+    tickers : list
         
-    return stock
+    path : string
+        CSV file, or a directory of Parquet parts if it ends in .parquet.
+    workers : int, optional
+        Number of tickers to evaluate at once. The default is 1.
+    batch_size : int, optional
+        Rows per write. At most this many finished rows are lost if the run 
+        is killed. The default is 100.
+    resume : boolean, optional
+        Skip tickers already in the output. The default is True; False 
+        starts the output over.
+    pool : DriverPool, optional
+        The default is None, which uses the shared pool.
+    retries : int, optional
+        Times to retry missing fields. The default is 0.
+    host_limits : dict, optional
+        Per-host caps on simultaneous requests. The default is None.
+    offline : boolean, optional
+        Replay pages from the page cache. The default is False.
+
+    Yields
+    ------
+    tuple
+        (ticker, row) with row as from Equity.record.
+
+    '''
+    
+    if host_limits is not None:
+        set_host_limits(host_limits)
+    
+    if not resume and os.path.exists(path):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    
+    done = written_tickers(path)
+    todo = [ticker for ticker in dict.fromkeys(t.upper() for t in tickers) if ticker not in done]
+    log(str(len(done)) + ' tickers already written, ' + str(len(todo)) + ' to go')
+    
+    #offline is put back when the stream is used up, closed or dropped
+    with offline_mode(offline), ResultWriter(path, batch_size) as writer:
+        for ticker, row in iter_evaluate(todo, workers=workers, pool=pool, retries=retries):
+            writer.add(ticker, row)
+            yield ticker, row
+
+def refresh_stale(tickers, store, workers=1, pool=None, now=None):
+    '''
+    Re-fetches only the stale fields of each ticker and stores them.
+
+    Parameters
+    ----------
+    tickers : list
+        
+    store : FundamentalsStore
+        
+    workers : int, optional
+        Number of tickers to fetch at once. The default is 1.
+    pool : DriverPool, optional
+        Pool of selenium drivers. The default is None, which uses the shared 
+        pool.
+    now : float, optional
+        Timestamp to judge freshness at. The default is None, which is now.
 
-def evaluate_tickers(tickers):
+    Returns
+    -------
+    dict
+        ticker -> fields that were stale.
+
+    '''
+    
+    stale = store.stale(tickers, now=now)
+    log(str(len(stale)) + ' of ' + str(len(set(tickers))) + ' tickers have stale fields')
+    if not stale:
+        return stale
     
-    valuations = [evaluate(ticker).out_all() for ticker in tickers]
+    if pool is None:
+        pool = default_pool(size=workers)
+    
+    def refresh(ticker):
         
-    return pd.concat(valuations)
+        stock = Equity(ticker)
+        with span('ticker', ticker=stock.ticker):
+            try:
+                #the page cache may hold pages older than the field's rule 
+                #allows, so go back to the source
+                stock.set_data(fields=stale[ticker], pool=pool, refresh=True)
+            except Exception as e:
+                log('Could not refresh ' + ticker)
+                log(e)
+                return
+            
+            #a field missing from a page that loaded is stored as missing, 
+            #so it stays fresh as long as a value would; fields whose page 
+            #failed stay stale and are tried again next run
+            store.put(stock.ticker, {field : stock.field_value(field) 
+                                     for field in stock.loaded_fields(stale[ticker])})
+    
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(refresh, list(stale.keys())))
+    else:
+        for ticker in stale:
+            refresh(ticker)
+    
+    log(pool)
+    
+    return stale
+
+def revalue_tickers(tickers, workers=1, store=None, pool=None, host_limits=None, now=None):
+    '''
+    Values a basket incrementally: only fields that have gone stale in the 
+    fundamentals store are re-fetched, then every ticker is valued at once 
+    from the store. A daily re-run of an unchanged basket only re-fetches 
+    prices.
+
+    Parameters
+    ----------
+    tickers : list
+        tickers to value
+    workers : int, optional
+        Number of tickers to fetch at once. The default is 1.
+    store : FundamentalsStore, optional
+        The default is None, which uses the shared store.
+    pool : DriverPool, optional
+        Pool of selenium drivers. The default is None.
+    host_limits : dict, optional
+        Per-host caps on simultaneous requests. The default is None, which 
+        uses HOST_LIMITS.
+    now : float, optional
+        Timestamp to judge freshness at. The default is None, which is now.
+
+    Returns
+    -------
+    DataFrame
+        valuations for every ticker, in the same order as tickers, with the 
+        columns of evaluate_tickers.
 
+    '''
+    
+    if host_limits is not None:
+        set_host_limits(host_limits)
+    
+    if store is None:
+        store = default_store()
+    
+    tickers = [ticker.upper() for ticker in tickers]
+    refresh_stale(tickers, store, workers=workers, pool=pool, now=now)
+    
+    fundamentals = store.frame(tickers)
+    valuations = value_frame(fundamentals.reindex(columns=RESULT_COLUMNS))
+    
+    return pd.concat([fundamentals, valuations], axis=1).reindex(columns=RESULT_COLUMNS)
+
+def repair_tickers(valuations, workers=1, pool=None, attempts=RETRY_ATTEMPTS, 
+                   backoff=RETRY_BACKOFF):
+    '''
+    Repair pass over a basket: re-fetches only the fields that came back 
+    np.nan, retrying each with backoff, and re-values the tickers that got 
+    any of them back. Everything that was already set is kept.
+
+    Parameters
+    ----------
+    valuations : DataFrame
+        from evaluate_tickers.
+    workers : int, optional
+        Number of tickers to repair at once. The default is 1.
+    pool : DriverPool, optional
+        Pool of selenium drivers. The default is None, which uses the shared 
+        pool.
+    attempts : int, optional
+        The default is RETRY_ATTEMPTS.
+    backoff : float, optional
+        The default is RETRY_BACKOFF.
+
+    Returns
+    -------
+    DataFrame
+        a repaired copy of valuations.
+
+    '''
+    
+    fields = list(Equity.FIELD_PAGES.keys())
+    missing = valuations[fields].isna()
+    missing = missing[~missing.index.duplicated()]
+    todo = list(missing.index[missing.any(axis=1)])
+    log(str(missing.values.sum()) + ' missing fields across ' + str(len(todo)) + ' tickers')
+    
+    if pool is None:
+        pool = default_pool(size=workers)
+    
+    def repair(ticker):
+        
+        stock = Equity(ticker)
+        row = valuations.loc[[ticker]].iloc[0]
+        stock.quote = {'Price' : row['Price'], 'Date' : row['Date']}
+        stock.data = {field : row[field] for field in fields if field != 'Price'}
+        
+        with span('ticker', ticker=stock.ticker):
+            stock.retry_fields(list(missing.columns[missing.loc[ticker]]), pool=pool, 
+                               attempts=attempts, backoff=backoff, first=0)
+        
+        return ticker, stock
+    
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            stocks = list(executor.map(repair, todo))
+    else:
+        stocks = [repair(ticker) for ticker in todo]
+    
+    repaired = valuations.copy()
+    for ticker, stock in stocks:
+        rows = repaired.index == ticker
+        for field in fields:
+            repaired.loc[rows, field] = stock.field_value(field)
+        if 'Date' in stock.quote:
+            repaired.loc[rows, 'Date'] = stock.quote['Date']
+    
+    rows = repaired.index.isin(todo)
+    if rows.any():
+        values = value_frame(repaired[rows])
+        repaired.loc[rows, VALUATION_COLUMNS + RETURN_COLUMNS] = values.to_numpy()
+    
+    log(str(missing.values.sum() - repaired[fields].isna().values.sum()) + ' fields repaired')
+    log(pool)
+    
+    return repaired
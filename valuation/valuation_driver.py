@@ -11,10 +11,9 @@ import pandas as pd
 stocks_df = pd.read_csv(
     'C:/Users/David Billingsley/InvestmentResearch/SLX etf holdings.csv')
 
-valuations = [valuation.evaluate(ticker).out_all() for ticker in\
-              stocks_df['Ticker'].apply(lambda x: x[:-3])]
-
-valuations_df = pd.concat(valuations)
+#only fields that have gone stale since the last run are scraped again
+valuations_df = valuation.revalue_tickers(
+    stocks_df['Ticker'].apply(lambda x: x[:-3]), workers=8)
 
 
 def str_out(valuations):
@@ -9,8 +9,69 @@ Created on Thu Jun  9 11:38:59 2022
 Some utility functions for formatting strings.
 '''
 import numpy as np
-import mechanize
-from bs4 import BeautifulSoup
+import random
+import threading
+from collections import deque
+import importlib.util
+from contextlib import nullcontext
+from time import perf_counter
+from urllib.parse import urlparse
+from page_cache import cached_fetch
+from driver_pool import LazyDriver
+from tracing import log, span
+from lazy import lazy_import
+
+#imported on first use, see lazy.py
+bs4 = lazy_import('bs4')
+mechanize = lazy_import('mechanize')
+
+#lxml parses several times faster than the pure python html.parser, so use 
+#it when it's installed.
+PARSER = 'lxml' if importlib.util.find_spec('lxml') is not None else 'html.parser'
+
+#where pages come from, and whether they need selenium to render them. See
+#set_source.
+SOURCES = {
+    'yahoo' : {'base' : 'https://finance.yahoo.com/', 'render' : False},
+    'morningstar' : {'base' : 'https://financials.morningstar.com/', 'render' : True}
+    }
+
+#maximum number of simultaneous requests per host when evaluating in parallel.
+HOST_LIMITS = {
+    'finance.yahoo.com' : 4,
+    'financials.morningstar.com' : 2
+    }
+
+#upper bound in seconds on each selenium wait in set_data, by step. Steps not 
+#listed use DEFAULT_WAIT.
+DEFAULT_WAIT = 10
+WAIT_TIMEOUTS = {
+    'price_earnings' : 10,
+    'pe_row' : 10,
+    'quarterly' : 10,
+    'data_i1' : 10,
+    'data_ttg5' : 5,
+    'data_ttg8' : 5,
+    'i11' : 10,
+    'i7' : 5,
+    'i6' : 5,
+    'i26' : 5
+    }
+
+#observed wait times by step: running count, timeouts, total and max seconds, 
+#and the last WAIT_SAMPLES waits in seconds for the p95. Held this way so a 
+#long batch run doesn't keep every wait it has ever made.
+WAIT_SAMPLES = 1000
+WAIT_TIMES = {}
+_wait_lock = threading.Lock()
+
+#times a field that came back missing is fetched again, and the delay in 
+#seconds before the first retry. The delay doubles with each retry.
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 1.0
+
+_host_semaphores = {}
+_host_lock = threading.Lock()
 
 def dollar_format(amount):
     '''
@@ -68,17 +129,54 @@ def thousands_format(amount):
     
     return '{:,}'.format(amount)
 
+def set_source(name, base, render=None):
+    '''
+    Points a data source somewhere else, e.g. a local stand-in server 
+    serving recorded pages. The new host gets the old host's request cap.
+
+    Parameters
+    ----------
+    name : string
+        'yahoo' or 'morningstar'
+    base : string
+        Base url the page paths are appended to.
+    render : boolean, optional
+        Whether pages need selenium to render them. Recorded pages are 
+        already rendered. The default is None, which leaves it unchanged.
+
+    Returns
+    -------
+    dict
+        the previous source settings, to pass back to restore_source.
+
+    '''
+    
+    previous = dict(SOURCES[name])
+    old_host = urlparse(previous['base']).netloc
+    new_host = urlparse(base).netloc
+    if old_host in HOST_LIMITS and new_host not in HOST_LIMITS:
+        set_host_limits({new_host : HOST_LIMITS[old_host]})
+    
+    SOURCES[name]['base'] = base
+    if render is not None:
+        SOURCES[name]['render'] = render
+    
+    return previous
+
+def restore_source(name, previous):
+    
+    SOURCES[name].update(previous)
+
 def url_yahoo(ticker, page=''):
     
-    url_yahoo_quote = 'https://finance.yahoo.com/quote/' + ticker
-    print(url_yahoo_quote)
+    url_yahoo_quote = SOURCES['yahoo']['base'] + 'quote/' + ticker
     
     return url_yahoo_quote if page == '' else url_yahoo_quote + page + ticker
 
 
 def url_morningstar(ticker, page):
     
-    morningstar = 'https://financials.morningstar.com/'
+    morningstar = SOURCES['morningstar']['base']
     
     return morningstar + page + ticker
 
@@ -108,14 +206,14 @@ def float_convert_set(equity, key, value, factor=1.0):
     try:
         equity.data[key] = float(value) * factor
     except ValueError:
-        print('Retrieved ' + key + ' value ' + value + ' cannot be converted to float.')
+        log('Retrieved ' + key + ' value ' + value + ' cannot be converted to float.')
         equity.data[key] = np.nan
     except TypeError as e:
         if value is None:             
-            print('Retrieved None for ' + key + '.')
+            log('Retrieved None for ' + key + '.')
             equity.data[key] = np.nan
         else:
-            print(e)
+            log(e)
             equity.data[key] = np.nan
                     
 def float_convert(value, factor=1.0):
@@ -143,12 +241,13 @@ def float_convert(value, factor=1.0):
     try:
         return float(value) * factor
     except:
-        print('Retrieved value ' + str(value) + 'cannot be converted to float.')
+        log('Retrieved value ' + str(value) + 'cannot be converted to float.')
         return np.nan
     
-def soup_(mech, url):
+def soup_(mech, url, only=None):
     '''
-    Navigates to url and gives BeautifulSoup parse in return.
+    Navigates to url and gives BeautifulSoup parse in return. The page comes
+    from the page cache if it has been fetched recently.
 
     Parameters
     ----------
@@ -156,6 +255,8 @@ def soup_(mech, url):
         
     url : string
         
+    only : SoupStrainer, optional
+        Only build the parts of the page that match. The default is None.
 
     Returns
     -------
@@ -163,7 +264,128 @@ def soup_(mech, url):
 
     '''
     
-    return BeautifulSoup(mech.open(url).read(), 'html.parser')
+    return parse_page(cached_fetch(url, lambda: mech_read(mech, url)), only)
+
+def parse_page(html, only=None, parser=None):
+    '''
+    Parses html with the fastest available parser, optionally building only
+    the parts of the document that match a SoupStrainer.
+
+    Parameters
+    ----------
+    html : string
+        
+    only : SoupStrainer or dict, optional
+        Only build tags that match, e.g. SoupStrainer('tr'), or the keyword 
+        arguments of one, e.g. {'name' : 'tr'}. The default is None, which 
+        builds the whole document.
+    parser : string, optional
+        BeautifulSoup parser. The default is None, which uses PARSER.
+
+    Returns
+    -------
+    BeautifulSoup object
+
+    '''
+    
+    if isinstance(only, dict):
+        only = bs4.SoupStrainer(**only)
+    
+    return bs4.BeautifulSoup(html, parser or PARSER, parse_only=only)
+
+def mech_read(mech, url):
+    '''
+    Downloads url with mechanize while holding a request slot for its host.
+
+    Parameters
+    ----------
+    mech : mechanize Browser object
+        
+    url : string
+        
+
+    Returns
+    -------
+    bytes
+        the page source
+
+    '''
+    
+    with host_slot(url):
+        return mech.open(url).read()
+
+def set_host_limits(limits):
+    '''
+    Updates the per-host concurrency caps. Hosts not in HOST_LIMITS are 
+    not capped.
+
+    Parameters
+    ----------
+    limits : dict
+        host name -> maximum number of simultaneous requests.
+
+    Returns
+    -------
+    None.
+
+    '''
+    
+    with _host_lock:
+        HOST_LIMITS.update(limits)
+        for host in limits.keys():
+            _host_semaphores.pop(host, None)
+
+def host_slot(url):
+    '''
+    Gives a context manager holding one of the request slots for the host
+    of url, so that parallel evaluations don't hammer a single site.
+
+    Parameters
+    ----------
+    url : string
+        
+
+    Returns
+    -------
+    context manager
+        a semaphore for capped hosts, otherwise a no-op context.
+
+    '''
+    
+    host = urlparse(url).netloc
+    
+    with _host_lock:
+        if host not in HOST_LIMITS:
+            return nullcontext()
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(HOST_LIMITS[host])
+        return _host_semaphores[host]
+
+def driver_get(driver, url):
+    '''
+    Loads url in a selenium driver while holding a request slot for its host.
+    A pooled driver is checked out before the slot is taken.
+
+    Parameters
+    ----------
+    driver : selenium WebDriver
+        
+    url : string
+        
+
+    Returns
+    -------
+    None.
+
+    '''
+    
+    #a LazyDriver checks its driver out of the pool here, before the slot is
+    #taken, rather than on driver.get inside it
+    if isinstance(driver, LazyDriver):
+        driver = driver.checkout()
+    
+    with host_slot(url):
+        driver.get(url)
 
 
 def check_float(string):
@@ -188,5 +410,113 @@ def check_float(string):
     try:
         return float(string)
     except:
-        print('Cannot convert ' + string + ' to float')
-        return False
\ No newline at end of file
+        log('Cannot convert ' + string + ' to float')
+        return False
+
+def wait_for(driver, step, condition, timeout=None):
+    '''
+    Waits until condition holds on driver, for at most the step's timeout, 
+    and records how long it took in WAIT_TIMES, see record_wait.
+
+    Parameters
+    ----------
+    driver : selenium WebDriver
+        
+    step : string
+        Name of the wait, e.g. 'data_i1'.
+    condition : callable
+        A selenium expected condition.
+    timeout : float, optional
+        Upper bound in seconds. The default is None, which uses 
+        WAIT_TIMEOUTS[step] or DEFAULT_WAIT.
+
+    Raises
+    ------
+    TimeoutException
+        if the condition does not hold before the timeout.
+
+    Returns
+    -------
+    The value returned by the condition, e.g. the element waited for.
+
+    '''
+    
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+    
+    if timeout is None:
+        timeout = WAIT_TIMEOUTS.get(step, DEFAULT_WAIT)
+    
+    timed_out = False
+    start = perf_counter()
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.1).until(condition)
+    except TimeoutException:
+        timed_out = True
+        raise
+    finally:
+        record_wait(step, perf_counter() - start, timed_out)
+
+def record_wait(step, seconds, timed_out):
+    '''
+    Adds a wait to the step's aggregates in WAIT_TIMES.
+    '''
+    
+    with _wait_lock:
+        times = WAIT_TIMES.get(step)
+        if times is None:
+            times = WAIT_TIMES[step] = {'count' : 0, 'timeouts' : 0, 'total' : 0.0, 
+                                        'max' : 0.0, 'recent' : deque(maxlen=WAIT_SAMPLES)}
+        times['count'] += 1
+        times['timeouts'] += bool(timed_out)
+        times['total'] += seconds
+        times['max'] = max(times['max'], seconds)
+        times['recent'].append(seconds)
+
+def wait_stats():
+    '''
+    Summarizes observed wait times per step, for tuning WAIT_TIMEOUTS.
+
+    Returns
+    -------
+    dict
+        step -> {'count', 'timeouts', 'mean', 'p95', 'max'} in seconds. p95 
+        is over the last WAIT_SAMPLES waits, the rest over all of them.
+
+    '''
+    
+    stats = {}
+    with _wait_lock:
+        for step, times in WAIT_TIMES.items():
+            stats[step] = {
+                'count' : times['count'],
+                'timeouts' : times['timeouts'],
+                'mean' : times['total'] / times['count'],
+                'p95' : np.percentile(np.array(times['recent']), 95),
+                'max' : times['max']
+                }
+    
+    return stats
+
+def retry_delay(attempt, backoff=RETRY_BACKOFF):
+    '''
+    Seconds to wait before a retry: backoff, doubling with each attempt, 
+    with +/- 50% jitter so parallel retries don't hit a host together.
+
+    Parameters
+    ----------
+    attempt : int
+        1 for the first retry. 0 gives no delay.
+    backoff : float, optional
+        The default is RETRY_BACKOFF.
+
+    Returns
+    -------
+    float
+
+    '''
+    
+    if attempt < 1:
+        return 0.0
+    
+    return backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)